@@ -0,0 +1,162 @@
+# backplane.py
+import abc
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Shared channel for state between server workers: pub/sub, a small key-value
+# store and a leader lease. Pick one with from_url(BACKPLANE_URL).
+
+Handler = Callable[[str], None]
+
+class Backplane(abc.ABC):
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abc.abstractmethod
+    def subscribe(self, channel: str, handler: Handler):
+        ...
+
+    @abc.abstractmethod
+    async def publish(self, channel: str, message: str):
+        ...
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: str):
+        ...
+
+    @abc.abstractmethod
+    async def acquire_leader(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew the lease `name` for `owner`; True while owner holds it."""
+
+    @abc.abstractmethod
+    async def release_leader(self, name: str, owner: str):
+        ...
+
+class InProcessBackplane(Backplane):
+    """Single-process backplane: handlers are called directly on publish."""
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._kv: Dict[str, str] = {}
+        self._leases: Dict[str, Tuple[str, float]] = {}
+
+    def subscribe(self, channel: str, handler: Handler):
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def publish(self, channel: str, message: str):
+        for handler in self._handlers.get(channel, ()):
+            handler(message)
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._kv.get(key)
+
+    async def set(self, key: str, value: str):
+        self._kv[key] = value
+
+    async def acquire_leader(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.monotonic()
+        holder = self._leases.get(name)
+        if holder is None or holder[0] == owner or holder[1] < now:
+            self._leases[name] = (owner, now + ttl)
+            return True
+        return False
+
+    async def release_leader(self, name: str, owner: str):
+        if self._leases.get(name, ("", 0))[0] == owner:
+            del self._leases[name]
+
+# Renew only if we still own the lease (compare-and-expire)
+_RENEW = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+  return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+  return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class RedisBackplane(Backplane):
+    """Backplane on any Redis-protocol server (redis-server, KeyDB, Valkey...)."""
+    def __init__(self, url: str, prefix: str = "interactive:"):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("RedisBackplane needs the 'redis' package (pip install redis)") from e
+        self.url = url
+        self.prefix = prefix
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self._pubsub = None
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._reader: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        if self._handlers:
+            await self._pubsub.subscribe(*(self.prefix + c for c in self._handlers))
+        self._reader = asyncio.create_task(self._read())
+
+    async def close(self):
+        if self._reader:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        await self._redis.aclose()
+
+    def subscribe(self, channel: str, handler: Handler):
+        first = channel not in self._handlers
+        self._handlers.setdefault(channel, []).append(handler)
+        if first and self._pubsub is not None:
+            asyncio.ensure_future(self._pubsub.subscribe(self.prefix + channel))
+
+    async def _read(self):
+        while True:
+            if not self._pubsub.subscribed:
+                await asyncio.sleep(0.05)
+                continue
+            msg = await self._pubsub.get_message(timeout=1.0)
+            if not msg or msg.get("type") != "message":
+                continue
+            channel = msg["channel"][len(self.prefix):]
+            for handler in self._handlers.get(channel, ()):
+                try:
+                    handler(msg["data"])
+                except Exception:
+                    pass
+
+    async def publish(self, channel: str, message: str):
+        await self._redis.publish(self.prefix + channel, message)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._redis.get(self.prefix + key)
+
+    async def set(self, key: str, value: str):
+        await self._redis.set(self.prefix + key, value)
+
+    async def acquire_leader(self, name: str, owner: str, ttl: float) -> bool:
+        key = self.prefix + name
+        ms = int(ttl * 1000)
+        if await self._redis.set(key, owner, nx=True, px=ms):
+            return True
+        return bool(await self._redis.eval(_RENEW, 1, key, owner, ms))
+
+    async def release_leader(self, name: str, owner: str):
+        await self._redis.eval(_RELEASE, 1, self.prefix + name, owner)
+
+def from_url(url: str) -> Backplane:
+    if not url or url.startswith("memory:"):
+        return InProcessBackplane()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackplane(url)
+    raise ValueError(f"unsupported BACKPLANE_URL: {url}")
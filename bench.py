@@ -0,0 +1,1166 @@
+# bench.py
+"""Local micro-benchmarks. Nothing here talks to Spotify or Twitch.
+
+Usage: python bench.py <name> [options]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+def percentile(samples, p):
+    if not samples: return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100.0))]
+
+def report(name, count, elapsed, latencies=None):
+    line = f"{name:<28} {count / elapsed:>10.0f}/s"
+    if latencies:
+        line += f"  p50 {percentile(latencies, 50) * 1000:7.2f} ms  p99 {percentile(latencies, 99) * 1000:7.2f} ms"
+    print(line)
+
+# ---- http: per-call session vs shared pooled client ----
+async def _http(args):
+    import aiohttp
+    from aiohttp import web
+    import httpclient
+
+    async def stub(_req):
+        return web.json_response({"ok": True})
+    app = web.Application()
+    app.router.add_get("/stub", stub)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    url = f"http://127.0.0.1:{args.port}/stub"
+
+    async def per_call():
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url) as resp:
+                await resp.json()
+
+    async def pooled():
+        (await httpclient.request("GET", url)).json()
+
+    async def run(name, fn):
+        sem = asyncio.Semaphore(args.concurrency)
+        latencies = []
+        async def one():
+            async with sem:
+                t0 = time.perf_counter()
+                await fn()
+                latencies.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.requests)))
+        report(name, args.requests, time.perf_counter() - t0, latencies)
+
+    await run("session per request", per_call)
+    await run("shared pooled client", pooled)
+    await httpclient.close()
+    await runner.cleanup()
+
+def bench_http(args):
+    asyncio.run(_http(args))
+
+# ---- tally: linear request list vs indexed VoteTally ----
+def zipf_votes(n_votes, n_songs, s=1.1, seed=7):
+    import random
+    rng = random.Random(seed)
+    weights = [1.0 / (rank ** s) for rank in range(1, n_songs + 1)]
+    return rng.choices(range(n_songs), weights=weights, k=n_votes)
+
+def bench_tally(args):
+    from votetally import VoteTally
+    songs = zipf_votes(args.votes, args.songs)
+    resolved = [{"uri": f"spotify:track:{i}", "title": f"Song {i}"} for i in range(args.songs)]
+
+    # Baseline: the original linear scan + full sort
+    linear: list = []
+    t0 = time.perf_counter()
+    for i in songs:
+        res = resolved[i]
+        for r in linear:
+            if r.get("uri") == res["uri"]:
+                r["votes"] += 1
+                break
+        else:
+            linear.append(dict(res, query=res["title"], votes=1))
+    report("linear list add", len(songs), time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    for _ in range(args.reads):
+        sorted(linear, key=lambda x: x["votes"], reverse=True)[:10]
+    report("linear list top-10", args.reads, time.perf_counter() - t0)
+
+    tally = VoteTally()
+    t0 = time.perf_counter()
+    for i in songs:
+        tally.add(resolved[i]["title"], resolved[i])
+    report("VoteTally add", len(songs), time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    for _ in range(args.reads):
+        tally.top(10)
+    report("VoteTally top-10", args.reads, time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    for _ in range(args.reads):
+        tally.winner()
+    report("VoteTally winner", args.reads, time.perf_counter() - t0)
+    assert tally.winner()["uri"] == sorted(linear, key=lambda x: x["votes"], reverse=True)[0]["uri"]
+    print(f"{len(tally)} distinct songs, winner has {tally.winner()['votes']} votes")
+
+# ---- helpers: run the real server in a subprocess ----
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+def raise_fd_limit(n):
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(max(soft, n), hard), hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+async def start_server(port, env=None, workers=1):
+    """Start uvicorn on the broadcast server from a scratch dir (it needs ./static)."""
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    os.makedirs(os.path.join(workdir, "static"))
+    # Spotify points at a closed port unless the bench supplies fakespotify.py
+    full_env = dict(os.environ, PYTHONPATH=REPO, INTERACTIVE_PORT=str(port),
+                    SPOTIFY_ACCOUNTS_URL="http://127.0.0.1:9", SPOTIFY_API_URL="http://127.0.0.1:9/v1")
+    full_env.pop("SPOTIFY_TOKEN_URL", None)
+    full_env.update(env or {})
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "websocket broadcaster:app", "--app-dir", REPO,
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=workdir, env=full_env)
+    import httpclient
+    for _ in range(100):
+        try:
+            if (await httpclient.request("GET", f"http://127.0.0.1:{port}/api/state", retries=0)).ok:
+                return proc
+        except Exception:
+            pass
+        await asyncio.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+async def start_fake_spotify(port, *options):
+    """Run fakespotify.py in a subprocess; returns (process, env pointing the server at it)."""
+    proc = subprocess.Popen([sys.executable, os.path.join(REPO, "fakespotify.py"), "--port", str(port), *options])
+    import httpclient
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            if (await httpclient.request("GET", base + "/_fake/stats", retries=0)).ok:
+                env = {"SPOTIFY_ACCOUNTS_URL": base, "SPOTIFY_API_URL": base + "/v1", "IMG_UPSTREAM": base + "/image/",
+                       "SPOTIFY_CLIENT_ID": "fake", "SPOTIFY_CLIENT_SECRET": "fake",
+                       "SPOTIFY_REFRESH_TOKEN": "fake", "SPOTIFY_DEVICE_ID": "fake"}
+                return proc, env
+        except Exception:
+            pass
+        await asyncio.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("fake Spotify did not start")
+
+def rss_mib(pid):
+    """(current, peak) resident memory of a process in MiB, from /proc (Linux only)."""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    values[line[:5]] = int(line.split()[1]) / 1024
+    except OSError:
+        return 0.0, 0.0
+    return values.get("VmRSS", 0.0), values.get("VmHWM", 0.0)
+
+# ---- fanout: broadcast latency to many WebSocket viewers ----
+async def _fanout(args):
+    import aiohttp
+    import httpclient
+    raise_fd_limit(args.clients * 2 + 256)
+    env = {"BROADCAST_INTERVAL": "0", "WS_SEND_QUEUE": "64"}
+    if args.backplane:
+        env["BACKPLANE_URL"] = args.backplane
+    proc = await start_server(args.port, env, workers=args.workers)
+    base = f"http://127.0.0.1:{args.port}"
+    connector = aiohttp.TCPConnector(limit=0)
+    session = aiohttp.ClientSession(connector=connector)
+    received = []
+    sent_at = [0.0]
+    expect = [None]
+    connected = [0]
+
+    async def viewer():
+        async with session.ws_connect(base + "/ws/v1", protocols=("interactive-v1",)) as ws:
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT or msg.data == "pong":
+                    continue
+                if msg.data.startswith('{"type":"snapshot"'):
+                    connected[0] += 1
+                if '"enabled":' in msg.data and f'"enabled":{expect[0]}' in msg.data:
+                    received.append(time.perf_counter() - sent_at[0])
+    try:
+        tasks = []
+        for i in range(args.clients):
+            tasks.append(asyncio.create_task(viewer()))
+            if i % 200 == 199:
+                await asyncio.sleep(0.05)
+        for _ in range(300):
+            if connected[0] >= args.clients:
+                break
+            await asyncio.sleep(0.1)
+        viewers = connected[0]
+        print(f"{viewers} viewers connected to {args.workers} worker(s)")
+        latencies = []
+        enabled = True
+        for _ in range(args.rounds):
+            enabled = not enabled
+            expect[0] = "true" if enabled else "false"
+            received.clear()
+            sent_at[0] = time.perf_counter()
+            await httpclient.request("POST", base + "/api/toggle", json={"enabled": enabled},
+                                     headers={"X-Host-Token": os.getenv("HOST_TOKEN", "")})
+            deadline = time.perf_counter() + 10
+            while len(received) < viewers and time.perf_counter() < deadline:
+                await asyncio.sleep(0.005)
+            latencies.append(max(received) if received else float("inf"))
+            print(f"  round: {len(received)} delivered, last after {latencies[-1] * 1000:.1f} ms")
+        print(f"fan-out to all viewers  p50 {percentile(latencies, 50) * 1000:.1f} ms  "
+              f"p99 {percentile(latencies, 99) * 1000:.1f} ms")
+        for t in tasks:
+            t.cancel()
+    finally:
+        await session.close()
+        await httpclient.close()
+        proc.terminate()
+        proc.wait()
+
+def bench_fanout(args):
+    asyncio.run(_fanout(args))
+
+# ---- chat: Twitch bot vote forwarding under a busy simulated chat ----
+async def _chat(args):
+    import httpclient
+    from chatvotes import ChatOutbox, VoteBatcher, TokenBucket
+    # Chatters vote for many songs in this run: per-voter limits would reject most of both paths
+    proc = await start_server(args.port, {"VOTE_QUEUE_SIZE": "100000", "VOTES_PER_ROUND": "0", "VOTER_RATE": "0",
+                                          "VOTE_BOT_TOKEN": "bench"})
+    base = f"http://127.0.0.1:{args.port}"
+    bot = {"X-Vote-Token": "bench"}  # both paths are the bot: skip the per-IP limit
+    n = int(args.rate * args.seconds)
+    songs = zipf_votes(n, 2000)
+
+    async def chat(handle):
+        # `args.rate` messages per second, delivered in 10ms ticks
+        t0 = time.perf_counter()
+        for i, song in enumerate(songs):
+            due = t0 + i / args.rate
+            delay = due - time.perf_counter()
+            if delay > 0.01:
+                await asyncio.sleep(delay)
+            handle(f"viewer{i % 5000}", f"song {song}")
+
+    try:
+        # Before: one POST per message and one chat reply per vote
+        latencies, ok = [], [0]
+        async def one(user, query):
+            t1 = time.perf_counter()
+            resp = await httpclient.request("POST", base + "/api/vote", json={"query": query, "voter": "twitch:" + user},
+                                            headers=bot, retries=0)
+            latencies.append(time.perf_counter() - t1)
+            ok[0] += resp.ok
+        tasks = []
+        t0 = time.perf_counter()
+        await chat(lambda user, query: tasks.append(asyncio.create_task(one(user, query))))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - t0
+        report("POST per message", ok[0], elapsed, latencies)
+        bucket = TokenBucket(args.chat_rate, args.chat_burst)
+        print(f"  {n} requests, {ok[0]} chat replies; at {args.chat_rate * 30:.0f} msgs/30s "
+              f"the last reply goes out after {(ok[0] - bucket.burst) / bucket.rate / 60:.1f} min")
+
+        # After: micro-batched bulk requests, acks merged into paced summaries
+        lines = []
+        async def send(text):
+            lines.append(text)
+        outbox = ChatOutbox(send, args.chat_rate, args.chat_burst)
+        posts = []
+        async def post(votes):
+            t1 = time.perf_counter()
+            resp = await httpclient.request("POST", base + "/api/vote/bulk", json={"votes": votes}, headers=bot)
+            posts.append(time.perf_counter() - t1)
+            return resp
+        batcher = VoteBatcher(post, outbox, args.window)
+        runners = [asyncio.create_task(outbox.run()), asyncio.create_task(batcher.run())]
+        t0 = time.perf_counter()
+        await chat(batcher.add)
+        while batcher.pending or batcher.submitted < n:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - t0
+        while outbox.acks:
+            await asyncio.sleep(0.05)
+        report("micro-batched bulk", batcher.submitted, elapsed, posts)
+        waits = list(outbox.ack_waits)
+        print(f"  {batcher.requests} requests (avg {batcher.submitted / batcher.requests:.0f} votes), "
+              f"{len(lines)} chat lines, ack wait p50 {percentile(waits, 50):.2f} s  "
+              f"p99 {percentile(waits, 99):.2f} s")
+        print(f"  e.g. {lines[-1]!r}")
+        for t in runners:
+            t.cancel()
+    finally:
+        await httpclient.close()
+        proc.terminate()
+        proc.wait()
+
+def bench_chat(args):
+    asyncio.run(_chat(args))
+
+# ---- loadtest: the whole server against fakespotify.py, voters and viewers ----
+async def _loadtest(args):
+    import random
+    import aiohttp
+    import httpclient
+    from collections import Counter
+    from fakespotify import Catalog
+    raise_fd_limit(args.voters + args.viewers * 2 + 256)
+    fake, env = await start_fake_spotify(
+        args.port + 1, "--latency", str(args.latency), "--jitter", str(args.latency / 2),
+        "--rate-limit", str(args.rate_limit), "--track-seconds", str(args.track_seconds))
+    # Every simulated viewer connects from this machine: the per-IP limit would see one huge viewer
+    env.update({"VOTES_PER_ROUND": str(args.votes_per_round), "VOTE_QUEUE_SIZE": "100000", "IP_RATE": "0"})
+    proc = await start_server(args.port, env)
+    base = f"http://127.0.0.1:{args.port}"
+    titles = Catalog().titles[:args.songs]
+    songs = zipf_votes(args.voters * int(args.seconds / args.interval + 1), len(titles))
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+    stop = time.perf_counter() + args.seconds
+    latencies, statuses = [], Counter()
+    seen = {}  # delta seq -> [first, last] receive time across viewers
+    counts = Counter()
+    connected = [0]
+
+    async def voter(i):
+        rng = random.Random(i)
+        await asyncio.sleep(rng.uniform(0, args.interval))
+        while time.perf_counter() < stop:
+            query = titles[songs.pop()].lower()
+            t0 = time.perf_counter()
+            try:
+                async with session.post(base + "/api/vote", json={"query": query, "voter": f"load:{i}"}) as resp:
+                    await resp.read()
+                    statuses[resp.status] += 1
+            except aiohttp.ClientError:
+                statuses["error"] += 1
+            latencies.append(time.perf_counter() - t0)
+            await asyncio.sleep(max(0.0, args.interval - (time.perf_counter() - t0)))
+
+    async def viewer():
+        async with session.ws_connect(base + "/ws/v1", protocols=("interactive-v1",)) as ws:
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT or msg.data == "pong":
+                    continue
+                now = time.perf_counter()
+                counts["bytes"] += len(msg.data)
+                if msg.data.startswith('{"type":"snapshot"'):
+                    counts["snapshots"] += 1
+                    connected[0] += counts["snapshots"] <= args.viewers
+                    continue
+                counts["deltas"] += 1
+                head = msg.data[:40]
+                seq = head[head.find('"seq":') + 6:].split(",", 1)[0].split("}", 1)[0]
+                span = seen.get(seq)
+                if span is None:
+                    seen[seq] = [now, now]
+                else:
+                    span[1] = now
+
+    try:
+        rss_start = rss_mib(proc.pid)[0]
+        viewers = []
+        for i in range(args.viewers):
+            viewers.append(asyncio.create_task(viewer()))
+            if i % 200 == 199:
+                await asyncio.sleep(0.05)
+        for _ in range(300):
+            if connected[0] >= args.viewers:
+                break
+            await asyncio.sleep(0.1)
+        print(f"{connected[0]} viewers connected, {args.voters} voters every {args.interval:g}s "
+              f"for {args.seconds:g}s; fake Spotify latency {args.latency * 1000:.0f} ms, "
+              f"{args.rate_limit:.0%} answered 429")
+        stop = time.perf_counter() + args.seconds
+        rss = []
+        async def sample():
+            while True:
+                rss.append(rss_mib(proc.pid)[0])
+                await asyncio.sleep(1)
+        sampler = asyncio.create_task(sample())
+        t0 = time.perf_counter()
+        await asyncio.gather(*(voter(i) for i in range(args.voters)))
+        elapsed = time.perf_counter() - t0
+        await asyncio.sleep(1)  # let the last deltas arrive
+        sampler.cancel()
+        report("POST /api/vote", len(latencies), elapsed, latencies)
+        print("  " + ", ".join(f"{status}: {n}" for status, n in sorted(statuses.items(), key=str)))
+        spreads = [last - first for first, last in seen.values()]
+        print(f"WebSocket: {counts['deltas'] / elapsed / max(1, connected[0]):.1f} deltas/s per viewer, "
+              f"{counts['bytes'] / elapsed / 1024:.0f} KiB/s total, {counts['snapshots'] - connected[0]} resyncs; "
+              f"first-to-last viewer p50 {percentile(spreads, 50) * 1000:.1f} ms  "
+              f"p99 {percentile(spreads, 99) * 1000:.1f} ms")
+        peak = rss_mib(proc.pid)[1]
+        print(f"server RSS: {rss_start:.1f} MiB idle, {max(rss or [0]):.1f} MiB under load, {peak:.1f} MiB peak")
+        stats = (await httpclient.request("GET", base + "/api/stats")).json()
+        fake_stats = (await httpclient.request("GET", f"http://127.0.0.1:{args.port + 1}/_fake/stats")).json()
+        print(f"ingest: {stats['ingest']['processed']} processed in {stats['ingest']['batches']} batches, "
+              f"{stats['ingest']['shed']} shed; search cache hit ratio {stats['search_cache']['hit_ratio']:.2f}; "
+              f"rounds {stats['scheduler']['rounds']}, plays {stats['scheduler']['plays']}")
+        print(f"fake Spotify calls: {fake_stats['calls']}  429s: {fake_stats['limited']}")
+        for t in viewers:
+            t.cancel()
+    finally:
+        await session.close()
+        await httpclient.close()
+        proc.terminate()
+        proc.wait()
+        fake.terminate()
+        fake.wait()
+
+def bench_loadtest(args):
+    asyncio.run(_loadtest(args))
+
+# ---- catalog: local fuzzy catalog vs exact-query caching on a chat log ----
+def chat_log(n, songs, seed=5):
+    """Synthetic chat requests for the fakespotify catalog: (query, intended entry).
+
+    Zipf-popular songs, asked for the way chat does: lowercase titles, artist
+    before or after, "by", a typo, or just the first word(s).
+    """
+    import random
+    from fakespotify import Catalog as FakeCatalog
+    fake = FakeCatalog()
+    rng = random.Random(seed)
+
+    def typo(word):
+        if len(word) < 4:
+            return word
+        i = rng.randrange(1, len(word) - 1)
+        return rng.choice((word[:i] + word[i + 1:], word[:i] + word[i + 1] + word[i] + word[i + 2:],
+                           word[:i] + rng.choice("aeiou") + word[i + 1:]))
+
+    out = []
+    for n_ in zipf_votes(n, songs, seed=seed):
+        title, artist = fake.titles[n_], fake.artist(n_)
+        entry = {"title": title, "artist": artist, "uri": f"spotify:track:{n_:022d}", "cover": "", "duration_ms": fake.durations[n_]}
+        words = title.lower().split()
+        r = rng.random()
+        if r < 0.35:
+            query = title.lower()
+        elif r < 0.5:
+            query = f"{title} {artist}".lower()
+        elif r < 0.65:
+            query = f"{artist.lower()} {title.lower()}"
+        elif r < 0.8:
+            words[rng.randrange(len(words))] = typo(words[rng.randrange(len(words))])
+            query = " ".join(words)
+        elif r < 0.9:
+            query = " ".join(words[:max(1, len(words) - 1)])
+        else:
+            query = f"{title.upper()} by {artist}!!"
+        out.append((query, entry))
+    return out
+
+def bench_catalog(args):
+    import json
+    from catalog import Catalog
+    from votetally import normalize_query
+    if args.log:
+        with open(args.log, encoding="utf-8") as f:
+            log = [(rec["query"], rec) for rec in map(json.loads, f) if rec.get("uri")]
+    else:
+        log = chat_log(args.requests, args.songs)
+    print(f"{len(log)} requests, {len({normalize_query(q) for q, _ in log})} distinct normalized queries")
+
+    # Before: search cache keyed by normalized query (no expiry, no size limit)
+    # (a query asked for two songs resolves to whichever came first; "wrong" counts those)
+    first = {}
+    cache_wrong = 0
+    for query, entry in log:
+        uri = first.setdefault(normalize_query(query), entry["uri"])
+        cache_wrong += uri != entry["uri"]
+    print(f"exact-query cache        {1 - len(first) / len(log):6.1%} hits, {len(first)} Spotify searches, "
+          f"{cache_wrong} wrong")
+
+    # After: catalog first; a miss is resolved by "Spotify" (the intended entry) and learned
+    cat = Catalog(min_score=args.min_score, margin=args.margin)
+    latencies, wrong, searches = [], 0, 0
+    for query, entry in log:
+        key = normalize_query(query)
+        t0 = time.perf_counter()
+        found = cat.lookup(key)
+        latencies.append(time.perf_counter() - t0)
+        if found is None:
+            searches += 1
+            cat.add(key, entry)
+        elif found["uri"] != entry["uri"]:
+            wrong += 1
+    st = cat.stats()
+    print(f"catalog                  {st['hit_ratio']:6.1%} hits ({st['alias_hits']} exact, {st['fuzzy_hits']} fuzzy), "
+          f"{searches} Spotify searches, {wrong} wrong")
+    print(f"  lookup p50 {percentile(latencies, 50) * 1e6:.1f} us  p99 {percentile(latencies, 99) * 1e6:.1f} us  "
+          f"({len(cat)} items)")
+
+    # Startup and scale: --items tracks whose titles use Zipf-distributed words
+    # from a 20k-word vocabulary (the fake catalog's ~150 words put every word
+    # in hundreds of titles, which no real catalog does)
+    import random
+    rng = random.Random(11)
+    vocab = list({"".join(rng.choice("abcdefghijklmnoprstuwy") for _ in range(rng.randint(3, 9))) for _ in range(20_000)})
+    cum, total = [], 0.0
+    for rank in range(1, len(vocab) + 1):
+        total += 1.0 / rank
+        cum.append(total)
+    word = lambda: rng.choices(vocab, cum_weights=cum)[0]
+    artists = [" ".join(word().title() for _ in range(rng.randint(1, 2))) for _ in range(args.items // 10)]
+    items = [(" ".join(word() for _ in range(rng.choice((1, 2, 2, 3, 4)))).title(), artists[n // 10])
+             for n in range(args.items)]
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-catalog-"), "catalog.log")
+    big = Catalog(path)
+    big.load()
+    for n, (title, artist) in enumerate(items):
+        big.add(normalize_query(title), {"title": title, "artist": artist, "uri": f"spotify:track:{n:022d}",
+                                         "cover": f"/img/128/ab67616d0000b273{n:024x}", "duration_ms": 200_000})
+    big.close()
+    loaded = Catalog(path)
+    loaded.load()
+    latencies, hits = [], 0
+    for _ in range(10_000):
+        title, artist = items[rng.randrange(len(items))]
+        query = list(f"{title} {artist}".lower() if rng.random() < 0.5 else title.lower())
+        del query[rng.randrange(len(query))]  # one typo
+        key = normalize_query("".join(query))
+        t0 = time.perf_counter()
+        hits += loaded.match(key) is not None
+        latencies.append(time.perf_counter() - t0)
+    print(f"load {len(loaded)} items ({os.path.getsize(path) / 2**20:.1f} MiB) in {loaded.load_ms:.0f} ms; "
+          f"typo'd lookups {hits / len(latencies):.0%} confident, "
+          f"p50 {percentile(latencies, 50) * 1e6:.1f} us  p99 {percentile(latencies, 99) * 1e6:.1f} us")
+    loaded.close()
+
+# ---- dmca: compiled policy vs evaluating every rule ----
+def bench_dmca(args):
+    import re
+    import random
+    from dmcapolicy import Policy, PolicyEngine, ACTIONS, DECISIONS
+    from fakespotify import WORDS
+    rng = random.Random(13)
+    word = lambda: "".join(rng.choice("abcdefghiklmnoprstuvy") for _ in range(rng.randint(4, 8)))
+    uri = lambda n: f"spotify:track:{n:022d}"
+    artists = [f"{word().title()} {word().title()}" for _ in range(args.rules)]
+    # A realistic mix: mostly URIs and artists, some labels, a quarter keywords
+    rules = []
+    for i in range(args.rules):
+        kind = rng.choices(("uri", "artist", "label", "keyword"), (35, 35, 5, 25))[0]
+        value = {"uri": uri(rng.randrange(args.tracks)), "artist": rng.choice(artists), "label": f"{word().title()} Records",
+                 "keyword": " ".join(word() for _ in range(rng.choice((1, 1, 2))))}[kind]
+        rules.append((rng.choices(("allow", "warn", "deny"), (2, 3, 5))[0], kind, value))
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-dmca-"), "dmca_rules.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(f"{a} {k} {v}\n" for a, k, v in rules))
+
+    def track(n):
+        r = random.Random(n)
+        title = " ".join(r.choice(WORDS) for _ in range(r.randint(1, 3)))
+        if r.random() < 0.05:  # now and then a title containing a listed keyword
+            title += " " + r.choice([v for _, k, v in rules if k == "keyword"])
+        return {"uri": uri(n), "name": title.title(), "artists": [{"name": r.choice(artists) if r.random() < 0.2 else word()}],
+                "album": {"name": " ".join(r.choice(WORDS) for _ in range(2)).title()}}
+    tracks = [track(n) for n in range(args.tracks)]
+
+    # Before: walk the rule list for every decision
+    patterns = [(a, k, v if k == "uri" else v.casefold(), re.compile(r"(?<![^\W_])" + re.escape(v.casefold()) + r"(?![^\W_])")
+                 if k == "keyword" else None) for a, k, v in rules]
+    def naive(item):
+        best = {"uri": -1, "name": -1, "keyword": -1}
+        names = [a["name"].casefold() for a in item["artists"]]
+        text = f"{item['name']}\n{item['album']['name']}".casefold()
+        for action, kind, value, rx in patterns:
+            if kind == "uri":
+                hit, level = item["uri"] == value, "uri"
+            elif kind == "artist":
+                hit, level = value in names, "name"
+            elif kind == "label":
+                hit, level = False, "name"  # search results carry no label
+            else:
+                hit, level = rx.search(text) is not None, "keyword"
+            if hit:
+                best[level] = max(best[level], ACTIONS[action])
+        rank = next((best[level] for level in ("uri", "name", "keyword") if best[level] >= 0), -1)
+        return DECISIONS[rank] if rank >= 0 else "approved"
+    sample = tracks[:args.naive]
+    t0 = time.perf_counter()
+    expected = [naive(t) for t in sample]
+    report(f"every rule ({len(rules)} rules)", len(sample), time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    engine = PolicyEngine(path)
+    engine.load()
+    print(f"compile {engine.policy.count} rules: {(time.perf_counter() - t0) * 1000:.0f} ms "
+          f"({len(engine.policy.keywords)} matcher states)")
+    policy = engine.policy
+    t0 = time.perf_counter()
+    got = [DECISIONS[r] if r >= 0 else "approved" for r in map(policy.rank, tracks)]
+    report("compiled, uncached", len(tracks), time.perf_counter() - t0)
+    assert got[:len(sample)] == expected, "compiled policy disagrees with the rule-by-rule evaluation"
+    stream = [tracks[i] for i in zipf_votes(args.decisions, args.tracks)]
+    t0 = time.perf_counter()
+    for item in stream:
+        engine.decide(item)
+    report("compiled + per-URI cache", len(stream), time.perf_counter() - t0)
+    print(f"  {engine.hits / (engine.hits + engine.misses):.0%} cache hits; "
+          + ", ".join(f"{d} {got.count(d)}" for d in DECISIONS))
+
+# ---- contexts: album/playlist winners expanded all at once vs a page at a time ----
+async def _contexts(args):
+    import tracemalloc
+    import httpclient
+    from contexts import ContextTracks
+    fake, env = await start_fake_spotify(args.port, "--latency", str(args.latency))
+    api, headers = env["SPOTIFY_API_URL"], {"Authorization": "Bearer bench"}
+    uri = "spotify:playlist:" + "0" * 22  # the fake's 5,000-track playlist
+    requests = [0]
+
+    async def get(url):
+        requests[0] += 1
+        return (await httpclient.request("GET", url, headers=headers)).json()
+
+    async def fetch_page(_uri, offset, limit):
+        page = await get(f"{api}/playlists/{_uri.split(':')[2]}/tracks?offset={offset}&limit={limit}")
+        return page["total"], [{"title": it["track"]["name"], "uri": it["track"]["uri"],
+                                "duration_ms": it["track"]["duration_ms"]} for it in page["items"]]
+    try:
+        # Before: follow every `next` link, then start playing
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        tracks, url = [], f"{api}/playlists/{uri.split(':')[2]}/tracks?limit=100"
+        while url:
+            page = await get(url)
+            tracks += [{"title": it["track"]["name"], "uri": it["track"]["uri"],
+                        "duration_ms": it["track"]["duration_ms"]} for it in page["items"]]
+            url = page.get("next")
+        first = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{'whole playlist up front':<28} first track after {first * 1000:6.0f} ms, "
+              f"{requests[0]} requests, {len(tracks)} tracks held, peak {peak / 2**20:.1f} MiB")
+
+        # After: a page at a time as the queue drains, next page prefetched
+        requests[0] = 0
+        tracemalloc.start()
+        ctx = ContextTracks(fetch_page, cache_pages=args.cache_pages, prefetch=args.prefetch)
+        waits = []
+        for _ in range(args.play):
+            t0 = time.perf_counter()
+            pos, _entry = await ctx.next(uri)
+            waits.append(time.perf_counter() - t0)
+            ctx.mark(uri, pos)
+            await asyncio.sleep(args.gap)  # the track plays
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{'page at a time':<28} first track after {waits[0] * 1000:6.0f} ms, "
+              f"{requests[0]} requests for {args.play} tracks, peak {peak / 2**20:.1f} MiB")
+        print(f"  next track: p50 {percentile(waits[1:], 50) * 1000:.2f} ms  p99 {percentile(waits[1:], 99) * 1000:.2f} ms; "
+              + ", ".join(f"{k} {v}" for k, v in ctx.stats().items()))
+    finally:
+        fake.terminate()
+        await httpclient.close()
+
+def bench_contexts(args):
+    asyncio.run(_contexts(args))
+
+# ---- voters: per-round vote dedup memory and cost ----
+def bench_voters(args):
+    import tracemalloc
+    from voterlimits import RoundVoters, RateLimiter
+
+    def measure(name, build):
+        t0 = time.perf_counter()
+        build()
+        elapsed = time.perf_counter() - t0  # timed without tracemalloc, which slows allocation
+        tracemalloc.start()
+        obj = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"{name:<30} {size / 2**20:7.2f} MiB  {elapsed / args.voters * 1e6:6.2f} us/vote")
+        return obj
+
+    def counts_dict():
+        d = {}
+        for i in range(args.voters):
+            voter = f"twitch:viewer{i}"  # ids arrive as fresh strings with each vote
+            if d.get(voter, 0) < 1:
+                d[voter] = d.get(voter, 0) + 1
+        return d
+
+    def round_voters():
+        rv = RoundVoters(1)
+        for i in range(args.voters):
+            rv.take(f"twitch:viewer{i}")
+        return rv
+
+    def rate_limiter():
+        rl = RateLimiter(1, 5, maxkeys=args.voters * 2)
+        for i in range(args.voters):
+            rl.check(f"twitch:viewer{i}")
+        return rl
+
+    print(f"{args.voters} unique voters in one round:")
+    d = measure("dict voter -> votes", counts_dict)
+    rv = measure("RoundVoters (fingerprints)", round_voters)
+    measure("RateLimiter (per-voter)", rate_limiter)
+    t0 = time.perf_counter()
+    d.clear()
+    t1 = time.perf_counter()
+    rv.new_round()
+    t2 = time.perf_counter()
+    print(f"close round: dict.clear {(t1 - t0) * 1000:.2f} ms, RoundVoters.new_round {(t2 - t1) * 1e6:.2f} us")
+    t0 = time.perf_counter()
+    for i in range(args.voters):
+        rv.take(f"twitch:viewer{i}")
+    for i in range(args.voters):
+        rv.take(f"twitch:viewer{i}")  # second vote: rejected
+    print(f"reused table, 2 votes each: {(time.perf_counter() - t0) / args.voters / 2 * 1e6:.2f} us/vote, "
+          f"{rv.stats()['rejected']} rejected, {rv.stats()['bytes'] / 2**20:.2f} MiB")
+
+# ---- metrics: cost of recording, scraping and profiling ----
+async def _metrics(args):
+    import httpclient
+
+    async def load(name, env):
+        proc = await start_server(args.port, env)
+        url = f"http://127.0.0.1:{args.port}/api/state"
+        try:
+            sem = asyncio.Semaphore(args.concurrency)
+            latencies = []
+            async def one():
+                async with sem:
+                    t0 = time.perf_counter()
+                    await httpclient.request("GET", url)
+                    latencies.append(time.perf_counter() - t0)
+            await asyncio.gather(*(one() for _ in range(500)))  # warm up
+            latencies.clear()
+            t0 = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(args.requests)))
+            report(name, args.requests, time.perf_counter() - t0, latencies)
+            if env.get("METRICS") != "0":
+                t0 = time.perf_counter()
+                body = (await httpclient.request("GET", f"http://127.0.0.1:{args.port}/metrics")).body
+                print(f"  /metrics scrape {(time.perf_counter() - t0) * 1000:.1f} ms, {len(body) / 1024:.1f} KiB")
+        finally:
+            await httpclient.close()
+            proc.terminate()
+            proc.wait()
+
+    await load("GET /api/state, METRICS=0", {"METRICS": "0"})
+    await load("GET /api/state, METRICS=1", {"METRICS": "1"})
+    await load("  + profiler at 100 Hz", {"METRICS": "1", "PROFILE": "1"})
+
+def bench_metrics(args):
+    import metrics
+    registry = metrics.Registry()
+    counter = registry.counter("c", "c", ("outcome",))
+    histogram = registry.histogram("h", "h", ("call",))
+    n = 1_000_000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        counter.labels("queued").inc()
+    t1 = time.perf_counter()
+    for i in range(n):
+        histogram.labels("search").observe(i * 1e-7)
+    t2 = time.perf_counter()
+    for _ in range(n // 10):
+        with histogram.labels("search").time():
+            pass
+    t3 = time.perf_counter()
+    print(f"counter inc {(t1 - t0) / n * 1e9:.0f} ns, histogram observe {(t2 - t1) / n * 1e9:.0f} ns, "
+          f"timer block {(t3 - t2) / (n // 10) * 1e9:.0f} ns")
+    asyncio.run(_metrics(args))
+
+# ---- sim: playback scheduler on a simulated clock with a fake player ----
+class SimClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+        await asyncio.sleep(0)
+
+class FakePlayer:
+    """Plays fixed-length tracks from a list; counts API-equivalent calls."""
+    def __init__(self, clock, track_s=200.0, votes=True):
+        self.clock = clock
+        self.track_s = track_s
+        self.votes = votes
+        self.queue = []
+        self.playing = None  # (uri, started_at)
+        self.n = 0
+        self.calls = 0
+        self.rounds = 0
+        self.gaps = []
+        self.ended_at = None
+
+    async def state(self):
+        self.calls += 1
+        if not self.playing:
+            return None
+        uri, started = self.playing
+        progress = (self.clock() - started) * 1000
+        if progress >= self.track_s * 1000:
+            if self.ended_at is None:
+                self.ended_at = started + self.track_s
+            return {"uri": uri, "progress_ms": 0, "duration_ms": int(self.track_s * 1000), "is_playing": False}
+        return {"uri": uri, "progress_ms": int(progress), "duration_ms": int(self.track_s * 1000), "is_playing": True}
+
+    async def play_next(self):
+        self.calls += 1
+        uri = self.queue.pop(0)
+        if self.ended_at is not None:
+            self.gaps.append(self.clock() - self.ended_at)
+            self.ended_at = None
+        self.playing = (uri, self.clock())
+        return True
+
+    async def close_round(self):
+        self.rounds += 1
+        self.n += 1
+        self.queue.append(f"track:{self.n}")
+
+    def enabled(self): return True
+    def has_queue(self): return bool(self.queue)
+    def has_votes(self): return self.votes
+
+async def _sim(args):
+    from scheduler import PlaybackScheduler
+    for label, votes in (("busy (votes every round)", True), ("idle (no votes)", False)):
+        clock = SimClock()
+        player = FakePlayer(clock, track_s=args.track_seconds, votes=votes)
+        sched = PlaybackScheduler(player, clock=clock, sleep=clock.sleep, round_close_before=args.round_close_before)
+        task = asyncio.create_task(sched.run())
+        while clock.now < args.hours * 3600:
+            await asyncio.sleep(0)
+        task.cancel()
+        hours = clock.now / 3600
+        gap = max(player.gaps) if player.gaps else 0.0
+        print(f"{label:<26} {player.calls / hours:8.0f} player calls/h (1s loop: ~3600/h)  "
+              f"rounds {player.rounds}  max gap {gap:.1f}s")
+
+def bench_sim(args):
+    asyncio.run(_sim(args))
+
+# ---- journal: event log append cost and recovery time ----
+def bench_journal(args):
+    from eventlog import EventLog
+    from votetally import VoteTally
+    directory = tempfile.mkdtemp(prefix="bench-journal-")
+    log = EventLog(directory, snapshot_every=args.events + 1)
+    log.open()
+    songs = zipf_votes(args.events, 5000)
+    seen = set()
+    t0 = time.perf_counter()
+    for i, song in enumerate(songs):
+        uri = f"spotify:track:{song:022d}"
+        if uri in seen:
+            log.append({"t": "vote", "u": uri, "c": 1})
+        else:
+            seen.add(uri)
+            log.append({"t": "vote", "q": f"song {song}", "c": 1,
+                        "r": {"title": f"Song {song}", "artist": "Artist", "uri": uri,
+                              "cover": "https://i.scdn.co/image/ab67616d00001e02", "duration_ms": 200000}})
+        if i % 1000 == 999:
+            log.flush()
+    log.flush()
+    elapsed = time.perf_counter() - t0
+    size = os.path.getsize(log.log_path)
+    print(f"append+flush      {elapsed / args.events * 1e6:8.2f} us/vote  "
+          f"({args.events} events, {size / 1e6:.1f} MB)")
+    log.close()
+
+    tally = VoteTally()
+    t0 = time.perf_counter()
+    _, events = EventLog(directory).recover()
+    for ev in events:
+        tally.add(ev.get("q", ""), ev.get("r") or {"uri": ev["u"]}, ev["c"])
+    print(f"recover+replay    {time.perf_counter() - t0:8.2f} s for {args.events} events "
+          f"({len(tally)} songs)")
+
+    log = EventLog(directory)
+    log.recover()
+    log.open()
+    t0 = time.perf_counter()
+    log.snapshot({"requests": list(tally)})
+    print(f"snapshot+truncate {(time.perf_counter() - t0) * 1000:8.2f} ms")
+    t0 = time.perf_counter()
+    EventLog(directory).recover()
+    print(f"recover (compact) {(time.perf_counter() - t0) * 1000:8.2f} ms")
+    log.close()
+
+# ---- img: cover thumbnail proxy vs hotlinking the CDN image ----
+async def _img(args):
+    from io import BytesIO
+    from aiohttp import web
+    from PIL import Image, ImageDraw
+    import httpclient
+
+    # Stand-in CDN serving 300px covers (what pick_best_image() usually picks)
+    fetched = []
+    covers = {}
+    for i in range(args.covers):
+        im = Image.effect_noise((300, 300), 40 + i % 30).convert("RGB")
+        ImageDraw.Draw(im).ellipse((40, 40, 260, 260), fill=(30 * (i % 8), 90, 160))
+        out = BytesIO()
+        im.save(out, "JPEG", quality=90)
+        covers[f"ab67616d00001e02{i:024x}"] = out.getvalue()
+
+    async def cdn(req):
+        fetched.append(req.match_info["id"])
+        return web.Response(body=covers[req.match_info["id"]], content_type="image/jpeg")
+    cdn_app = web.Application()
+    cdn_app.router.add_get("/image/{id}", cdn)
+    runner = web.AppRunner(cdn_app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port + 1).start()
+
+    proc = await start_server(args.port, {"IMG_UPSTREAM": f"http://127.0.0.1:{args.port + 1}/image/"})
+    base = f"http://127.0.0.1:{args.port}"
+    direct = sum(map(len, covers.values())) / len(covers)
+    print(f"hotlinked CDN cover     {direct / 1024:7.1f} KiB per cover per viewer")
+    try:
+        for fmt, accept in (("webp", "image/webp,*/*"), ("jpeg", "*/*")):
+            for label in ("cold", "warm"):
+                sem = asyncio.Semaphore(args.concurrency)
+                latencies, sizes = [], []
+                async def one(image_id):
+                    async with sem:
+                        t0 = time.perf_counter()
+                        resp = await httpclient.request("GET", f"{base}/img/{args.size}/{image_id}",
+                                                        headers={"Accept": accept})
+                        latencies.append(time.perf_counter() - t0)
+                        sizes.append(len(resp.body))
+                ids = list(covers) * args.viewers
+                t0 = time.perf_counter()
+                await asyncio.gather(*(one(image_id) for image_id in ids))
+                report(f"/img/{args.size} {fmt} {label}", len(ids), time.perf_counter() - t0, latencies)
+            print(f"  {sum(sizes) / len(sizes) / 1024:.1f} KiB per cover per viewer")
+        resp = await httpclient.request("GET", f"{base}/img/{args.size}/{next(iter(covers))}",
+                                        headers={"Accept": "image/webp"})
+        headers = {k.lower(): v for k, v in resp.headers.items()}
+        again = await httpclient.request("GET", f"{base}/img/{args.size}/{next(iter(covers))}",
+                                         headers={"Accept": "image/webp", "If-None-Match": headers["etag"]})
+        print(f"revalidation: HTTP {again.status}, Cache-Control: {headers['cache-control']}")
+        print(f"upstream fetches: {len(fetched)} for {len(covers)} covers "
+              f"(viewers x formats x passes = {args.viewers * 4} requests per cover)")
+    finally:
+        await httpclient.close()
+        await runner.cleanup()
+        proc.terminate()
+        proc.wait()
+
+def bench_img(args):
+    asyncio.run(_img(args))
+
+# ---- render: host GUI list updates (needs a display; use xvfb-run when headless) ----
+def _render_deltas(args):
+    import random
+    rng = random.Random(3)
+    song = lambda i: {"uri": f"spotify:track:{i:022d}", "title": f"Song {i}", "artist": "Artist", "cover": ""}
+    snapshot = {"type": "snapshot", "seq": 0, "enabled": True, "current": None,
+                "queue": [song(i) for i in range(args.queue)],
+                "results": [dict(song(i), key=f"uri:spotify:track:{i:022d}", query=f"song {i}",
+                                 votes=rng.randint(1, 20)) for i in range(args.results)]}
+    votes = {it["key"]: it["votes"] for it in snapshot["results"]}
+    keys = list(votes)
+    deltas, qlen, nxt = [], args.queue, args.queue + args.results
+    for seq in range(1, args.updates + 1):
+        items = []
+        for key in rng.sample(keys, 3):
+            votes[key] += 1
+            items.append({"key": key, "votes": votes[key]})
+        delta = {"type": "delta", "seq": seq, "results": {"items": items}}
+        if seq % 5 == 0:
+            delta["queue"] = [{"op": "remove", "index": rng.randrange(qlen)},
+                              {"op": "insert", "index": rng.randrange(qlen), "item": song(nxt)}]
+            nxt += 1
+        deltas.append(delta)
+    return snapshot, deltas
+
+def bench_render(args):
+    import tkinter as tk
+    os.environ.setdefault("API_BASE", "http://127.0.0.1:9")  # nothing to connect to
+    import hostcontroller
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        sys.exit(f"render needs a display (headless: xvfb-run python bench.py render): {e}")
+    gui = hostcontroller.HostGUI(root)
+    snapshot, deltas = _render_deltas(args)
+
+    for label, rebuild in (("destroy + rebuild", True), ("keyed update", False)):
+        dirty = set()
+        gui.apply_snapshot(snapshot, dirty)
+        gui.render(dirty)
+        root.update()
+        lists = (gui.queue_list, gui.req_list)
+        counts = lambda: [sum(getattr(l, n) for l in lists) for n in ("created", "destroyed", "moved")]
+        before = counts()
+        latencies = []
+        t0 = time.perf_counter()
+        for delta in deltas:
+            t1 = time.perf_counter()
+            dirty = set()
+            gui.apply_delta(delta, dirty)
+            if rebuild:
+                for l in lists:
+                    l.clear()
+            gui.render(dirty)
+            root.update_idletasks()
+            latencies.append(time.perf_counter() - t1)
+        report(f"render {label}", len(deltas), time.perf_counter() - t0, latencies)
+        created, destroyed, moved = (a - b for a, b in zip(counts(), before))
+        print(f"  rows per update: {created / len(deltas):.1f} created, "
+              f"{destroyed / len(deltas):.1f} destroyed, {moved / len(deltas):.1f} moved")
+
+    # Burst: messages posted faster than the display refreshes share a frame
+    dirty = set()
+    gui.apply_snapshot(snapshot, dirty)
+    gui.render(dirty)
+    root.update()
+    frames = 0
+    frame = gui.frame
+    def counted():
+        nonlocal frames
+        frames += 1
+        frame()
+    gui.frame = counted
+    t0 = time.perf_counter()
+    gui.inbox.extend(deltas)  # as the receiver thread would, one by one
+    while gui.inbox:
+        root.update()
+    print(f"burst of {len(deltas)} updates: {frames} frame(s), "
+          f"{(time.perf_counter() - t0) * 1000:.1f} ms")
+    gui.submit(hostcontroller.httpclient.close()).result(5)
+    root.destroy()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("http", help="per-call aiohttp sessions vs the shared pooled client")
+    p.add_argument("--requests", type=int, default=5000)
+    p.add_argument("--concurrency", type=int, default=50)
+    p.add_argument("--port", type=int, default=8901)
+    p.set_defaults(func=bench_http)
+
+    p = sub.add_parser("tally", help="vote tally over a Zipf-distributed vote stream")
+    p.add_argument("--votes", type=int, default=100_000)
+    p.add_argument("--songs", type=int, default=5_000)
+    p.add_argument("--reads", type=int, default=1_000)
+    p.set_defaults(func=bench_tally)
+
+    p = sub.add_parser("fanout", help="broadcast latency to many local WebSocket viewers")
+    p.add_argument("--clients", type=int, default=5000)
+    p.add_argument("--rounds", type=int, default=10)
+    p.add_argument("--port", type=int, default=8902)
+    p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--backplane", default="", help="BACKPLANE_URL for --workers > 1, e.g. redis://127.0.0.1:6379/0")
+    p.set_defaults(func=bench_fanout)
+
+    p = sub.add_parser("chat", help="Twitch bot: per-message votes vs micro-batched votes with paced acks")
+    p.add_argument("--rate", type=float, default=500, help="chat messages per second")
+    p.add_argument("--seconds", type=float, default=10)
+    p.add_argument("--window", type=float, default=0.25)
+    p.add_argument("--chat-rate", type=float, default=20 / 30)
+    p.add_argument("--chat-burst", type=float, default=5)
+    p.add_argument("--port", type=int, default=8904)
+    p.set_defaults(func=bench_chat)
+
+    p = sub.add_parser("loadtest", help="whole server against fakespotify.py: N voters, M WebSocket viewers")
+    p.add_argument("--voters", type=int, default=1000)
+    p.add_argument("--viewers", type=int, default=1000)
+    p.add_argument("--interval", type=float, default=1.0, help="seconds between one voter's votes")
+    p.add_argument("--seconds", type=float, default=30)
+    p.add_argument("--songs", type=int, default=500, help="distinct songs voted for (Zipf)")
+    p.add_argument("--votes-per-round", type=int, default=1)
+    p.add_argument("--latency", type=float, default=0.05, help="fake Spotify latency, seconds")
+    p.add_argument("--rate-limit", type=float, default=0.01, help="fraction of Spotify calls answered 429")
+    p.add_argument("--track-seconds", type=float, default=20, help="length of every fake track")
+    p.add_argument("--port", type=int, default=8906)
+    p.set_defaults(func=bench_loadtest)
+
+    p = sub.add_parser("catalog", help="local fuzzy catalog: hit rate and lookup latency on a chat log")
+    p.add_argument("--requests", type=int, default=50_000)
+    p.add_argument("--songs", type=int, default=500, help="distinct songs in the synthetic log (Zipf)")
+    p.add_argument("--log", default="", help='recorded log instead: JSON lines {"query", "uri", "title", "artist"}')
+    p.add_argument("--items", type=int, default=10_000, help="catalog size for the load-time test")
+    p.add_argument("--min-score", type=float, default=0.75)
+    p.add_argument("--margin", type=float, default=0.15)
+    p.set_defaults(func=bench_catalog)
+
+    p = sub.add_parser("dmca", help="DMCA decisions per second with a 10k-rule policy")
+    p.add_argument("--rules", type=int, default=10_000)
+    p.add_argument("--tracks", type=int, default=50_000)
+    p.add_argument("--decisions", type=int, default=1_000_000, help="Zipf stream through the per-URI cache")
+    p.add_argument("--naive", type=int, default=500, help="items checked rule by rule (slow)")
+    p.set_defaults(func=bench_dmca)
+
+    p = sub.add_parser("contexts", help="album/playlist winners: whole track list up front vs lazy pages")
+    p.add_argument("--port", type=int, default=8907)
+    p.add_argument("--latency", type=float, default=0.05, help="fake Spotify latency per call, seconds")
+    p.add_argument("--play", type=int, default=300, help="tracks to play from the 5,000-track playlist")
+    p.add_argument("--gap", type=float, default=0.06, help="seconds each track 'plays' before the next")
+    p.add_argument("--cache-pages", type=int, default=64)
+    p.add_argument("--prefetch", type=int, default=2)
+    p.set_defaults(func=bench_contexts)
+
+    p = sub.add_parser("voters", help="per-round vote dedup: memory and cost for many unique voters")
+    p.add_argument("--voters", type=int, default=100_000)
+    p.set_defaults(func=bench_voters)
+
+    p = sub.add_parser("metrics", help="overhead of /metrics instrumentation and the sampling profiler")
+    p.add_argument("--requests", type=int, default=5000)
+    p.add_argument("--concurrency", type=int, default=50)
+    p.add_argument("--port", type=int, default=8905)
+    p.set_defaults(func=bench_metrics)
+
+    p = sub.add_parser("sim", help="playback scheduler against a fake player on a simulated clock")
+    p.add_argument("--hours", type=float, default=24)
+    p.add_argument("--track-seconds", type=float, default=200)
+    p.add_argument("--round-close-before", type=float, default=15)
+    p.set_defaults(func=bench_sim)
+
+    p = sub.add_parser("journal", help="event log append overhead and recovery time")
+    p.add_argument("--events", type=int, default=1_000_000)
+    p.set_defaults(func=bench_journal)
+
+    p = sub.add_parser("img", help="cover thumbnail proxy: bytes per viewer and upstream fetches")
+    p.add_argument("--covers", type=int, default=50)
+    p.add_argument("--viewers", type=int, default=20)
+    p.add_argument("--size", type=int, default=96)
+    p.add_argument("--concurrency", type=int, default=50)
+    p.add_argument("--port", type=int, default=8903)
+    p.set_defaults(func=bench_img)
+
+    p = sub.add_parser("render", help="host GUI list updates: keyed widgets vs rebuilding (needs a display)")
+    p.add_argument("--queue", type=int, default=200)
+    p.add_argument("--results", type=int, default=50)
+    p.add_argument("--updates", type=int, default=500)
+    p.set_defaults(func=bench_render)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
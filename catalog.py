@@ -0,0 +1,238 @@
+# catalog.py
+import os
+import math
+import time
+import itertools
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from eventlog import encode_record, read_records
+from votetally import normalize_query
+
+FUZZY_MIN = 4  # words at least this long also match with one letter wrong, missing or extra
+
+def deletes(word: str) -> set:
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+class Catalog:
+    """Every track/album/playlist the server has resolved, searchable locally.
+
+    Requests repeat with typos and partial titles, so besides remembering
+    which query resolved to what (aliases), items are indexed by the words of
+    "title artist". A query word matches an item word exactly or, for longer
+    words, within one typo, found through one-letter deletions (both sides
+    reduced to a common deletion) rather than by scanning the vocabulary.
+    lookup() answers from the alias table, else from the word index when one
+    item clearly wins: it has at least `min_score` of the query's words, and
+    the runner-up has `margin` less (or the winner is the exact name).
+    Anything less certain returns None and goes to Spotify, whose answer is
+    then added here.
+
+    The file is an append-only run of framed records (eventlog's format), one
+    per new item or alias, so adding costs one small write and loading is a
+    sequential read. It is rewritten at load when superseded records pile up.
+    """
+    def __init__(self, path: str = "", min_score: float = 0.75, margin: float = 0.15, max_candidates: int = 500):
+        self.path = path
+        self.min_score = min_score
+        self.margin = margin
+        self.max_candidates = max_candidates
+        self.items: List[Dict] = []                  # item id -> entry
+        self._by_uri: Dict[str, int] = {}
+        self._aliases: Dict[str, int] = {}          # normalized query -> item id
+        self._word_ids: Dict[str, int] = {}         # word -> word id
+        self._postings: List[array] = []            # word id -> item ids
+        self._near: Dict[str, List[int]] = {}       # word with one letter deleted -> word ids
+        self._words: List[Tuple[int, ...]] = []     # item id -> its word ids
+        self._file = None
+        self.records = 0
+        self.alias_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.load_ms = 0.0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def stats(self) -> Dict:
+        lookups = self.alias_hits + self.fuzzy_hits + self.misses
+        return {"items": len(self.items), "aliases": len(self._aliases), "alias_hits": self.alias_hits,
+                "fuzzy_hits": self.fuzzy_hits, "misses": self.misses, "load_ms": self.load_ms,
+                "hit_ratio": (self.alias_hits + self.fuzzy_hits) / lookups if lookups else 0.0}
+
+    def load(self):
+        if not self.path:
+            return
+        t0 = time.perf_counter()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        records, valid = read_records(self.path)
+        for rec in records:
+            self._apply(rec)
+        self.records = len(records)
+        if self.records > 2 * (len(self.items) + len(self._aliases)) + 1000:
+            self._rewrite()
+        elif os.path.exists(self.path) and os.path.getsize(self.path) != valid:
+            with open(self.path, "r+b") as f:
+                f.truncate(valid)  # torn tail from a crash mid-write
+        self._file = open(self.path, "ab")
+        self.load_ms = (time.perf_counter() - t0) * 1000
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, rec: Dict):
+        self.records += 1
+        if self._file is not None:
+            self._file.write(encode_record(rec))
+            self._file.flush()
+
+    def _rewrite(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            for item in self.items:
+                f.write(encode_record(self._item_record(item)))
+            for key, item_id in self._aliases.items():
+                f.write(encode_record({"q": key, "u": self.items[item_id]["uri"]}))
+        os.replace(tmp, self.path)
+        self.records = len(self.items) + len(self._aliases)
+
+    @staticmethod
+    def _item_record(entry: Dict) -> Dict:
+        return {"u": entry["uri"], "t": entry.get("title", ""), "a": entry.get("artist", ""),
+                "c": entry.get("cover", ""), "d": entry.get("duration_ms"), "b": entry.get("album", ""),
+                "l": entry.get("label", "")}
+
+    def _apply(self, rec: Dict):
+        if "q" in rec:
+            item_id = self._by_uri.get(rec["u"])
+            if item_id is not None:
+                self._aliases[rec["q"]] = item_id
+        else:
+            self._put({"title": rec["t"], "artist": rec["a"], "uri": rec["u"], "cover": rec["c"],
+                       "duration_ms": rec["d"], "album": rec.get("b", ""), "label": rec.get("l", "")})
+
+    def _put(self, entry: Dict) -> Tuple[int, bool]:
+        """(item id, whether anything changed)."""
+        item_id = self._by_uri.get(entry["uri"])
+        if item_id is not None:
+            if self.items[item_id] == entry:
+                return item_id, False
+            self.items[item_id] = entry  # metadata refresh; the index keeps the first title
+            return item_id, True
+        item_id = len(self.items)
+        self.items.append(entry)
+        self._by_uri[entry["uri"]] = item_id
+        ids = []
+        for word in dict.fromkeys(normalize_query(f"{entry['title']} {entry['artist']}").split()):
+            wid = self._word_ids.get(word)
+            if wid is None:
+                wid = self._word_ids[word] = len(self._postings)
+                self._postings.append(array("I"))
+                if len(word) >= FUZZY_MIN:
+                    for d in deletes(word):
+                        self._near.setdefault(d, []).append(wid)
+            self._postings[wid].append(item_id)
+            ids.append(wid)
+        self._words.append(tuple(ids))
+        return item_id, True
+
+    def add(self, key: str, entry: Dict):
+        """Remember `entry` (a resolved track/album/playlist), and that the
+        normalized query `key` resolved to it (key may be empty)."""
+        if not entry or not entry.get("uri"):
+            return
+        entry = {"title": entry.get("title", ""), "artist": entry.get("artist", ""), "uri": entry["uri"],
+                 "cover": entry.get("cover", ""), "duration_ms": entry.get("duration_ms"),
+                 "album": entry.get("album", ""), "label": entry.get("label", "")}
+        item_id, changed = self._put(entry)
+        if changed:
+            self._write(self._item_record(entry))
+        if key and self._aliases.get(key) != item_id:
+            self._aliases[key] = item_id
+            self._write({"q": key, "u": entry["uri"]})
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """Entry for the normalized query `key`, or None when not confident."""
+        item_id = self._aliases.get(key)
+        if item_id is not None:
+            self.alias_hits += 1
+            return dict(self.items[item_id])
+        found = self.match(key)
+        if found is None:
+            self.misses += 1
+            return None
+        self.fuzzy_hits += 1
+        return dict(self.items[found[0]])
+
+    def _similar(self, word: str) -> Tuple[int, ...]:
+        """Ids of catalog words equal to `word`, else within one typo of it."""
+        wid = self._word_ids.get(word)
+        if wid is not None:
+            return (wid,)
+        if len(word) < FUZZY_MIN - 1:
+            return ()
+        found = set(self._near.get(word, ()))       # query lost a letter
+        for d in deletes(word):
+            wid = self._word_ids.get(d)             # query has an extra letter
+            if wid is not None:
+                found.add(wid)
+            found.update(self._near.get(d, ()))     # a letter replaced or swapped
+        return tuple(found)
+
+    def match(self, key: str) -> Optional[Tuple[int, float]]:
+        """(item id, score) of the one clear fuzzy match for `key`, if any."""
+        words = list(dict.fromkeys(key.split()))
+        n = len(words)
+        if not n:
+            return None
+        postings = self._postings
+        which: Dict[int, int] = {}   # catalog word id -> index of the query word it matches
+        matched = []
+        for i, word in enumerate(words):
+            wids = self._similar(word)
+            if wids:
+                for wid in wids:
+                    which.setdefault(wid, i)
+                matched.append((sum(len(postings[wid]) for wid in wids), wids))
+        # Anything that could win or come within `margin` of winning has at
+        # least `floor` of the query's words, so it must have one of the
+        # n - floor + 1 rarest: only those postings are read, and each item
+        # they turn up is then scored exactly.
+        floor = max(1, math.ceil(max(self.min_score - self.margin, 0.0) * n - 1e-9))
+        if len(matched) < floor:
+            return None
+        matched.sort(key=lambda m: m[0])
+        candidates = set()
+        for _, wids in matched[:len(matched) - floor + 1]:
+            for wid in wids:
+                candidates.update(postings[wid])
+        if len(candidates) > 64 and floor == len(matched):
+            # Every matched word is required (short queries): narrow down in C
+            for _, wids in matched[1:]:
+                candidates.intersection_update(itertools.chain.from_iterable(postings[wid] for wid in wids))
+        if len(candidates) > self.max_candidates:
+            return None  # only very common words matched: a clear winner is unlikely, ask Spotify
+        one_each = len(which) == len(matched)  # no query word matched two catalog words
+        query = frozenset(which)
+        best, best_score, best_tie, runner_up = -1, 0.0, 0.0, 0.0
+        for item_id in candidates:
+            item = self._words[item_id]
+            if one_each:
+                shared = len(query.intersection(item))
+            else:
+                shared = len({which[wid] for wid in item if wid in which})
+            score = shared / n
+            tie = shared / (n + len(item) - shared)  # 1.0 when query and name have the same words
+            if score > best_score or (score == best_score and tie > best_tie):
+                if best >= 0 and best_score > runner_up:
+                    runner_up = best_score
+                best, best_score, best_tie = item_id, score, tie
+            elif score > runner_up:
+                runner_up = score
+        if best < 0 or best_score < self.min_score:
+            return None
+        if best_score - runner_up < self.margin and best_tie < 1.0:  # close call, unless it is the exact name
+            return None
+        return best, best_score
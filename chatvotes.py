@@ -0,0 +1,220 @@
+# chatvotes.py
+import time
+import asyncio
+from collections import Counter, deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from votetally import normalize_query
+
+# Chat-side vote handling for the Twitch bot: votes are micro-batched into
+# /api/vote/bulk, and acknowledgements are folded into one summary line sent
+# through a paced outbox, so a busy chat neither floods the server nor runs
+# into Twitch's chat rate limit (20 messages per 30s for a regular account).
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.stamp = clock()
+
+    def take(self) -> float:
+        """Take a token; returns 0, or how many seconds until one is available."""
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class VoteAcks:
+    """Vote outcomes waiting to be acknowledged in chat, merged into one line."""
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        self.recorded = 0
+        self.busy = 0
+        self.voted = 0
+        self.limited = 0
+        self.failed = 0
+        self.top: Counter = Counter()   # normalized query -> votes
+        self.names: Dict[str, str] = {}  # normalized query -> first raw query
+        self.user = ""
+        self.oldest: Optional[float] = None
+
+    def __bool__(self) -> bool:
+        return bool(self.recorded or self.busy or self.voted or self.limited or self.failed)
+
+    def add(self, user: str, query: str, outcome: str, received: float):
+        if outcome in ("queued", "forwarded"):  # forwarded: a follower's leader was slow to confirm
+            self.recorded += 1
+            key = normalize_query(query)
+            self.top[key] += 1
+            self.names.setdefault(key, query)
+        elif outcome == "busy":
+            self.busy += 1
+        elif outcome == "voted":
+            self.voted += 1
+        elif outcome == "limited":
+            self.limited += 1
+        else:
+            self.failed += 1
+        self.user = user
+        if self.oldest is None or received < self.oldest:
+            self.oldest = received
+
+    def flush(self) -> Tuple[str, float]:
+        """(chat line, seconds the oldest vote in it waited), and start over."""
+        total = self.recorded + self.busy + self.voted + self.limited + self.failed
+        if total == 1:
+            # A lone vote gets the old personal reply
+            if self.recorded:
+                text = f"@{self.user} your vote was recorded."
+            elif self.busy:
+                text = f"@{self.user} voting is busy, try again in a moment."
+            elif self.voted:
+                text = f"@{self.user} you already voted this round."
+            elif self.limited:
+                text = f"@{self.user} slow down a little."
+            else:
+                text = f"@{self.user} vote failed."
+        else:
+            parts = []
+            if self.recorded:
+                key, votes = self.top.most_common(1)[0]
+                parts.append(f"Recorded {self.recorded} vote{'s' if self.recorded > 1 else ''}, "
+                             f"top: {self.names[key]} ({votes}).")
+            if self.voted:
+                parts.append(f"{self.voted} already voted this round.")
+            if self.limited:
+                parts.append(f"{self.limited} too fast.")
+            if self.busy:
+                parts.append(f"{self.busy} dropped, voting is busy.")
+            if self.failed:
+                parts.append(f"{self.failed} failed.")
+            text = " ".join(parts)
+        waited = self.clock() - self.oldest
+        self.reset()
+        return text, waited
+
+class ChatOutbox:
+    """Paced chat sender.
+
+    Replies (usage, !queue...) go out in order; vote acknowledgements are
+    merged into one pending summary that is sent whenever the token bucket
+    allows, so acks never queue up behind each other.
+    """
+    def __init__(self, send: Callable[[str], Awaitable], rate: float = 20 / 30, burst: float = 5,
+                 maxlen: int = 20, clock: Callable[[], float] = time.monotonic):
+        self.send = send
+        self.bucket = TokenBucket(rate, burst, clock)
+        self.messages: deque = deque(maxlen=maxlen)
+        self.acks = VoteAcks(clock)
+        self._wake = asyncio.Event()
+        self.sent = 0
+        self.errors = 0
+        self.ack_waits: deque = deque(maxlen=1000)  # recent ack latencies, seconds
+
+    def stats(self) -> Dict:
+        return {"sent": self.sent, "errors": self.errors, "pending": len(self.messages) + bool(self.acks)}
+
+    def say(self, text: str):
+        self.messages.append(text)
+        self._wake.set()
+
+    def ack(self, user: str, query: str, outcome: str, received: float):
+        self.acks.add(user, query, outcome, received)
+        self._wake.set()
+
+    async def run(self):
+        while True:
+            if not self.messages and not self.acks:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            delay = self.bucket.take()
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+            if self.messages:
+                text = self.messages.popleft()
+            else:
+                text, waited = self.acks.flush()
+                self.ack_waits.append(waited)
+            try:
+                await self.send(text)
+                self.sent += 1
+            except Exception:
+                self.errors += 1
+
+class VoteBatcher:
+    """Collects chat votes for up to `window` seconds (or `max_batch` votes)
+    and submits them in one request.
+
+    `post(votes)` sends [{"query", "voter"}...] to /api/vote/bulk and returns the
+    httpclient.Response. Batches go out one at a time, so a slow server makes
+    batches bigger rather than requests more numerous. Past `max_pending`
+    waiting votes, new ones are acknowledged as busy straight away.
+    """
+    def __init__(self, post: Callable[[List[Dict]], Awaitable], outbox: ChatOutbox,
+                 window: float = 0.25, max_batch: int = 500, max_pending: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.post = post
+        self.outbox = outbox
+        self.window = window
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.clock = clock
+        self.pending: List[Tuple[str, str, float]] = []
+        self._ready = asyncio.Event()
+        self._full = asyncio.Event()
+        self.submitted = 0
+        self.requests = 0
+        self.dropped = 0
+
+    def stats(self) -> Dict:
+        return {"pending": len(self.pending), "submitted": self.submitted, "requests": self.requests,
+                "dropped": self.dropped}
+
+    def add(self, user: str, query: str):
+        now = self.clock()
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            self.outbox.ack(user, query, "busy", now)
+            return
+        self.pending.append((user, query, now))
+        self._ready.set()
+        if len(self.pending) >= self.max_batch:
+            self._full.set()
+
+    async def run(self):
+        while True:
+            await self._ready.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.window)
+            except asyncio.TimeoutError:
+                pass
+            batch, self.pending = self.pending[:self.max_batch], self.pending[self.max_batch:]
+            self._full.clear()
+            if not self.pending:
+                self._ready.clear()
+            elif len(self.pending) >= self.max_batch:
+                self._full.set()
+            await self._submit(batch)
+
+    async def _submit(self, batch: List[Tuple[str, str, float]]):
+        self.requests += 1
+        self.submitted += len(batch)
+        try:
+            resp = await self.post([{"query": query, "voter": "twitch:" + user.lower()} for user, query, _ in batch])
+            results = resp.json().get("results") if resp.ok or resp.status == 503 else None
+        except Exception:
+            results = None
+        if not results or len(results) != len(batch):
+            results = ["failed"] * len(batch)
+        for (user, query, received), outcome in zip(batch, results):
+            self.outbox.ack(user, query, outcome, received)
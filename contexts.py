@@ -0,0 +1,204 @@
+# contexts.py
+import base64
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+PAGE_LIMITS = {"album": 50, "playlist": 100}  # most tracks Spotify returns per page
+
+def context_kind(uri: str) -> Optional[str]:
+    """'album' or 'playlist' for a context URI, None for anything else."""
+    parts = (uri or "").split(":")
+    if len(parts) == 3 and parts[0] == "spotify" and parts[1] in PAGE_LIMITS:
+        return parts[1]
+    return None
+
+class PlayedBits:
+    """One bit per track position of a context: set once played or skipped."""
+    __slots__ = ("bits", "count")
+
+    def __init__(self, data: bytes = b""):
+        self.bits = bytearray(data)
+        self.count = sum(bin(b).count("1") for b in self.bits)
+
+    def __contains__(self, pos: int) -> bool:
+        i = pos >> 3
+        return i < len(self.bits) and bool(self.bits[i] >> (pos & 7) & 1)
+
+    def add(self, pos: int) -> bool:
+        """Set `pos`; False if it was already set."""
+        i = pos >> 3
+        if i >= len(self.bits):
+            self.bits.extend(bytes(i + 1 - len(self.bits)))
+        mask = 1 << (pos & 7)
+        if self.bits[i] & mask:
+            return False
+        self.bits[i] |= mask
+        self.count += 1
+        return True
+
+    def first_clear(self, pos: int) -> int:
+        """Lowest position >= `pos` that is not set."""
+        while pos in self:
+            pos += 1
+            if not pos & 7:
+                i = pos >> 3
+                while i < len(self.bits) and self.bits[i] == 0xFF:
+                    i += 1  # skip whole bytes of played tracks
+                pos = i << 3
+        return pos
+
+class _Cursor:
+    __slots__ = ("kind", "total", "played", "position")
+
+    def __init__(self, kind: str, total: Optional[int] = None, played: bytes = b""):
+        self.kind = kind
+        self.total = total          # known after the first page
+        self.played = PlayedBits(played)
+        self.position = self.played.first_clear(0)
+
+class ContextTracks:
+    """Albums and playlists played track by track, fetched a page at a time.
+
+    next(uri) returns the next unplayed (position, entry) of the context, or
+    None when it is finished. Pages are only fetched when play reaches them,
+    and the following page is prefetched `prefetch` tracks before the end
+    of the current one, so a 5,000-track playlist costs one request per
+    page as it is played rather than fifty up front.
+
+    `fetch_page(uri, offset, limit)` returns (total, entries), where an
+    entry is None for something that can't be played (local files,
+    removed tracks, podcast episodes). Pages are kept in an LRU of
+    `cache_pages` shared by all contexts; per context only a bitmap of
+    played positions is kept, so memory stays bounded however long the
+    playlist. Marking is idempotent: a position replayed from the journal
+    or reported twice is never played again.
+
+    Beyond `max_contexts` the least recently used bitmaps are dropped, but
+    never one for which `in_queue(uri)` is true: losing it would replay the
+    context from the top when it comes up.
+    """
+    def __init__(self, fetch_page: Callable[[str, int, int], Awaitable[Tuple[int, List[Optional[Dict]]]]],
+                 cache_pages: int = 64, prefetch: int = 2, max_contexts: int = 256,
+                 in_queue: Callable[[str], bool] = lambda uri: False):
+        self.fetch_page = fetch_page
+        self.cache_pages = cache_pages
+        self.prefetch = prefetch
+        self.max_contexts = max_contexts
+        self.in_queue = in_queue
+        self._cursors: "OrderedDict[str, _Cursor]" = OrderedDict()
+        self._pages: "OrderedDict[Tuple[str, int], Tuple[int, Tuple[Optional[Dict], ...]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+        self.fetches = 0
+        self.page_hits = 0
+        self.prefetches = 0
+        self.errors = 0
+        self.served = 0
+
+    def stats(self) -> Dict:
+        return {"contexts": len(self._cursors), "pages": len(self._pages), "fetches": self.fetches,
+                "page_hits": self.page_hits, "prefetches": self.prefetches, "errors": self.errors,
+                "served": self.served}
+
+    def _cursor(self, uri: str) -> _Cursor:
+        cur = self._cursors.get(uri)
+        if cur is None:
+            cur = self._cursors[uri] = _Cursor(context_kind(uri))
+            if len(self._cursors) > self.max_contexts:
+                self._evict(uri)
+        else:
+            self._cursors.move_to_end(uri)
+        return cur
+
+    def _evict(self, keep: str):
+        # Least recently used first; queued contexts stay even if that means going over
+        for uri in list(self._cursors):
+            if len(self._cursors) <= self.max_contexts:
+                break
+            if uri != keep and not self.in_queue(uri):
+                del self._cursors[uri]
+
+    async def _page(self, uri: str, offset: int) -> Tuple[int, Tuple[Optional[Dict], ...]]:
+        key = (uri, offset)
+        page = self._pages.get(key)
+        if page is not None:
+            self._pages.move_to_end(key)
+            self.page_hits += 1
+            return page
+        return await asyncio.shield(self._fetch(key))  # shared with a prefetch already under way
+
+    def _fetch(self, key: Tuple[str, int]) -> asyncio.Future:
+        fut = self._inflight.get(key)
+        if fut is None:
+            self.fetches += 1
+            fut = self._inflight[key] = asyncio.ensure_future(self._load(*key))
+            fut.add_done_callback(lambda f: self._done(key, f))
+        return fut
+
+    def _done(self, key: Tuple[str, int], fut: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not fut.cancelled() and fut.exception() is not None:
+            self.errors += 1
+
+    async def _load(self, uri: str, offset: int) -> Tuple[int, Tuple[Optional[Dict], ...]]:
+        total, entries = await self.fetch_page(uri, offset, PAGE_LIMITS[context_kind(uri)])
+        page = (total, tuple(entries))
+        self._pages[(uri, offset)] = page
+        while len(self._pages) > self.cache_pages:
+            self._pages.popitem(last=False)
+        return page
+
+    def _prefetch(self, uri: str, offset: int):
+        key = (uri, offset)
+        if key not in self._pages and key not in self._inflight:
+            self.prefetches += 1
+            self._fetch(key)
+
+    def warm(self, uri: str):
+        """Start fetching the page play will continue from (e.g. when a context is queued)."""
+        cur = self._cursor(uri)
+        limit = PAGE_LIMITS[cur.kind]
+        self._prefetch(uri, cur.position - cur.position % limit)
+
+    async def next(self, uri: str) -> Optional[Tuple[int, Dict]]:
+        """(position, entry) of the next track to play, or None when finished."""
+        cur = self._cursor(uri)
+        limit = PAGE_LIMITS[cur.kind]
+        pos = cur.position
+        while cur.total is None or pos < cur.total:
+            offset = pos - pos % limit
+            total, entries = await self._page(uri, offset)
+            cur.total = total
+            if pos >= total or pos - offset >= len(entries):
+                break  # the playlist got shorter
+            entry = entries[pos - offset]
+            if entry is None:
+                self.mark(uri, pos)  # nothing playable here
+                pos = cur.position
+                continue
+            nxt = offset + limit
+            if nxt < total and pos - offset >= len(entries) - 1 - self.prefetch:
+                self._prefetch(uri, nxt)
+            self.served += 1
+            return pos, dict(entry)
+        return None
+
+    def mark(self, uri: str, pos: int):
+        """Position `pos` of the context has been played (or skipped)."""
+        cur = self._cursor(uri)
+        if cur.played.add(pos) and pos == cur.position:
+            cur.position = cur.played.first_clear(pos)
+
+    def forget(self, uri: str):
+        """The context left the queue: its next win starts from the top."""
+        self._cursors.pop(uri, None)
+
+    def dump(self) -> Dict[str, List]:
+        return {uri: [cur.total, base64.b64encode(bytes(cur.played.bits)).decode("ascii")]
+                for uri, cur in self._cursors.items()}
+
+    def restore(self, data: Dict[str, List]):
+        self._cursors.clear()
+        for uri, (total, bits) in data.items():
+            if context_kind(uri):
+                self._cursors[uri] = _Cursor(context_kind(uri), total, base64.b64decode(bits))
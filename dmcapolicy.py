@@ -0,0 +1,253 @@
+# dmcapolicy.py
+"""DMCA allow/warn/deny rules for tracks, albums and playlists.
+
+The rules file has one rule per line, `<action> <kind> <value>`:
+
+    # comments and blank lines are ignored
+    deny  uri      spotify:track:4uLU6hMCjMI75M1A2tKUQC
+    allow artist   Kevin MacLeod
+    deny  label    Some Records
+    warn  keyword  live at
+    deny  keyword  nightcore
+
+action: allow | warn | deny. kind: uri | artist | label | keyword.
+Artists, labels and keywords compare case-insensitively; keywords match
+whole words or phrases of the title or album name. The most specific
+kind that matches decides: a URI rule, else artist/label rules, else
+keywords, and within one kind deny beats warn beats allow. An item no
+rule mentions gets the default (approved).
+"""
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+ACTIONS = {"allow": 0, "warn": 1, "deny": 2}
+DECISIONS = ("approved", "warn", "denied")
+KINDS = ("uri", "artist", "label", "keyword")
+
+log = logging.getLogger(__name__)
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over casefolded keywords.
+
+    One pass over the text finds every keyword occurrence however many
+    keywords there are; only occurrences on word boundaries count.
+    """
+    def __init__(self, keywords: Dict[str, int]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[Tuple[int, int], ...]] = [()]  # state -> ((length, rank), ...)
+        for word, rank in keywords.items():
+            state = 0
+            for ch in word:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = self._goto[state][ch] = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = nxt
+            self._out[state] += ((len(word), rank),)
+        # Breadth-first: fail links point at the longest proper suffix in the trie
+        level = list(self._goto[0].values())
+        while level:
+            nxt_level = []
+            for state in level:
+                for ch, child in self._goto[state].items():
+                    f = self._fail[state]
+                    while f and ch not in self._goto[f]:
+                        f = self._fail[f]
+                    f = self._goto[f].get(ch, 0)
+                    self._fail[child] = f if f != child else 0
+                    self._out[child] += self._out[self._fail[child]]
+                    nxt_level.append(child)
+            level = nxt_level
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def strongest(self, text: str) -> int:
+        """Highest rank among keywords found in `text` (casefolded), or -1."""
+        goto, fail, out = self._goto, self._fail, self._out
+        best, state, end = -1, 0, len(text)
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, rank in out[state]:
+                if rank > best and (i + 1 == end or not text[i + 1].isalnum()) \
+                        and (i < length or not text[i - length].isalnum()):
+                    best = rank
+                    if best == 2:
+                        return best
+        return best
+
+class Policy:
+    """One compiled rules file."""
+    def __init__(self, rules: Iterable[Tuple[str, str, str]] = ()):
+        self.uris: Dict[str, int] = {}
+        self.artists: Dict[str, int] = {}
+        self.labels: Dict[str, int] = {}
+        keywords: Dict[str, int] = {}
+        self.count = 0
+        for action, kind, value in rules:
+            rank = ACTIONS[action]
+            table = {"uri": self.uris, "artist": self.artists, "label": self.labels, "keyword": keywords}[kind]
+            key = value if kind == "uri" else value.casefold()
+            table[key] = max(rank, table.get(key, -1))
+            self.count += 1
+        self.keywords = KeywordMatcher(keywords) if keywords else None
+
+    @classmethod
+    def parse(cls, text: str) -> Tuple["Policy", List[str]]:
+        """(policy, problems): bad lines are reported and skipped."""
+        rules, problems = [], []
+        for n, line in enumerate(text.splitlines(), 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split(None, 2)
+            if len(parts) != 3 or parts[0].lower() not in ACTIONS or parts[1].lower() not in KINDS:
+                problems.append(f"line {n}: expected '<allow|warn|deny> <uri|artist|label|keyword> <value>'")
+                continue
+            rules.append((parts[0].lower(), parts[1].lower(), parts[2].strip()))
+        return cls(rules), problems
+
+    def rank(self, item: Dict) -> int:
+        rank = self.uris.get(item.get("uri") or "", -1)
+        if rank >= 0:
+            return rank
+        if self.artists:
+            for name in artist_names(item):
+                rank = max(rank, self.artists.get(name.casefold(), -1))
+        title, album, label = item_fields(item)
+        if self.labels and label:
+            rank = max(rank, self.labels.get(label.casefold(), -1))
+        if rank >= 0:
+            return rank
+        if self.keywords is not None:
+            return self.keywords.strongest(f"{title}\n{album}".casefold())
+        return -1
+
+def item_fields(item: Dict) -> Tuple[str, str, str]:
+    """(title, album name, label) of a Spotify object or of one of our entries.
+
+    Entries carry the album name and label as plain strings, Spotify
+    objects nest them under "album"; both shapes of the same track must
+    give the same fields, since decisions are cached per URI.
+    """
+    title = item.get("name") or item.get("title") or ""
+    album = item.get("album") or ""
+    label = item.get("label") or ""
+    if isinstance(album, dict):
+        label = label or album.get("label") or ""
+        album = album.get("name") or ""
+    return title, album, label
+
+def artist_names(item: Dict) -> List[str]:
+    """Artist names of a Spotify object or of one of our entries ("A, B")."""
+    names = [a.get("name", "") for a in item.get("artists") or ()]
+    if not names:
+        joined = item.get("artist") or (item.get("owner") or {}).get("display_name") or ""
+        names = [joined] + (joined.split(", ") if ", " in joined else [])
+    return names
+
+class PolicyEngine:
+    """The live policy: decisions cached per URI, reloaded when the file changes.
+
+    run() checks the file's mtime every `check_interval` seconds and
+    compiles a changed file on a worker thread, then swaps it in and
+    drops the cache; a file that fails to read keeps the old rules.
+    """
+    def __init__(self, path: str, default: str = "approved", check_interval: float = 2.0, cache_size: int = 10000):
+        self.path = path
+        self.default = default
+        self.check_interval = check_interval
+        self.cache_size = cache_size
+        self.policy = Policy()
+        self.problems: List[str] = []
+        self._mtime: Optional[float] = None
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self.on_reload = None  # called after a reload swaps the rules in
+        self.reloads = 0
+        self.hits = 0
+        self.misses = 0
+        self.denied = 0
+
+    def stats(self) -> Dict:
+        return {"rules": self.policy.count, "reloads": self.reloads, "problems": len(self.problems),
+                "cached": len(self._cache), "hits": self.hits, "misses": self.misses, "denied": self.denied}
+
+    def _stat(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def _compile(self) -> Tuple[Policy, List[str]]:
+        with open(self.path, encoding="utf-8") as f:
+            return Policy.parse(f.read())
+
+    def load(self) -> bool:
+        """Read the rules now if the file changed; True if they were replaced."""
+        if not self.path:
+            return False
+        mtime = self._stat()
+        if mtime == self._mtime:
+            return False
+        try:
+            policy, problems = self._compile() if mtime is not None else (Policy(), [])
+        except (OSError, UnicodeDecodeError):
+            return False
+        self._swap(policy, problems, mtime)
+        return True
+
+    def _swap(self, policy: Policy, problems: List[str], mtime: Optional[float]):
+        self.policy, self.problems, self._mtime = policy, problems, mtime
+        self._cache.clear()
+        self.reloads += 1
+        for p in problems[:5]:
+            log.warning("%s: %s", self.path, p)
+        if self.on_reload is not None:
+            self.on_reload()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.check_interval)
+            mtime = self._stat()
+            if mtime == self._mtime:
+                continue
+            try:
+                policy, problems = (await loop.run_in_executor(None, self._compile)) if mtime is not None else (Policy(), [])
+            except (OSError, UnicodeDecodeError):
+                continue
+            self._swap(policy, problems, mtime)
+
+    def decide(self, item: Optional[Dict]) -> str:
+        """'approved' | 'warn' | 'denied' for a Spotify object or an entry dict."""
+        if not item:
+            return self.default
+        uri = item.get("uri")
+        if uri:
+            decision = self._cache.get(uri)
+            if decision is not None:
+                self._cache.move_to_end(uri)
+                self.hits += 1
+                return decision
+        self.misses += 1
+        rank = self.policy.rank(item)
+        decision = DECISIONS[rank] if rank >= 0 else self.default
+        if uri:
+            self._cache[uri] = decision
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return decision
+
+    def allowed(self, item: Optional[Dict]) -> bool:
+        if self.decide(item) != "denied":
+            return True
+        self.denied += 1
+        return False
@@ -0,0 +1,294 @@
+# fakespotify.py
+"""Stand-in for the parts of the Spotify Web API the server uses.
+
+Serves the token endpoint, search, the player (state and play), album and
+playlist track pages, and cover images for a generated catalog, with optional
+added latency and injected 429s. Point the server at it with
+
+    SPOTIFY_ACCOUNTS_URL=http://127.0.0.1:8910 SPOTIFY_API_URL=http://127.0.0.1:8910/v1
+    IMG_UPSTREAM=http://127.0.0.1:8910/image/
+
+Usage: python fakespotify.py [--port 8910] [--latency 0.05] [--rate-limit 0.01]
+"""
+import time
+import zlib
+import struct
+import random
+import asyncio
+import argparse
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+WORDS = (
+    "love night heart fire dream summer rain light dance blue gold wild midnight river city road "
+    "home girl boy baby sky star moon sun ocean shadow ghost angel devil paradise island highway "
+    "electric neon velvet silver broken lonely crazy sweet bitter young forever tonight yesterday "
+    "tomorrow echo thunder storm winter autumn spring garden kingdom empire rebel runaway stranger "
+    "lover sugar honey diamond crystal glass mirror window door train station radio vinyl disco "
+    "memory promise secret whisper silence rhythm fever golden hour bohemian rhapsody stairway "
+    "heaven hotel california sweet child mine smells teen spirit billie jean purple haze"
+).split()
+ARTISTS = ("Queen", "The Weeknd", "Dua Lipa", "Daft Punk", "Arctic Monkeys", "Billie Eilish", "Kendrick Lamar",
+           "Taylor Swift", "Radiohead", "Fleetwood Mac", "Tame Impala", "Lorde", "Nirvana", "Led Zeppelin",
+           "Michael Jackson", "Eagles", "Guns N' Roses", "Jimi Hendrix", "Florence + The Machine", "Muse")
+
+def _png(rgb) -> bytes:
+    """A small solid-colour 300x300 PNG, built without Pillow."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    row = b"\x00" + bytes(rgb) * 300
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", 300, 300, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * 300)) + chunk(b"IEND", b""))
+
+def _id(n: int) -> str:
+    return f"{n:022d}"
+
+class Catalog:
+    """Deterministic tracks, albums and playlists generated from a seed.
+
+    Track n is on album n // album_size; playlist p holds `playlist_sizes[p]`
+    tracks picked pseudo-randomly. Nothing per playlist entry is stored, so
+    a 5,000-track playlist costs nothing until it is paged.
+    """
+    def __init__(self, tracks: int = 10_000, album_size: int = 12, playlists: int = 200, seed: int = 1):
+        self.album_size = album_size
+        self.seed = seed
+        rng = random.Random(seed)
+        self.titles: List[str] = []
+        self.durations: List[int] = []
+        for _ in range(tracks):
+            self.titles.append(" ".join(rng.sample(WORDS, rng.choice((1, 2, 2, 3)))).title())
+            self.durations.append(rng.randint(120_000, 360_000))
+        albums = (tracks + album_size - 1) // album_size
+        self.album_titles = [" ".join(rng.sample(WORDS, 2)).title() for _ in range(albums)]
+        self.playlist_sizes = [5000 if p == 0 else rng.choice((10, 25, 50, 100, 250, 1000)) for p in range(playlists)]
+        self.playlist_titles = [f"{' '.join(rng.sample(WORDS, 2)).title()} Mix" for _ in range(playlists)]
+        self._words: Dict[str, Dict[str, set]] = {"track": defaultdict(set), "album": defaultdict(set),
+                                                   "playlist": defaultdict(set)}
+        for n, title in enumerate(self.titles):
+            for w in f"{title} {self.artist(n)}".lower().split():
+                self._words["track"][w].add(n)
+        for a, title in enumerate(self.album_titles):
+            for w in f"{title} {self.artist(a * album_size)}".lower().split():
+                self._words["album"][w].add(a)
+        for p, title in enumerate(self.playlist_titles):
+            for w in title.lower().split():
+                self._words["playlist"][w].add(p)
+
+    def artist(self, n: int) -> str:
+        return ARTISTS[(n // self.album_size) % len(ARTISTS)]
+
+    def images(self, album: int, base: str) -> List[Dict]:
+        key = f"ab67616d0000b273{album:024x}"
+        return [{"url": f"{base}/image/{key}", "width": 640, "height": 640},
+                {"url": f"{base}/image/{key}", "width": 300, "height": 300},
+                {"url": f"{base}/image/{key}", "width": 64, "height": 64}]
+
+    def album(self, a: int, base: str) -> Dict:
+        return {"type": "album", "id": _id(a), "uri": f"spotify:album:{_id(a)}", "name": self.album_titles[a],
+                "artists": [{"name": self.artist(a * self.album_size)}], "images": self.images(a, base),
+                "total_tracks": min(self.album_size, len(self.titles) - a * self.album_size)}
+
+    def track(self, n: int, base: str, simplified: bool = False) -> Dict:
+        item = {"type": "track", "id": _id(n), "uri": f"spotify:track:{_id(n)}", "name": self.titles[n],
+                "artists": [{"name": self.artist(n)}], "duration_ms": self.durations[n],
+                "track_number": n % self.album_size + 1}
+        if not simplified:  # album track listings leave the album out
+            item["album"] = self.album(n // self.album_size, base)
+        return item
+
+    def playlist(self, p: int, base: str) -> Dict:
+        return {"type": "playlist", "id": _id(p), "uri": f"spotify:playlist:{_id(p)}", "name": self.playlist_titles[p],
+                "owner": {"display_name": "fake"}, "images": self.images(p % len(self.album_titles), base),
+                "tracks": {"total": self.playlist_sizes[p]}}
+
+    def playlist_track(self, p: int, i: int) -> int:
+        return (p * 7919 + i * 104729 + self.seed) % len(self.titles)
+
+    def search(self, kind: str, q: str, limit: int) -> List[int]:
+        # Every query word must prefix-match a word of the item (title, artist)
+        index = self._words[kind]
+        found: Optional[set] = None
+        for token in q.lower().split():
+            hits = set()
+            for word, ids in index.items():
+                if word.startswith(token):
+                    hits |= ids
+            found = hits if found is None else found & hits
+            if not found:
+                return []
+        return sorted(found or ())[:limit]
+
+class FakeSpotify:
+    def __init__(self, catalog: Catalog, latency: float = 0.0, jitter: float = 0.0,
+                 rate_limit: float = 0.0, retry_after: int = 1, token_ttl: int = 3600,
+                 track_seconds: float = 0.0, seed: int = 1):
+        self.catalog = catalog
+        self.latency = latency          # seconds added to every API call
+        self.jitter = jitter            # +/- uniform spread on top of `latency`
+        self.rate_limit = rate_limit    # fraction of calls answered 429
+        self.retry_after = retry_after
+        self.token_ttl = token_ttl
+        self.track_seconds = track_seconds  # > 0 overrides every track's length (fast rounds)
+        self.rng = random.Random(seed)
+        self.tokens = 0
+        self.calls: Counter = Counter()
+        self.limited: Counter = Counter()
+        self.playing: Optional[Dict] = None   # item being played
+        self.started = 0.0
+        self.duration_ms = 0
+        self.context: Optional[Dict] = None
+
+    def stats(self) -> Dict:
+        return {"calls": dict(self.calls), "limited": dict(self.limited), "tokens": self.tokens}
+
+    @web.middleware
+    async def faults(self, request: web.Request, handler):
+        name = request.match_info.route.name or request.path
+        if name.startswith("_"):
+            return await handler(request)
+        self.calls[name] += 1
+        delay = self.latency + (self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.rate_limit and self.rng.random() < self.rate_limit:
+            self.limited[name] += 1
+            return web.json_response({"error": {"status": 429, "message": "API rate limit exceeded"}},
+                                     status=429, headers={"Retry-After": str(self.retry_after)})
+        if name not in ("token", "image") and not request.headers.get("Authorization", "").startswith("Bearer "):
+            return web.json_response({"error": {"status": 401, "message": "No token provided"}}, status=401)
+        return await handler(request)
+
+    def base(self, request: web.Request) -> str:
+        return f"{request.scheme}://{request.host}"
+
+    async def token(self, request: web.Request):
+        form = await request.post()
+        if form.get("grant_type") != "refresh_token" or not request.headers.get("Authorization", "").startswith("Basic "):
+            return web.json_response({"error": "invalid_request"}, status=400)
+        self.tokens += 1
+        return web.json_response({"access_token": f"fake-{self.tokens}", "token_type": "Bearer",
+                                  "expires_in": self.token_ttl, "scope": "user-modify-playback-state"})
+
+    async def search(self, request: web.Request):
+        q = request.query.get("q", "")
+        limit = min(int(request.query.get("limit", "20")), 50)
+        kinds = request.query.get("type", "track").split(",")
+        base, cat = self.base(request), self.catalog
+        out = {}
+        make = {"track": cat.track, "album": cat.album, "playlist": cat.playlist}
+        for kind in kinds:
+            if kind in make:
+                items = [make[kind](n, base) for n in cat.search(kind, q, limit)]
+                out[kind + "s"] = {"items": items, "total": len(items), "limit": limit, "offset": 0}
+        return web.json_response(out)
+
+    def _page(self, request: web.Request, total: int, max_limit: int, item):
+        offset = max(0, int(request.query.get("offset", "0")))
+        limit = max(1, min(int(request.query.get("limit", "20")), max_limit))
+        items = [item(i) for i in range(offset, min(offset + limit, total))]
+        nxt = None
+        if offset + limit < total:
+            nxt = f"{self.base(request)}{request.path}?offset={offset + limit}&limit={limit}"
+        return web.json_response({"items": items, "total": total, "limit": limit, "offset": offset, "next": nxt})
+
+    async def album_tracks(self, request: web.Request):
+        cat, base = self.catalog, self.base(request)
+        a = int(request.match_info["id"])
+        if a >= len(cat.album_titles):
+            return web.json_response({"error": {"status": 404, "message": "Non existing id"}}, status=404)
+        first = a * cat.album_size
+        total = min(cat.album_size, len(cat.titles) - first)
+        return self._page(request, total, 50, lambda i: cat.track(first + i, base, simplified=True))
+
+    async def playlist_tracks(self, request: web.Request):
+        cat, base = self.catalog, self.base(request)
+        p = int(request.match_info["id"])
+        if p >= len(cat.playlist_sizes):
+            return web.json_response({"error": {"status": 404, "message": "Non existing id"}}, status=404)
+        return self._page(request, cat.playlist_sizes[p], 100,
+                          lambda i: {"track": cat.track(cat.playlist_track(p, i), base)})
+
+    def _resolve(self, uri: str, base: str) -> Optional[Dict]:
+        parts = uri.split(":")
+        if len(parts) != 3 or parts[0] != "spotify" or not parts[2].isdigit():
+            return None
+        kind, n, cat = parts[1], int(parts[2]), self.catalog
+        if kind == "track" and n < len(cat.titles):
+            return cat.track(n, base)
+        if kind == "album" and n < len(cat.album_titles):
+            return cat.track(n * cat.album_size, base)
+        if kind == "playlist" and n < len(cat.playlist_sizes):
+            return cat.track(cat.playlist_track(n, 0), base)
+        return None
+
+    async def play(self, request: web.Request):
+        body = await request.json() if request.can_read_body else {}
+        base = self.base(request)
+        uris = body.get("uris") or []
+        context = body.get("context_uri")
+        if context:
+            item = self._resolve(context, base)
+        elif uris:
+            item = self._resolve(uris[0], base)
+        else:
+            item = self.playing
+        if item is None:
+            return web.json_response({"error": {"status": 400, "message": "Invalid track uri"}}, status=400)
+        self.playing = item
+        self.context = {"uri": context, "type": context.split(":")[1]} if context else None
+        self.started = time.monotonic()
+        self.duration_ms = int(self.track_seconds * 1000) if self.track_seconds > 0 else item["duration_ms"]
+        return web.Response(status=204)
+
+    async def player(self, request: web.Request):
+        if self.playing is None:
+            return web.Response(status=204)
+        progress = int((time.monotonic() - self.started) * 1000)
+        playing = progress < self.duration_ms
+        item = dict(self.playing, duration_ms=self.duration_ms)
+        return web.json_response({"item": item, "is_playing": playing, "progress_ms": progress if playing else 0,
+                                  "context": self.context, "device": {"id": "fake", "name": "Fake Device"}})
+
+    async def image(self, request: web.Request):
+        key = request.match_info["id"]
+        seed = zlib.crc32(key.encode())
+        return web.Response(body=_png((seed & 0xFF, seed >> 8 & 0xFF, seed >> 16 & 0xFF)), content_type="image/png")
+
+    async def fake_stats(self, request: web.Request):
+        return web.json_response(self.stats())
+
+def make_app(fake: FakeSpotify) -> web.Application:
+    app = web.Application(middlewares=[fake.faults])
+    app.router.add_post("/api/token", fake.token, name="token")
+    app.router.add_get("/v1/search", fake.search, name="search")
+    app.router.add_get("/v1/me/player", fake.player, name="player")
+    app.router.add_put("/v1/me/player/play", fake.play, name="play")
+    app.router.add_get("/v1/albums/{id}/tracks", fake.album_tracks, name="album_tracks")
+    app.router.add_get("/v1/playlists/{id}/tracks", fake.playlist_tracks, name="playlist_tracks")
+    app.router.add_get("/image/{id}", fake.image, name="image")
+    app.router.add_get("/_fake/stats", fake.fake_stats, name="_stats")
+    return app
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8910)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of uniform noise on the latency")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of calls answered 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--token-ttl", type=int, default=3600)
+    parser.add_argument("--track-seconds", type=float, default=0.0, help="play every track for this long (0 = real length)")
+    parser.add_argument("--tracks", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    fake = FakeSpotify(Catalog(args.tracks, seed=args.seed), latency=args.latency, jitter=args.jitter,
+                       rate_limit=args.rate_limit, retry_after=args.retry_after, token_ttl=args.token_ttl,
+                       track_seconds=args.track_seconds, seed=args.seed)
+    web.run_app(make_app(fake), host=args.host, port=args.port, print=None, access_log=None)
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,272 @@
 # host_gui.py
 import os
+import time
+import heapq
+import bisect
 import asyncio
 import threading
 import json
+import hashlib
 import tkinter as tk
 from tkinter import ttk
 from io import BytesIO
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageTk
 import aiohttp
 
+import httpclient
+from singleflight import SingleFlight
+
 API_BASE = os.getenv("API_BASE", "http://localhost:3000")
 WS_URL = API_BASE.replace("http", "ws") + "/ws/v1"
+HOST_TOKEN = os.getenv("HOST_TOKEN", "")  # sent on toggle/remove when the server requires it
+HOST_HEADERS = {"X-Host-Token": HOST_TOKEN} if HOST_TOKEN else None
+THUMB_DIR = os.getenv("THUMB_DIR", os.path.join(os.path.expanduser("~"), ".interactive_thumbs"))
+THUMB_MEMORY = int(os.getenv("THUMB_MEMORY", "200"))  # resized covers kept as PhotoImages
+THUMB_DISK_MB = float(os.getenv("THUMB_DISK_MB", "100"))  # thumbnails kept on disk
+THUMB_MAX_DAYS = float(os.getenv("THUMB_MAX_DAYS", "30"))  # unused this long: deleted on startup
+FRAME_MS = int(os.getenv("FRAME_MS", "16"))  # render at most once per display frame
+
+def cover_at(url, px):
+    # Server-side thumbnails (/img/<size>/<id>): ask for the size we show
+    if url.startswith("/img/"):
+        return f"/img/{px}/{url.split('/', 3)[3]}"
+    return url
+
+class ThumbCache:
+    """Two-tier cache of resized cover art, keyed by (url, size).
+
+    Tier 1 is an LRU of PhotoImages (Tk thread only). Tier 2 is PNG thumbnails
+    on disk, so a restart doesn't re-download. Downloads run on the asyncio
+    loop, decoding/resizing/disk IO on a small thread pool, and concurrent
+    requests for the same cover share one load.
+
+    The disk tier is pruned on startup: files unused for `max_age` seconds
+    go, then the least recently used until it fits in `disk_bytes`. A disk
+    hit refreshes the file's mtime, which is what "used" means here.
+
+    Finished loads wait in `ready` until the Tk thread calls install_ready();
+    Tk must not be called from the asyncio thread.
+    """
+    def __init__(self, loop, directory: str = THUMB_DIR, maxsize: int = THUMB_MEMORY,
+                 disk_bytes: int = int(THUMB_DISK_MB * (1 << 20)), max_age: float = THUMB_MAX_DAYS * 86400):
+        self.loop = loop
+        self.directory = directory
+        self.maxsize = maxsize
+        self.disk_bytes = disk_bytes
+        self.max_age = max_age
+        self.images: "OrderedDict[tuple, ImageTk.PhotoImage]" = OrderedDict()
+        self._flights = SingleFlight()  # asyncio thread only
+        self.ready = deque()  # (key, PIL image, widget), appended by the asyncio thread
+        self.pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="thumbs")
+        os.makedirs(directory, exist_ok=True)
+        self.pool.submit(self._prune)
+
+    def apply(self, widget, url, size):
+        """Show the cover on `widget`; call from the Tk thread."""
+        key = (url, tuple(size))
+        img = self.images.get(key)
+        if img is not None:
+            self.images.move_to_end(key)
+            widget.image = img  # keep ref
+            widget.configure(image=img)
+            return
+        asyncio.run_coroutine_threadsafe(self._load(key, widget), self.loop)
+
+    async def _load(self, key, widget):
+        try:
+            pil = await self._flights.run(key, lambda: self._fetch(*key))
+        except Exception:
+            return
+        self.ready.append((key, pil, widget))
+
+    def install_ready(self):
+        """Show covers that finished loading; call from the Tk thread."""
+        while self.ready:
+            self._install(*self.ready.popleft())
+
+    def _path(self, url, size):
+        digest = hashlib.sha1(url.encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}_{size[0]}x{size[1]}.png")
+
+    async def _fetch(self, url, size):
+        path = self._path(url, size)
+        pil = await self.loop.run_in_executor(self.pool, self._read_disk, path)
+        if pil is None:
+            resp = await httpclient.request("GET", API_BASE + url if url.startswith("/") else url)
+            if not resp.ok:
+                raise OSError(f"cover fetch failed: HTTP {resp.status}")
+            pil = await self.loop.run_in_executor(self.pool, self._decode, resp.body, size, path)
+        return pil
+
+    def _prune(self):
+        files, used, cutoff = [], 0, time.time() - self.max_age
+        for entry in os.scandir(self.directory):
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                if entry.name.endswith(".tmp") or st.st_mtime < cutoff:
+                    os.remove(entry.path)
+                    continue
+            except OSError:
+                continue
+            files.append((st.st_mtime, entry.path, st.st_size))
+            used += st.st_size
+        for _, path, size in sorted(files):
+            if used <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            used -= size
+
+    @staticmethod
+    def _read_disk(path):
+        try:
+            with Image.open(path) as im:
+                im.load()
+                pil = im.copy()
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)  # recently used: kept longest by _prune
+        except OSError:
+            pass
+        return pil
+
+    @staticmethod
+    def _decode(data, size, path):
+        img = Image.open(BytesIO(data)).convert("RGB").resize(size, Image.LANCZOS)
+        try:
+            tmp = path + ".tmp"
+            img.save(tmp, "PNG")
+            os.replace(tmp, path)
+        except OSError:
+            pass
+        return img
+
+    def _install(self, key, pil, widget):
+        img = self.images.get(key)
+        if img is None:
+            img = ImageTk.PhotoImage(pil)
+            self.images[key] = img
+            while len(self.images) > self.maxsize:
+                self.images.popitem(last=False)
+        else:
+            self.images.move_to_end(key)
+        try:
+            if widget.winfo_exists():
+                widget.image = img  # keep ref
+                widget.configure(image=img)
+        except tk.TclError:
+            pass
+
+class Row:
+    """Widgets of one list row, plus what they currently show."""
+    __slots__ = ("frame", "label", "cover", "text", "cover_url", "uri")
+
+    def __init__(self, frame, label, cover=None):
+        self.frame = frame
+        self.label = label
+        self.cover = cover
+        self.text = None
+        self.cover_url = None
+        self.uri = None
+
+    def set_text(self, text):
+        if text != self.text:
+            self.text = text
+            self.label.configure(text=text)
+
+def occurrence_keys(items, keyfn):
+    # The same song can be queued twice: (key, n) stays unique and stable
+    seen, keys = {}, []
+    for it in items:
+        k = keyfn(it)
+        n = seen.get(k, 0)
+        seen[k] = n + 1
+        keys.append((k, n))
+    return keys
+
+def stable_keys(old, new):
+    """Keys of `new` that can stay put: a longest run in `old`'s relative order."""
+    pos = {k: i for i, k in enumerate(old)}
+    seq = [k for k in new if k in pos]
+    tails, tail_at, prev = [], [], [None] * len(seq)
+    for i, k in enumerate(seq):
+        j = bisect.bisect_left(tails, pos[k])
+        if j == len(tails):
+            tails.append(pos[k])
+            tail_at.append(i)
+        else:
+            tails[j] = pos[k]
+            tail_at[j] = i
+        prev[i] = tail_at[j - 1] if j else None
+    keep = set()
+    i = tail_at[-1] if tail_at else None
+    while i is not None:
+        keep.add(seq[i])
+        i = prev[i]
+    return keep
+
+class KeyedList:
+    """Rows in `parent`, reconciled against a list of items by key.
+
+    Rows whose key is still present are updated in place; only new keys build
+    a row and only vanished keys destroy one. Rows that kept their relative
+    order are left alone and the rest are re-packed next to their new
+    neighbour, so a vote that moves one song up the list moves one widget.
+    """
+    def __init__(self, parent, keyfn, build, update, **pack):
+        self.parent = parent
+        self.keyfn = keyfn
+        self.build = build    # (parent) -> Row, not packed
+        self.update = update  # (row, item)
+        self.pack = pack
+        self.rows = {}
+        self.order = []
+        self.created = self.destroyed = self.moved = 0
+
+    def clear(self):
+        for row in self.rows.values():
+            row.frame.destroy()
+        self.destroyed += len(self.rows)
+        self.rows, self.order = {}, []
+
+    def render(self, items):
+        keys = occurrence_keys(items, self.keyfn)
+        wanted = set(keys)
+        for k in self.order:
+            if k not in wanted:
+                self.rows.pop(k).frame.destroy()
+                self.destroyed += 1
+        keep = stable_keys([k for k in self.order if k in wanted], keys)
+        prev = None
+        for k, it in zip(keys, items):
+            row = self.rows.get(k)
+            if row is None:
+                row = self.rows[k] = self.build(self.parent)
+                self.created += 1
+            elif k in keep:
+                self.update(row, it)
+                prev = row
+                continue
+            else:
+                self.moved += 1
+            self.update(row, it)
+            if prev is not None:
+                row.frame.pack(after=prev.frame, **self.pack)
+            else:
+                first = self.parent.pack_slaves()
+                if first and first[0] is not row.frame:
+                    row.frame.pack(before=first[0], **self.pack)
+                else:
+                    row.frame.pack(**self.pack)
+            prev = row
+        self.order = keys
 
 class HostGUI:
     def __init__(self, root):
@@ -27,107 +283,201 @@ class HostGUI:
         top = ttk.Frame(root)
         top.pack(fill="x", padx=10, pady=10)
         ttk.Label(top, text="Interactive Voting UI", font=("Segoe UI", 12, "bold")).pack(side="left")
-        ttk.Button(top, textvariable=self.enabled_var, command=self.toggle).pack(side="right")
+        ttk.Button(top, textvariable=self.enabled_var, command=lambda: self.submit(self.toggle())).pack(side="right")
 
         self.current_cover = ttk.Label(root)
         self.current_cover.pack(padx=10, pady=(0,6))
         self.current_meta = ttk.Label(root, text="—", font=("Segoe UI", 10))
         self.current_meta.pack(padx=10, pady=(0,10))
+        self.current_cover_url = None
 
         ttk.Label(root, text="In queue", font=("Segoe UI", 10, "bold")).pack(anchor="w", padx=10)
         self.queue_frame = ttk.Frame(root)
         self.queue_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        self.queue_list = KeyedList(self.queue_frame, lambda it: it.get("uri"),
+                                    self.build_queue_row, self.update_queue_row, fill="x", pady=4)
 
         ttk.Label(root, text="Live requests", font=("Segoe UI", 10, "bold")).pack(anchor="w", padx=10)
         self.req_frame = ttk.Frame(root)
         self.req_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        self.req_list = KeyedList(self.req_frame, lambda it: it.get("key"),
+                                  self.build_request_row, self.update_request_row, fill="x", pady=4)
 
-        self.images_cache = {}
+        # Mirror of server state, kept current from snapshot + delta messages.
+        # Only the Tk thread touches it: the receiver appends messages to the
+        # inbox, and poll() applies and renders them at most once per frame.
+        self.state = {"seq": 0, "enabled": True, "current": None, "queue": [], "results": {}}
+        self.inbox = deque()
+        self.resyncing = False
+        self.ws = None
 
         # Start asyncio receiver in thread
         self.loop = asyncio.new_event_loop()
         threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.images_cache = ThumbCache(self.loop)
         asyncio.run_coroutine_threadsafe(self.ws_receiver(), self.loop)
+        self.root.after(FRAME_MS, self.poll)
+
+    def submit(self, coro):
+        # Run a coroutine on the asyncio thread (Tk callbacks cannot await)
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
 
     async def toggle(self):
-        async with aiohttp.ClientSession() as session:
-            # Flip current state
-            async with session.get(f"{API_BASE}/api/state") as resp:
-                s = await resp.json()
-                next_enabled = not s.get("enabled", True)
-            async with session.post(f"{API_BASE}/api/toggle", json={"enabled": next_enabled}) as resp:
-                self.enabled_var.set("Enabled" if next_enabled else "Disabled")
+        # Flip current state
+        s = (await httpclient.request("GET", f"{API_BASE}/api/state")).json()
+        next_enabled = not s.get("enabled", True)
+        # The button follows the server's delta, like every other control
+        await httpclient.request("POST", f"{API_BASE}/api/toggle", json={"enabled": next_enabled},
+                                 headers=HOST_HEADERS)
 
     def render_current(self, cur):
+        if not cur:
+            # Nothing playing: don't leave the last song up
+            self.current_meta.config(text="—")
+            self.current_cover.configure(image="")
+            self.current_cover.image = None
+            self.current_cover_url = None
+            return
         meta = f"{cur.get('title','—')} — {cur.get('artist','—')}\nDMCA: {cur.get('dmca','approved').capitalize()}"
         self.current_meta.config(text=meta)
         cover_url = cur.get("cover","")
-        if cover_url:
-            asyncio.run_coroutine_threadsafe(self.load_image(cover_url, self.current_cover, size=(128,128)), self.loop)
-
-    def render_queue(self, items):
-        for w in self.queue_frame.winfo_children():
-            w.destroy()
-        for it in items:
-            row = ttk.Frame(self.queue_frame)
-            row.pack(fill="x", pady=4)
-            img_lbl = ttk.Label(row)
-            img_lbl.pack(side="left")
-            # load cover async
-            cover_url = it.get("cover","")
+        if cover_url and cover_url != self.current_cover_url:
+            self.current_cover_url = cover_url
+            self.images_cache.apply(self.current_cover, cover_at(cover_url, 128), (128,128))
+
+    def build_queue_row(self, parent):
+        frame = ttk.Frame(parent)
+        cover = ttk.Label(frame)
+        cover.pack(side="left")
+        label = ttk.Label(frame)
+        label.pack(side="left", padx=8)
+        row = Row(frame, label, cover)
+        # Host-only removal control (the “−” button); rows are keyed by URI
+        ttk.Button(frame, text="−", width=2,
+                   command=lambda: self.submit(self.remove_from_queue(row.uri))).pack(side="right")
+        return row
+
+    def update_queue_row(self, row, it):
+        row.uri = it.get("uri")
+        row.set_text(f"{it.get('title','—')} — {it.get('artist','')}")
+        # cover from cache, loaded async on a miss
+        cover_url = it.get("cover","")
+        if cover_url != row.cover_url:
+            row.cover_url = cover_url
             if cover_url:
-                asyncio.run_coroutine_threadsafe(self.load_image(cover_url, img_lbl, size=(48,48)), self.loop)
-
-            text = ttk.Label(row, text=f"{it.get('title','—')} — {it.get('artist','')}")
-            text.pack(side="left", padx=8)
-            # Host-only removal control (the “−” button)
-            btn = ttk.Button(row, text="−", width=2, command=lambda u=it.get("uri"): self.remove_from_queue(u))
-            btn.pack(side="right")
-
-    def render_requests(self, items):
-        for w in self.req_frame.winfo_children():
-            w.destroy()
-        for it in items:
-            row = ttk.Frame(self.req_frame)
-            row.pack(fill="x", pady=4)
-            ttk.Label(row, text=f"{it.get('title', it.get('query','—'))} ({it.get('votes',1)} vote{'s' if it.get('votes',1)>1 else ''})").pack(side="left")
+                self.images_cache.apply(row.cover, cover_at(cover_url, 48), (48,48))
 
-    async def remove_from_queue(self, uri):
-        async with aiohttp.ClientSession() as session:
-            await session.post(f"{API_BASE}/api/remove", json={"uri": uri})
+    def build_request_row(self, parent):
+        frame = ttk.Frame(parent)
+        label = ttk.Label(frame)
+        label.pack(side="left")
+        return Row(frame, label)
 
-    async def load_image(self, url, widget, size=(64,64)):
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    data = await resp.read()
-            img = Image.open(BytesIO(data)).resize(size, Image.LANCZOS)
-            tkimg = ImageTk.PhotoImage(img)
-            widget.image = tkimg  # keep ref
-            widget.configure(image=tkimg)
-        except Exception:
-            pass
+    def update_request_row(self, row, it):
+        votes = it.get("votes", 1)
+        row.set_text(f"{it.get('title', it.get('query','—'))} ({votes} vote{'s' if votes>1 else ''})")
+
+    async def remove_from_queue(self, uri):
+        await httpclient.request("POST", f"{API_BASE}/api/remove", json={"uri": uri}, headers=HOST_HEADERS)
 
     async def ws_receiver(self):
         # Use namespaced WS with subprotocol to avoid interference
-        async with aiohttp.ClientSession() as session:
-            async with session.ws_connect(WS_URL, protocols=("interactive-v1",)) as ws:
-                await ws.send_str("ping")
-                async for msg in ws:
-                    if msg.type == aiohttp.WSMsgType.TEXT:
-                        try:
-                            payload = json.loads(msg.data)
-                        except Exception:
-                            continue
-                        if payload.get("type") == "state":
-                            cur = payload.get("current")
-                            if cur: self.render_current(cur)
-                            self.render_queue(payload.get("queue", []))
-                            self.enabled_var.set("Enabled" if payload.get("enabled", True) else "Disabled")
-                        elif payload.get("type") == "results":
-                            self.render_requests(payload.get("items", []))
-                    elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.ERROR):
-                        break
+        session = httpclient.get_session()
+        async with session.ws_connect(WS_URL, protocols=("interactive-v1",)) as ws:
+            self.ws = ws
+            await ws.send_str("ping")
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    try:
+                        payload = json.loads(msg.data)
+                    except Exception:
+                        continue
+                    if isinstance(payload, dict):
+                        self.inbox.append(payload)  # picked up by poll() on the Tk thread
+                elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.ERROR):
+                    break
+            self.ws = None
+
+    def poll(self):
+        # Tk thread, once per frame: the asyncio thread only ever appends
+        if self.inbox:
+            self.frame()
+        self.images_cache.install_ready()
+        self.root.after(FRAME_MS, self.poll)
+
+    def frame(self):
+        # Tk thread: apply everything that arrived since the last frame, render once
+        dirty = set()
+        while self.inbox:
+            payload = self.inbox.popleft()
+            if payload.get("type") == "snapshot":
+                self.resyncing = False
+                self.apply_snapshot(payload, dirty)
+            elif payload.get("type") == "delta":
+                seq = payload.get("seq", 0)
+                if self.resyncing or seq <= self.state["seq"]:
+                    continue  # covered by the snapshot on its way (or already here)
+                if seq != self.state["seq"] + 1 or not self.apply_delta(payload, dirty):
+                    self.resync()  # missed a delta, or it doesn't fit what we have
+        self.render(dirty)
+
+    def resync(self):
+        # Ignore deltas until a full snapshot replaces the mirror
+        if not self.resyncing and self.ws is not None:
+            self.resyncing = True
+            self.submit(self.ws.send_str("snapshot"))
+
+    def render(self, dirty):
+        st = self.state
+        if "enabled" in dirty:
+            self.enabled_var.set("Enabled" if st["enabled"] else "Disabled")
+        if "current" in dirty:
+            self.render_current(st["current"])
+        if "queue" in dirty:
+            self.queue_list.render(st["queue"])
+        if "results" in dirty:
+            self.req_list.render(self.top_results())
+
+    def top_results(self):
+        return heapq.nlargest(50, self.state["results"].values(), key=lambda x: x.get("votes", 1))
+
+    def apply_snapshot(self, snap, dirty):
+        st = self.state
+        st["seq"] = snap.get("seq", 0)
+        st["enabled"] = snap.get("enabled", True)
+        st["current"] = snap.get("current")
+        st["queue"] = list(snap.get("queue", []))
+        st["results"] = {it["key"]: it for it in snap.get("results", [])}
+        dirty.update(("enabled", "current", "queue", "results"))
+
+    def apply_delta(self, delta, dirty):
+        """Apply one delta to the mirror; False if a queue op is out of range."""
+        st = self.state
+        st["seq"] = delta["seq"]
+        if "enabled" in delta:
+            st["enabled"] = delta["enabled"]
+            dirty.add("enabled")
+        if "current" in delta:
+            st["current"] = delta["current"]
+            dirty.add("current")
+        if delta.get("queue"):
+            dirty.add("queue")
+            q = st["queue"]
+            for op in delta["queue"]:
+                index = op.get("index", -1)
+                if op["op"] == "insert" and 0 <= index <= len(q):
+                    q.insert(index, op["item"])
+                elif op["op"] == "remove" and 0 <= index < len(q):
+                    q.pop(index)
+                else:
+                    return False
+        if "results" in delta:
+            if delta["results"].get("reset"):
+                st["results"].clear()
+            for it in delta["results"].get("items", []):
+                st["results"].setdefault(it["key"], {}).update(it)
+            dirty.add("results")
+        return True
 
 def main():
     root = tk.Tk()
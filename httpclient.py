@@ -0,0 +1,99 @@
+# httpclient.py
+import os
+import json
+import asyncio
+import random
+import weakref
+from typing import Dict, Optional
+from dataclasses import dataclass
+
+import aiohttp
+
+# One pooled session per event loop, shared by every outbound call in the process.
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_PER_HOST = int(os.getenv("HTTP_POOL_PER_HOST", "20"))
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", "30"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.25"))
+MAX_RETRY_AFTER = 30.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+
+@dataclass
+class Response:
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def json(self):
+        if not self.body:
+            return {}
+        return json.loads(self.body)
+
+def get_session() -> aiohttp.ClientSession:
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE,
+            ttl_dns_cache=300,
+        )
+        session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT))
+        _sessions[loop] = session
+    return session
+
+async def close():
+    loop = asyncio.get_running_loop()
+    session = _sessions.pop(loop, None)
+    if session is not None and not session.closed:
+        await session.close()
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return min(max(float(value), 0.0), MAX_RETRY_AFTER)
+    except ValueError:
+        return None
+
+def _backoff(attempt: int) -> float:
+    # Exponential backoff with jitter
+    return HTTP_BACKOFF * (2 ** attempt) * (0.5 + random.random())
+
+async def request(method: str, url: str, *, retries: Optional[int] = None, **kwargs) -> Response:
+    """Send a request on the shared session and read the body.
+
+    429 and 5xx responses are retried with backoff (honouring Retry-After);
+    connection errors are only retried for idempotent methods, and POSTs
+    only on 429/503 since those were not processed.
+    """
+    method = method.upper()
+    retries = HTTP_RETRIES if retries is None else retries
+    session = get_session()
+    attempt = 0
+    while True:
+        try:
+            async with session.request(method, url, **kwargs) as resp:
+                body = await resp.read()
+                retryable = resp.status in RETRY_STATUSES and (method in IDEMPOTENT or resp.status in (429, 503))
+                if retryable and attempt < retries:
+                    delay = _retry_after(resp.headers.get("Retry-After"))
+                    await asyncio.sleep(delay if delay is not None else _backoff(attempt))
+                    attempt += 1
+                    continue
+                return Response(resp.status, dict(resp.headers), body)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if method not in IDEMPOTENT or attempt >= retries:
+                raise
+            await asyncio.sleep(_backoff(attempt))
+            attempt += 1
@@ -0,0 +1,264 @@
+# metrics.py
+import os
+import sys
+import abc
+import time
+import bisect
+import asyncio
+import threading
+from collections import Counter as _Tally
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Minimal Prometheus-style metrics (text exposition format 0.0.4).
+#
+# Recording is a dict lookup plus an integer add (a bisect for histograms),
+# cheap enough to leave on; all formatting happens in render() when
+# /metrics is scraped.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(int(v)) if float(v).is_integer() else repr(float(v))
+
+class _Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children: Dict[Tuple, object] = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._child()
+        return child
+
+    @abc.abstractmethod
+    def _child(self):
+        """A new per-label-values child (the thing inc()/observe() is called on)."""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._sample_lines(values, child))
+        return lines
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, n: float = 1):
+        self.value += n
+
+    def set(self, v: float):
+        self.value = v
+
+class Counter(_Metric):
+    kind = "counter"
+    _child = _Value
+
+    def inc(self, n: float = 1):
+        self.labels().inc(n)
+
+    def _sample_lines(self, values, child):
+        yield f"{self.name}{_labels(self.label_names, values)} {_num(child.value)}"
+
+class Gauge(Counter):
+    """A value that goes up and down; `fn` makes it read-on-scrape."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def set(self, v: float):
+        self.labels().set(v)
+
+    def render(self) -> List[str]:
+        if self.fn is not None:
+            try:
+                self.labels().set(self.fn())
+            except Exception:
+                pass
+        return super().render()
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float):
+        self.counts[bisect.bisect_left(self.bounds, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+class _Timer:
+    __slots__ = ("buckets", "start")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.buckets.observe(time.perf_counter() - self.start)
+        return False
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.bounds = tuple(sorted(buckets))
+
+    def _child(self):
+        return _Buckets(self.bounds)
+
+    def observe(self, v: float):
+        self.labels().observe(v)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def _sample_lines(self, values, child):
+        running = 0
+        for bound, n in zip(self.bounds + (float("inf"),), child.counts):
+            running += n
+            le = 'le="%s"' % _num(bound)
+            yield f"{self.name}_bucket{_labels(self.label_names, values, le)} {running}"
+        yield f"{self.name}_sum{_labels(self.label_names, values)} {repr(child.sum)}"
+        yield f"{self.name}_count{_labels(self.label_names, values)} {child.count}"
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+        self.collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Iterable[str] = (), fn=None) -> Gauge:
+        return self.register(Gauge(name, help, labels, fn))
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def collector(self, fn: Callable[[], Iterable[str]]):
+        """Add a callable producing ready-made exposition lines at scrape time."""
+        self.collectors.append(fn)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for fn in self.collectors:
+            try:
+                lines.extend(fn())
+            except Exception:
+                pass
+        return "\n".join(lines) + "\n"
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a sleeper: the time every
+    ready callback waits before it runs (a blocked loop shows up here)."""
+    def __init__(self, histogram: Histogram, gauge: Gauge, interval: float = 0.5):
+        self.histogram = histogram
+        self.gauge = gauge
+        self.interval = interval
+
+    async def run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            self.histogram.observe(lag)
+            self.gauge.set(lag)
+
+class SamplingProfiler:
+    """Statistical profiler for one thread (normally the event loop's).
+
+    A background thread reads the target's current stack `hz` times a second
+    and counts identical stacks; no tracing hooks, so the cost is the
+    sampling itself (about a percent at 100 Hz) and nothing while stopped.
+    Output is the "folded" format flamegraph tools read:
+    "module:function;module:function <samples>".
+    """
+    def __init__(self, thread_id: Optional[int] = None, hz: float = 100, max_depth: int = 64):
+        self.thread_id = thread_id
+        self.hz = hz
+        self.max_depth = max_depth
+        self.samples: _Tally = _Tally()
+        self.taken = 0
+        self._stop: Optional[threading.Event] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, thread_id: Optional[int] = None, hz: Optional[float] = None):
+        """Start sampling; if already running, a different `hz` restarts it at that rate."""
+        if self.running:
+            if not hz or hz == self.hz:
+                return
+            self.stop()  # the sampler reads the rate once, so a new rate needs a new thread
+        self.thread_id = thread_id or self.thread_id or threading.get_ident()
+        self.hz = hz or self.hz
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+        self._thread = None
+
+    def reset(self):
+        self.samples.clear()
+        self.taken = 0
+
+    def _run(self, stop: threading.Event):
+        period = 1.0 / self.hz
+        while not stop.wait(period):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+            self.taken += 1
+
+    def folded(self, top: int = 0) -> str:
+        items = self.samples.most_common(top or None)
+        return "".join(f"{stack} {n}\n" for stack, n in items)
@@ -0,0 +1,133 @@
+# scheduler.py
+import time
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional
+
+class PlaybackScheduler:
+    """Drives the voting round and playback from the track clock.
+
+    Instead of polling the player every second, each poll works out when the
+    next thing is due (round close, track end) and sleeps until then. Polling
+    is only fast near a transition or for a short while after nudge() (host
+    actions, new queue items); it backs off while paused, idle or disabled.
+
+    `player` is duck-typed:
+      async state() -> {"uri", "progress_ms", "duration_ms", "is_playing"} or None
+      async play_next() -> bool      start the head of the queue
+      async close_round()            resolve the winner into the queue
+      enabled() / has_queue() / has_votes() -> bool
+
+    `clock` and `sleep` are injectable so the loop can run on simulated time.
+    """
+    def __init__(self, player, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable] = asyncio.sleep, *,
+                 round_close_before: float = 15.0, lead: float = 3.0,
+                 fast_poll: float = 1.0, idle_poll: float = 10.0,
+                 paused_max: float = 30.0, disabled_poll: float = 30.0,
+                 max_sleep: float = 60.0, boost_window: float = 5.0):
+        self.player = player
+        self.clock = clock
+        self._sleep = sleep
+        self.round_close_before = round_close_before  # close the round this long before the track ends
+        self.lead = lead                              # poll fast this long before the track ends
+        self.fast_poll = fast_poll
+        self.idle_poll = idle_poll
+        self.paused_max = paused_max
+        self.disabled_poll = disabled_poll
+        self.max_sleep = max_sleep                    # re-sync at least this often (skips, seeks)
+        self.boost_window = boost_window
+        self.idle = True
+        self._wake = asyncio.Event()
+        self._boost_until = 0.0
+        self._paused_delay = fast_poll
+        self._error_delay = fast_poll
+        self._round_closed_for: Optional[str] = None
+        self.polls = 0
+        self.rounds = 0
+        self.plays = 0
+        self.errors = 0
+
+    def stats(self) -> Dict:
+        return {"polls": self.polls, "rounds": self.rounds, "plays": self.plays,
+                "errors": self.errors, "idle": self.idle}
+
+    def nudge(self):
+        """Something changed outside the player: re-check soon and poll fast for a bit."""
+        self._boost_until = self.clock() + self.boost_window
+        self._wake.set()
+
+    async def run(self):
+        while True:
+            try:
+                delay = await self.step()
+                self._error_delay = self.fast_poll
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors += 1
+                delay = self._error_delay
+                self._error_delay = min(self._error_delay * 2, self.max_sleep)
+            await self._wait(delay)
+
+    async def _wait(self, delay: float):
+        self._wake.clear()
+        sleeper = asyncio.ensure_future(self._sleep(delay))
+        waker = asyncio.ensure_future(self._wake.wait())
+        try:
+            await asyncio.wait((sleeper, waker), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            sleeper.cancel()
+            waker.cancel()
+
+    async def step(self) -> float:
+        """One scheduling decision; returns how long to sleep."""
+        now = self.clock()
+        boosted = now < self._boost_until
+        if not self.player.enabled():
+            self.idle = True
+            return self.fast_poll if boosted else self.disabled_poll
+
+        self.polls += 1
+        st = await self.player.state()
+        playing = bool(st and st.get("is_playing"))
+        progress = (st or {}).get("progress_ms") or 0
+        duration = (st or {}).get("duration_ms") or 0
+        ended = not playing and (not st or progress == 0 or (duration and progress >= duration - 1000))
+
+        if ended:
+            # Nothing is playing: settle the round right away and start the next track
+            self.idle = True
+            if not self.player.has_queue() and self.player.has_votes():
+                await self.player.close_round()
+                self.rounds += 1
+            if self.player.has_queue() and await self.player.play_next():
+                self.plays += 1
+                self._round_closed_for = None
+                self.idle = False
+                return self.fast_poll
+            return self.fast_poll if boosted else self.idle_poll
+
+        if not playing:
+            # Paused mid-track: back off until someone resumes
+            self.idle = False
+            delay = self._paused_delay
+            self._paused_delay = min(self._paused_delay * 2, self.paused_max)
+            return self.fast_poll if boosted else delay
+
+        self.idle = False
+        self._paused_delay = self.fast_poll
+        uri = st.get("uri")
+        remaining = max(0.0, (duration - progress) / 1000.0) if duration else self.max_sleep
+        if self._round_closed_for != uri and remaining <= self.round_close_before:
+            self._round_closed_for = uri
+            if self.player.has_votes():
+                await self.player.close_round()
+                self.rounds += 1
+        if remaining <= self.lead:
+            return self.fast_poll
+        due = remaining - self.lead
+        if self._round_closed_for != uri:
+            due = min(due, remaining - self.round_close_before)
+        if boosted:
+            due = min(due, self.fast_poll)
+        return max(self.fast_poll, min(due, self.max_sleep))
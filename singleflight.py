@@ -0,0 +1,43 @@
+# singleflight.py
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """Concurrent calls for the same key share one run of the work.
+
+    The first caller runs `make()`; anyone asking for the key while it is
+    under way waits for that result (or exception) instead of starting
+    another. Nothing is kept once it finishes: caching is up to the caller.
+    Only the first caller's cancellation stops the work, and then the
+    waiters see it cancelled too.
+    """
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.shared = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def run(self, key: Hashable, make: Callable[[], Awaitable[T]]) -> T:
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.shared += 1
+            return await asyncio.shield(fut)
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await make()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody else was waiting
+            raise
+        else:
+            fut.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
@@ -0,0 +1,104 @@
+# spotifyauth.py
+import time
+import base64
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpclient
+
+class TokenManager:
+    """Caches the Spotify access token until shortly before it expires.
+
+    Callers that arrive while a refresh is running share that refresh instead
+    of each POSTing to the token endpoint; once the token enters its refresh
+    window a background refresh is started while the old token keeps serving.
+    """
+    def __init__(self, url: str, client_id: str, client_secret: str, refresh_token: str,
+                 skew: float = 60.0, refresh_ahead: float = 300.0,
+                 request: Callable[..., Awaitable[httpclient.Response]] = httpclient.request):
+        self.url = url
+        self.request = request             # httpclient.request, or a wrapper that times it
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_token = refresh_token
+        self.skew = skew                   # treat token as expired this early
+        self.refresh_ahead = refresh_ahead # start background refresh this early
+        self.access: Optional[str] = None
+        self.expires_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.refreshes = 0
+        self.failures = 0
+
+    def stats(self) -> Dict:
+        return {"hits": self.hits, "refreshes": self.refreshes, "failures": self.failures,
+                "expires_in": max(0.0, self.expires_at - time.monotonic())}
+
+    async def get(self) -> Optional[str]:
+        now = time.monotonic()
+        if self.access and now < self.expires_at - self.skew:
+            self.hits += 1
+            if now >= self.expires_at - self.refresh_ahead:
+                self._start_refresh()
+            return self.access
+        try:
+            return await asyncio.shield(self._start_refresh())
+        except Exception:
+            # Fall back to a still-valid token if the refresh failed
+            if self.access and now < self.expires_at:
+                return self.access
+            raise
+
+    def invalidate(self, access: Optional[str] = None):
+        """Stop using a token Spotify rejected (401): the next get() refreshes.
+
+        With `access`, only that token is dropped, so a burst of calls that
+        all failed with the old token causes one refresh, not one each.
+        """
+        if access is None or access == self.access:
+            self.expires_at = 0.0
+
+    async def send(self, request: Callable[..., Awaitable[httpclient.Response]], method: str, url: str,
+                   **kwargs) -> httpclient.Response:
+        """request(method, url, **kwargs), whose headers carry a bearer token.
+
+        A 401 means the token was revoked or rotated before it expired: it
+        is dropped and the call retried once with a fresh one.
+        """
+        resp = await request(method, url, **kwargs)
+        auth = (kwargs.get("headers") or {}).get("Authorization", "")
+        if resp.status != 401 or not auth.startswith("Bearer "):
+            return resp
+        self.invalidate(auth[len("Bearer "):])
+        kwargs["headers"] = dict(kwargs["headers"], Authorization=f"Bearer {await self.get()}")
+        return await request(method, url, **kwargs)
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._refresh())
+            self._inflight.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return self._inflight
+
+    async def _refresh(self) -> Optional[str]:
+        auth = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode("ascii")
+        headers = {
+            "Authorization": "Basic " + auth,
+            "Content-Type": "application/x-www-form-urlencoded",
+        }
+        data = {
+            "grant_type": "refresh_token",
+            "refresh_token": self.refresh_token,
+        }
+        try:
+            obj = (await self.request("POST", self.url, headers=headers, data=data)).json()
+        except Exception:
+            self.failures += 1
+            raise
+        access = obj.get("access_token")
+        if not access:
+            self.failures += 1
+            raise RuntimeError(f"token refresh failed: {obj.get('error', 'no access_token')}")
+        self.refreshes += 1
+        self.access = access
+        self.expires_at = time.monotonic() + float(obj.get("expires_in", 3600))
+        return access
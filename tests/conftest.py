@@ -0,0 +1,26 @@
+# conftest.py
+import os
+import sys
+import importlib.util
+
+import pytest
+
+# The modules live at the repository root (there is no package)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """A fresh copy of the server module ("websocket broadcaster.py"): no
+    state dir, rules file or image cache, and Spotify pointed at a closed
+    port so nothing leaves the machine."""
+    (tmp_path / "static").mkdir()
+    monkeypatch.chdir(tmp_path)
+    for name, value in {"STATE_DIR": "", "DMCA_RULES": "", "IMG_CACHE_DIR": "", "BACKPLANE_URL": "",
+                        "SPOTIFY_ACCOUNTS_URL": "http://127.0.0.1:9",
+                        "SPOTIFY_API_URL": "http://127.0.0.1:9/v1"}.items():
+        monkeypatch.setenv(name, value)
+    spec = importlib.util.spec_from_file_location("broadcaster", os.path.join(ROOT, "websocket broadcaster.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
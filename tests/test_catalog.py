@@ -0,0 +1,93 @@
+# test_catalog.py
+import os
+
+from catalog import Catalog
+from eventlog import encode_record
+from votetally import normalize_query
+
+SONGS = [
+    ("Bohemian Rhapsody", "Queen", 1),
+    ("Another One Bites The Dust", "Queen", 2),
+    ("Love Story", "Taylor Swift", 3),
+    ("Love Story", "Indila", 4),
+    ("Love Story Taylor Swift Version", "Taylor Swift", 5),
+    ("Stairway To Heaven", "Led Zeppelin", 6),
+    ("Stand By Me", "Ben E. King", 7),
+]
+
+def entry(title, artist, n):
+    return {"title": title, "artist": artist, "uri": f"spotify:track:{n}"}
+
+def make():
+    catalog = Catalog()
+    for song in SONGS:
+        catalog.add("", entry(*song))
+    return catalog
+
+def lookup(catalog, query):
+    found = catalog.lookup(normalize_query(query))
+    return found and found["uri"]
+
+def test_one_letter_typo():
+    catalog = make()
+    assert lookup(catalog, "bohemian rapsody queen") == "spotify:track:1"   # missing letter
+    assert lookup(catalog, "bohemain rhapsody queen") == "spotify:track:1"  # swapped letters
+    assert lookup(catalog, "stairway to heavenn") == "spotify:track:6"      # extra letter
+
+def test_dropped_word_and_other_word_orders():
+    catalog = make()
+    assert lookup(catalog, "bohemian rhapsody") == "spotify:track:1"
+    assert lookup(catalog, "another one bites dust") == "spotify:track:2"
+    assert lookup(catalog, "Bohemian Rhapsody, by Queen") == "spotify:track:1"
+    assert lookup(catalog, "queen bohemian rhapsody") == "spotify:track:1"
+    assert lookup(catalog, "Stand By Me, by Ben E King") == "spotify:track:7"
+    assert lookup(catalog, "stand by me") == "spotify:track:7"
+
+def test_ambiguous_query_goes_to_spotify():
+    catalog = make()
+    assert lookup(catalog, "love story") is None   # three songs share the name
+    assert catalog.misses == 1
+
+def test_exact_name_beats_a_close_runner_up():
+    catalog = make()
+    # "... Taylor Swift Version" scores as high, but this is exactly the other song's name
+    assert lookup(catalog, "love story taylor swift") == "spotify:track:3"
+
+def test_alias_remembers_what_a_query_resolved_to():
+    catalog = make()
+    catalog.add("love story", entry("Love Story", "Indila", 4))
+    assert lookup(catalog, "love story") == "spotify:track:4"
+    assert catalog.alias_hits == 1
+
+def test_load_trims_a_torn_tail(tmp_path):
+    path = str(tmp_path / "catalog.log")
+    catalog = Catalog(path)
+    catalog.load()
+    for song in SONGS:
+        catalog.add("", entry(*song))
+    catalog.add("love story", entry("Love Story", "Indila", 4))
+    catalog.close()
+    good = os.path.getsize(path)
+    with open(path, "ab") as f:
+        f.write(encode_record({"u": "spotify:track:9", "t": "Torn", "a": "", "c": "", "d": None})[:-4])
+
+    catalog = Catalog(path)
+    catalog.load()
+    assert len(catalog) == len(SONGS) and os.path.getsize(path) == good
+    assert lookup(catalog, "love story") == "spotify:track:4"
+    catalog.close()
+
+def test_load_compacts_superseded_records(tmp_path):
+    path = str(tmp_path / "catalog.log")
+    catalog = Catalog(path)
+    catalog.load()
+    for i in range(1200):  # the same song with its cover changing: one record each time
+        catalog.add("", dict(entry("Bohemian Rhapsody", "Queen", 1), cover=f"https://i.scdn.co/image/{i}"))
+    catalog.close()
+    before = os.path.getsize(path)
+
+    catalog = Catalog(path)
+    catalog.load()
+    assert catalog.records == 1 and os.path.getsize(path) < before / 100
+    assert catalog.items[0]["cover"] == "https://i.scdn.co/image/1199"
+    catalog.close()
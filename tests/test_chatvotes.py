@@ -0,0 +1,133 @@
+# test_chatvotes.py
+import json
+import asyncio
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import httpclient
+from chatvotes import ChatOutbox, TokenBucket, VoteAcks, VoteBatcher
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+def test_token_bucket_paces_after_the_burst():
+    clock = Clock()
+    bucket = TokenBucket(rate=2, burst=2, clock=clock)
+    assert bucket.take() == 0 and bucket.take() == 0
+    assert bucket.take() == 0.5
+    clock.now += 0.25
+    assert bucket.take() == 0.25
+    clock.now += 0.25
+    assert bucket.take() == 0
+    clock.now += 60
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0.5]  # refills no further than the burst
+
+def test_acks_merge_into_one_summary():
+    clock = Clock()
+    acks = VoteAcks(clock)
+    for user, query, outcome in [("a", "Song A", "queued"), ("b", "song a!", "queued"), ("c", "Song B", "forwarded"),
+                                 ("d", "x", "voted"), ("e", "x", "limited"), ("f", "x", "busy"), ("g", "x", "failed")]:
+        acks.add(user, query, outcome, clock.now)
+    clock.now += 1.5
+    text, waited = acks.flush()
+    assert text == ("Recorded 3 votes, top: Song A (2). 1 already voted this round. 1 too fast. "
+                    "1 dropped, voting is busy. 1 failed.")
+    assert waited == 1.5 and not acks
+    acks.add("solo", "Song", "voted", clock.now)
+    assert acks.flush()[0] == "@solo you already voted this round."
+
+def test_outbox_paces_messages_and_folds_acks():
+    async def main():
+        sent, gate = [], asyncio.Event()
+        async def send(text):
+            await gate.wait()
+            sent.append((time.monotonic(), text))
+        outbox = ChatOutbox(send, rate=20, burst=1)
+        runner = asyncio.create_task(outbox.run())
+        outbox.say("first")
+        await asyncio.sleep(0.01)            # "first" is being sent; everything below waits
+        outbox.say("second")
+        for i in range(50):
+            outbox.ack(f"user{i}", "Song", "queued", time.monotonic())
+        gate.set()
+        while len(sent) < 3:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        runner.cancel()
+        texts = [t for _, t in sent]
+        assert texts == ["first", "second", "Recorded 50 votes, top: Song (50)."]
+        gaps = [b - a for (a, _), (b, _) in zip(sent, sent[1:])]
+        assert all(gap >= 0.04 for gap in gaps)  # 20 per second, no burst to spend
+        assert outbox.stats() == {"sent": 3, "errors": 0, "pending": 0}
+    asyncio.run(main())
+
+def test_one_batch_in_flight():
+    async def main():
+        posted, release = [], asyncio.Event()
+        async def post(votes):
+            posted.append(votes)
+            await release.wait()
+            return httpclient.Response(202, {}, json.dumps({"results": ["queued"] * len(votes)}).encode())
+        outbox = ChatOutbox(lambda text: asyncio.sleep(0))
+        batcher = VoteBatcher(post, outbox, window=0.01)
+        runner = asyncio.create_task(batcher.run())
+        batcher.add("Alice", "song 1")
+        await asyncio.sleep(0.05)
+        assert len(posted) == 1
+        for i in range(5):
+            batcher.add(f"user{i}", "song 2")
+        await asyncio.sleep(0.05)
+        assert len(posted) == 1              # the second batch waits for the first answer
+        release.set()
+        await asyncio.sleep(0.05)
+        runner.cancel()
+        assert [len(b) for b in posted] == [1, 5]
+        assert posted[0] == [{"query": "song 1", "voter": "twitch:alice"}]
+        assert outbox.acks.recorded == 6
+    asyncio.run(main())
+
+def test_full_batcher_turns_votes_away_at_once():
+    async def main():
+        outbox = ChatOutbox(lambda text: asyncio.sleep(0))
+        batcher = VoteBatcher(lambda votes: None, outbox, max_pending=2)
+        for user in "abc":
+            batcher.add(user, "song")
+        assert batcher.dropped == 1 and outbox.acks.busy == 1 and len(batcher.pending) == 2
+    asyncio.run(main())
+
+def test_busy_server_is_retried_after_retry_after():
+    async def main():
+        answers = [(503, ["busy", "busy"]), (202, ["queued", "voted"])]
+        hits = []
+        async def handler(request):
+            hits.append(await request.json())
+            status, results = answers[len(hits) - 1]
+            return web.json_response({"results": results}, status=status, headers={"Retry-After": "0"})
+        app = web.Application()
+        app.router.add_post("/api/vote/bulk", handler)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            url = str(server.make_url("/api/vote/bulk"))
+            outbox = ChatOutbox(lambda text: asyncio.sleep(0))
+            batcher = VoteBatcher(lambda votes: httpclient.request("POST", url, json={"votes": votes}), outbox)
+            await batcher._submit([("a", "song", 0.0), ("b", "song", 0.0)])
+            # The 503 took none of the batch, so the same votes went again
+            assert len(hits) == 2 and hits[0] == hits[1]
+            assert (outbox.acks.recorded, outbox.acks.voted, outbox.acks.busy) == (1, 1, 0)
+            # Still busy once the retries are spent: the votes are acknowledged as busy
+            answers[:] = [(503, ["busy", "busy"])] * 2
+            hits.clear()
+            batcher.post = lambda votes: httpclient.request("POST", url, json={"votes": votes}, retries=1)
+            await batcher._submit([("c", "song", 0.0), ("d", "song", 0.0)])
+            assert len(hits) == 2 and outbox.acks.busy == 2
+        finally:
+            await httpclient.close()
+            await server.close()
+    asyncio.run(main())
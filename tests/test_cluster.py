@@ -0,0 +1,115 @@
+# test_cluster.py
+import json
+import asyncio
+
+from voterlimits import RateLimiter, RoundVoters
+
+SONG = {"title": "Song One", "artist": "A", "uri": "spotify:track:1", "cover": "", "duration_ms": 200000}
+
+def saved_state(seq, **extra):
+    voters = RoundVoters(1)
+    voters.take("web:alice")
+    state = {"seq": seq, "enabled": True, "current": None, "queue": [dict(SONG, dmca="approved")],
+             "requests": [dict(SONG, key="uri:spotify:track:1", query="song one", votes=3)],
+             "voters": voters.dump(), "contexts": {"spotify:album:1": [12, "Bw=="]}}
+    state.update(extra)
+    return json.dumps(state)
+
+async def until(cond, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if cond():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("timed out")
+
+def test_first_worker_becomes_leader_and_saves(server):
+    async def main():
+        cluster = server.cluster
+        await cluster.start()
+        try:
+            assert cluster.is_leader and cluster.promotions == 1
+            saved = json.loads(await cluster.bp.get("state"))
+            assert saved["seq"] == server.feed.seq and "voters" in saved and "contexts" in saved
+            assert cluster.view["seq"] == server.feed.seq
+        finally:
+            await cluster.stop()
+            await server.httpclient.close()
+    asyncio.run(main())
+
+def test_takeover_carries_on_from_the_saved_state(server):
+    async def main():
+        cluster = server.cluster
+        await cluster.bp.set("state", saved_state(40))
+        await cluster.start()
+        try:
+            assert cluster.is_leader
+            assert [t.uri for t in server.queue] == ["spotify:track:1"]
+            assert server.requests.winner()["votes"] == 3
+            assert not server.round_voters.take("web:alice")  # already voted this round
+            assert server.round_voters.take("web:bob")
+            assert server.contexts.dump() == {"spotify:album:1": [12, "Bw=="]}  # album progress
+            assert server.feed.seq > 40 and cluster.view["seq"] == server.feed.seq
+        finally:
+            await cluster.stop()
+            await server.httpclient.close()
+    asyncio.run(main())
+
+def test_follower_applies_deltas_and_reloads_after_a_gap(server):
+    async def main():
+        cluster, bp = server.cluster, server.cluster.bp
+        assert await bp.acquire_leader("leader", "someone-else", 60)
+        await bp.set("state", saved_state(10))
+        await cluster.start()
+        try:
+            assert not cluster.is_leader and cluster.view["seq"] == 10
+            await bp.publish("state", json.dumps({"type": "delta", "seq": 11, "enabled": False}))
+            assert cluster.view["seq"] == 11 and server.enabled is False
+
+            # Deltas 12 and 13 never arrive; the leader's save already covers them
+            song2 = dict(SONG, uri="spotify:track:2", dmca="approved")
+            await bp.set("state", saved_state(13, enabled=False, queue=[dict(SONG, dmca="approved"), song2]))
+            song3 = dict(SONG, uri="spotify:track:3", dmca="approved")
+            await bp.publish("state", json.dumps({"type": "delta", "seq": 14,
+                                                  "queue": [{"op": "insert", "index": 2, "item": song3}]}))
+            await until(lambda: cluster._reload is None)
+            assert cluster.reloads == 1 and cluster.view["seq"] == 14
+            assert [t.uri[-1] for t in server.queue] == ["1", "2", "3"]
+        finally:
+            await cluster.stop()
+    asyncio.run(main())
+
+def test_forwarded_votes_get_the_leaders_verdict(server):
+    async def main():
+        leader = server.cluster
+        server.ip_limit = RateLimiter(1.0, 1)
+        await leader.start()
+        follower = server.Cluster(leader.bp, worker="follower")
+        await follower.start()
+        try:
+            assert leader.is_leader and not follower.is_leader
+            results = await follower.forward_votes([
+                ("song one", "web:alice", ""), ("song two", "web:alice", ""),
+                ("song three", "web:bob", "10.0.0.1"), ("song four", "web:carol", "10.0.0.1"),
+            ])
+            outcomes = [outcome for outcome, _ in results]
+            assert outcomes == ["queued", "voted", "queued", "limited"]  # one IP budget for every worker
+            assert results[0][1] is not None and results[1][1] is None
+        finally:
+            await follower.stop()
+            await leader.stop()
+            await server.httpclient.close()
+    asyncio.run(main())
+
+def test_unanswered_forward_is_reported_as_forwarded(server, monkeypatch):
+    async def main():
+        monkeypatch.setattr(server, "VOTE_FORWARD_TIMEOUT", 0.05)
+        bp = server.cluster.bp
+        assert await bp.acquire_leader("leader", "gone", 60)  # a leader that no longer answers
+        follower = server.cluster
+        await follower.start()
+        try:
+            assert await follower.forward_votes([("song", "web:alice", "")]) == [("forwarded", None)]
+            assert follower.unanswered == 1
+        finally:
+            await follower.stop()
+    asyncio.run(main())
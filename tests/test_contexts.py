@@ -0,0 +1,97 @@
+# test_contexts.py
+import asyncio
+import base64
+
+from contexts import ContextTracks, PlayedBits
+
+ALBUM = "spotify:album:a"
+PLAYLIST = "spotify:playlist:p"
+
+def tracks(n, missing=()):
+    return [None if i in missing else {"uri": f"spotify:track:{i}", "title": f"Song {i}"} for i in range(n)]
+
+def source(items):
+    """fetch_page over `items` (a list, or a callable giving the list now); records each call."""
+    calls = []
+    async def fetch_page(uri, offset, limit):
+        calls.append((uri, offset, limit))
+        now = items() if callable(items) else items
+        return len(now), now[offset:offset + limit]
+    return fetch_page, calls
+
+async def play(ctx, uri, n):
+    """Play up to `n` tracks the way the server does: next(), then mark()."""
+    played = []
+    for _ in range(n):
+        found = await ctx.next(uri)
+        if found is None:
+            break
+        pos, entry = found
+        ctx.mark(uri, pos)
+        played.append(pos)
+        await asyncio.sleep(0)  # let a prefetch land
+    return played
+
+def test_pages_are_fetched_as_play_reaches_them():
+    async def main():
+        fetch, calls = source(tracks(120))
+        ctx = ContextTracks(fetch, prefetch=2)
+        assert await play(ctx, ALBUM, 47) == list(range(47))
+        assert calls == [(ALBUM, 0, 50)]
+        await play(ctx, ALBUM, 1)   # position 47: two tracks from the end of the page
+        assert calls == [(ALBUM, 0, 50), (ALBUM, 50, 50)]
+        assert ctx.prefetches == 1
+        assert await play(ctx, ALBUM, 100) == list(range(48, 120))
+        assert [offset for _, offset, _ in calls] == [0, 50, 100]
+        assert ctx.page_hits > 0 and await ctx.next(ALBUM) is None
+    asyncio.run(main())
+
+def test_unplayable_entries_are_skipped_and_remembered():
+    async def main():
+        fetch, _ = source(tracks(6, missing={0, 1, 4}))
+        ctx = ContextTracks(fetch)
+        assert await play(ctx, PLAYLIST, 10) == [2, 3, 5]
+        state = ctx.dump()[PLAYLIST]
+        assert state[0] == 6 and PlayedBits(base64.b64decode(state[1])).count == 6
+    asyncio.run(main())
+
+def test_playlist_that_got_shorter_ends_early():
+    async def main():
+        items = tracks(150)
+        fetch, _ = source(lambda: items)
+        ctx = ContextTracks(fetch)
+        assert len(await play(ctx, PLAYLIST, 100)) == 100
+        del items[120:]  # the owner removed the tail...
+        ctx._pages.clear()  # ...and the cached pages have aged out
+        assert await play(ctx, PLAYLIST, 100) == list(range(100, 120))
+        del items[110:]
+        ctx._pages.clear()
+        assert await ctx.next(PLAYLIST) is None
+    asyncio.run(main())
+
+def test_dump_and_restore_keep_what_was_played():
+    async def main():
+        fetch, _ = source(tracks(10))
+        ctx = ContextTracks(fetch)
+        await play(ctx, ALBUM, 3)
+        ctx.mark(ALBUM, 5)
+        ctx.mark(ALBUM, 5)  # idempotent
+        restored = ContextTracks(fetch)
+        restored.restore(ctx.dump())
+        assert restored.dump() == ctx.dump()
+        assert await play(restored, ALBUM, 10) == [3, 4, 6, 7, 8, 9]
+        restored.forget(ALBUM)
+        assert (await restored.next(ALBUM))[0] == 0
+    asyncio.run(main())
+
+def test_queued_contexts_are_never_evicted():
+    queued = {"spotify:album:q0", "spotify:album:q1"}
+    fetch, _ = source(tracks(3))
+    ctx = ContextTracks(fetch, max_contexts=2, in_queue=lambda uri: uri in queued)
+    for uri in sorted(queued):
+        ctx.mark(uri, 0)
+    for i in range(5):
+        ctx.mark(f"spotify:album:x{i}", 0)
+    kept = set(ctx.dump())
+    assert queued <= kept and len(kept) == 3  # both queued ones, plus the newest
+    assert "spotify:album:x4" in kept
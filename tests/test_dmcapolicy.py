@@ -0,0 +1,87 @@
+# test_dmcapolicy.py
+import os
+
+from dmcapolicy import Policy, PolicyEngine
+
+RULES = """
+deny    label    Some Records
+warn    keyword  live at
+"""
+
+RAW = {"uri": "spotify:track:1", "name": "Intro", "artists": [{"name": "Band"}],
+       "album": {"name": "Live at Leeds", "label": "Some Records"}}
+ENTRY = {"uri": "spotify:track:1", "title": "Intro", "artist": "Band",
+         "album": "Live at Leeds", "label": "Some Records"}
+
+def test_entry_and_spotify_object_rank_the_same():
+    policy, problems = Policy.parse(RULES)
+    assert not problems
+    assert policy.rank(RAW) == policy.rank(ENTRY) == 2
+
+def test_keyword_matches_album_name_of_an_entry():
+    policy, _ = Policy.parse("warn keyword live at\n")
+    assert policy.rank(dict(ENTRY, label="")) == 1
+    assert policy.rank(dict(ENTRY, album="Studio")) == -1
+
+def test_decision_does_not_depend_on_which_shape_came_first():
+    for first in (RAW, ENTRY):
+        engine = PolicyEngine("")
+        engine.policy, _ = Policy.parse(RULES)
+        assert engine.decide(first) == "denied"
+        assert engine.decide(RAW) == engine.decide(ENTRY) == "denied"
+
+def song(**fields):
+    return dict({"uri": "spotify:track:9", "title": "Song", "artist": "Band", "album": "Album", "label": ""}, **fields)
+
+def test_more_specific_kind_wins():
+    policy, _ = Policy.parse("""
+        allow uri     spotify:track:9
+        deny  artist  Band
+        warn  label   Label
+        deny  keyword song
+    """)
+    assert policy.rank(song()) == 0                                  # uri beats artist and keyword
+    assert policy.rank(song(uri="spotify:track:8")) == 2             # artist beats keyword
+    assert policy.rank(song(uri="", artist="Other", label="Label")) == 1  # label beats keyword
+    assert policy.rank(song(uri="", artist="Other")) == 2            # keyword only
+
+def test_deny_beats_warn_beats_allow_within_a_kind():
+    policy, _ = Policy.parse("allow artist Band\nwarn artist Band\n")
+    assert policy.rank(song()) == 1
+    policy, _ = Policy.parse("deny artist A\nallow artist B\nwarn label L\n")
+    assert policy.rank(song(artist="A, B", label="L")) == 2          # every artist counts
+    policy, _ = Policy.parse("allow keyword song\nwarn keyword album\ndeny keyword live\n")
+    assert policy.rank(song(title="Song (Live)")) == 2
+    assert policy.rank(song()) == 1
+
+def test_keywords_match_whole_words_only():
+    policy, _ = Policy.parse("deny keyword live at\ndeny keyword rap\n")
+    assert policy.rank(song(title="LIVE AT Leeds")) == 2
+    assert policy.rank(song(title="Rap God")) == 2
+    assert policy.rank(song(title="Intro", album="(Live at Wembley)")) == 2  # punctuation is a boundary
+    assert policy.rank(song(title="Rhapsody")) == -1
+    assert policy.rank(song(title="Trap Queen")) == -1
+    assert policy.rank(song(title="Delivered at noon")) == -1
+    assert policy.rank(song(title="Oliver", album="Scrap")) == -1
+
+def test_bad_lines_are_reported_and_skipped():
+    policy, problems = Policy.parse("deny artist Band\nblock artist Other\ndeny genre pop\n# fine\n")
+    assert policy.count == 1 and [p.split(":")[0] for p in problems] == ["line 2", "line 3"]
+
+def test_reload_drops_cached_decisions(tmp_path, caplog):
+    path = tmp_path / "rules.txt"
+    path.write_text("deny artist Band\n")
+    engine = PolicyEngine(str(path))
+    reloaded = []
+    engine.on_reload = lambda: reloaded.append(1)
+    assert engine.load()
+    assert engine.decide(song()) == "denied" and engine.decide(song()) == "denied"
+    assert engine.hits == 1
+    path.write_text("allow artist Band\nnonsense\n")
+    os.utime(path, (1, 1))  # a different mtime, however fast the file system
+    assert engine.load() and not engine.load()
+    assert engine.decide(song()) == "approved"
+    assert (engine.reloads, len(reloaded), len(engine.problems)) == (2, 2, 1)
+    assert "line 2" in caplog.text  # logged, not printed
+    path.unlink()
+    assert engine.load() and engine.decide(song()) == "approved" and engine.policy.count == 0
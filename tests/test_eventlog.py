@@ -0,0 +1,66 @@
+# test_eventlog.py
+import os
+
+from eventlog import EventLog, encode_record, read_records
+
+def write_events(directory, events):
+    log = EventLog(directory)
+    log.recover()
+    log.open()
+    for ev in events:
+        log.append(dict(ev))
+    log.close()
+    return log
+
+def test_torn_tail_is_cut_off_and_appends_continue(tmp_path):
+    log = write_events(str(tmp_path), [{"t": "vote", "u": f"u{i}", "c": 1} for i in range(3)])
+    good = os.path.getsize(log.log_path)
+    with open(log.log_path, "ab") as f:
+        f.write(encode_record({"t": "vote", "u": "torn", "c": 1})[:-3])  # crash mid-write
+
+    log = EventLog(str(tmp_path))
+    snap, events = log.recover()
+    assert snap is None
+    assert [e["u"] for e in events] == ["u0", "u1", "u2"]
+    assert os.path.getsize(log.log_path) == good and log.n == 3
+
+    log.open()
+    log.append({"t": "vote", "u": "u3", "c": 1})
+    log.close()
+    _, events = EventLog(str(tmp_path)).recover()
+    assert [(e["n"], e["u"]) for e in events] == [(1, "u0"), (2, "u1"), (3, "u2"), (4, "u3")]
+
+def test_corrupt_record_ends_replay(tmp_path):
+    log = write_events(str(tmp_path), [{"t": "vote", "u": f"u{i}", "c": 1} for i in range(3)])
+    with open(log.log_path, "r+b") as f:
+        data = bytearray(f.read())
+        data[len(encode_record({"t": "vote", "u": "u0", "c": 1, "n": 1})) + 12] ^= 0xFF  # inside record 2
+        f.seek(0)
+        f.write(data)
+    records, valid = read_records(log.log_path)
+    assert [r["u"] for r in records] == ["u0"]
+    _, events = EventLog(str(tmp_path)).recover()
+    assert [e["u"] for e in events] == ["u0"]
+    assert os.path.getsize(log.log_path) == valid
+
+def test_events_covered_by_the_snapshot_are_not_replayed(tmp_path):
+    log = write_events(str(tmp_path), [{"t": "vote", "u": f"u{i}", "c": 1} for i in range(3)])
+    with open(log.log_path, "rb") as f:
+        before = f.read()
+    log = EventLog(str(tmp_path))
+    log.recover()
+    log.open()
+    log.snapshot({"requests": ["u0", "u1", "u2"]})
+    log.append({"t": "vote", "u": "u3", "c": 1})
+    log.close()
+    # Crash between writing the snapshot and truncating the log: the old events are still there
+    with open(log.log_path, "rb") as f:
+        after = f.read()
+    with open(log.log_path, "wb") as f:
+        f.write(before + after)
+
+    log = EventLog(str(tmp_path))
+    snap, events = log.recover()
+    assert snap == {"requests": ["u0", "u1", "u2"]}
+    assert [e["u"] for e in events] == ["u3"]
+    assert log.n == 4 and log.since_snapshot == 1
@@ -0,0 +1,166 @@
+# test_hostcontroller.py
+import random
+
+import hostcontroller
+from hostcontroller import HostGUI, KeyedList, Row, occurrence_keys, stable_keys
+
+class Parent:
+    """Just enough of a Tk container: the packing order of its children."""
+    def __init__(self):
+        self.children = []
+
+    def pack_slaves(self):
+        return list(self.children)
+
+class Frame:
+    def __init__(self, parent):
+        self.parent = parent
+
+    def pack(self, after=None, before=None, **options):
+        children = self.parent.children
+        if self in children:
+            children.remove(self)
+        if after is not None:
+            children.insert(children.index(after) + 1, self)
+        elif before is not None:
+            children.insert(children.index(before), self)
+        else:
+            children.append(self)
+
+    def destroy(self):
+        self.parent.children.remove(self)
+
+class Label:
+    def configure(self, text):
+        self.text = text
+
+def keyed_list():
+    parent = Parent()
+    def update(row, item):
+        row.set_text(item["key"])
+    return parent, KeyedList(parent, lambda it: it["key"], lambda p: Row(Frame(p), Label()), update)
+
+def shown(parent, klist):
+    rows = {id(row.frame): row for row in klist.rows.values()}
+    return [rows[id(frame)].text for frame in parent.children]
+
+def items(keys):
+    return [{"key": k} for k in keys]
+
+def is_subsequence(part, whole):
+    it = iter(whole)
+    return all(k in it for k in part)
+
+def test_stable_keys_is_a_longest_run_in_the_old_order():
+    assert stable_keys(list("abcde"), list("abcde")) == set("abcde")
+    assert stable_keys(list("abcde"), list("eabcd")) == set("abcd")     # one song jumped to the top
+    assert stable_keys(list("abcde"), list("bcdea")) == set("bcde")
+    assert len(stable_keys(list("abcde"), list("edcba"))) == 1
+    assert stable_keys(list("abc"), list("xaybzc")) == set("abc")        # new keys don't count
+    assert stable_keys([], list("abc")) == set()
+
+def test_stable_keys_matches_brute_force():
+    rng = random.Random(7)
+    for _ in range(200):
+        old = rng.sample(range(12), rng.randrange(13))
+        new = rng.sample(range(12), rng.randrange(13))
+        keep = stable_keys(old, new)
+        assert is_subsequence([k for k in new if k in keep], old)
+        # Longest common subsequence length, by dynamic programming
+        best = [[0] * (len(new) + 1) for _ in range(len(old) + 1)]
+        for i, a in enumerate(old):
+            for j, b in enumerate(new):
+                best[i + 1][j + 1] = best[i][j] + 1 if a == b else max(best[i][j + 1], best[i + 1][j])
+        assert len(keep) == best[-1][-1]
+
+def test_occurrence_keys_tell_repeats_apart():
+    assert occurrence_keys(["a", "b", "a"], lambda k: k) == [("a", 0), ("b", 0), ("a", 1)]
+
+def test_keyed_list_moves_only_what_moved():
+    parent, klist = keyed_list()
+    klist.render(items("abcde"))
+    assert shown(parent, klist) == list("abcde") and klist.created == 5
+    frames = {k: row.frame for k, row in klist.rows.items()}
+    klist.render(items("eabcd"))
+    assert shown(parent, klist) == list("eabcd")
+    assert (klist.created, klist.destroyed, klist.moved) == (5, 0, 1)
+    assert all(klist.rows[k].frame is f for k, f in frames.items())  # same widgets throughout
+
+def test_keyed_list_adds_removes_and_repeats():
+    parent, klist = keyed_list()
+    klist.render(items("abc"))
+    klist.render(items("xbcab"))
+    assert shown(parent, klist) == list("xbcab")
+    assert (klist.created, klist.destroyed) == (5, 0)
+    klist.render(items("cb"))
+    assert shown(parent, klist) == list("cb")
+    assert klist.destroyed == 3
+    rng = random.Random(3)
+    for _ in range(100):
+        keys = rng.choices("abcdefg", k=rng.randrange(8))
+        klist.render(items(keys))
+        assert shown(parent, klist) == keys
+    klist.clear()
+    assert parent.children == []
+
+class Mirror(HostGUI):
+    """HostGUI's message handling without a window or a connection."""
+    def __init__(self):
+        self.state = {"seq": 0, "enabled": True, "current": None, "queue": [], "results": {}}
+        self.inbox = hostcontroller.deque()
+        self.resyncing = False
+        self.ws = object()
+        self.requested = 0
+        self.rendered = []
+
+    def resync(self):
+        self.requested += not self.resyncing
+        self.resyncing = True
+
+    def render(self, dirty):
+        self.rendered.append(dirty)
+
+def song(n):
+    return {"uri": f"spotify:track:{n}"}
+
+def test_delta_that_does_not_fit_asks_for_a_snapshot():
+    gui = Mirror()
+    gui.inbox.extend([
+        {"type": "snapshot", "seq": 1, "queue": [song(1)]},
+        {"type": "delta", "seq": 2, "queue": [{"op": "insert", "index": 1, "item": song(2)}]},
+        {"type": "delta", "seq": 3, "queue": [{"op": "remove", "index": 5}]},   # out of range
+        {"type": "delta", "seq": 4, "queue": [{"op": "remove", "index": 0}]},   # ignored until resynced
+    ])
+    gui.frame()
+    assert gui.requested == 1 and gui.state["queue"] == [song(1), song(2)]
+    gui.inbox.extend([{"type": "snapshot", "seq": 4, "queue": [song(2)]},
+                      {"type": "delta", "seq": 5, "queue": [{"op": "remove", "index": 0}]}])
+    gui.frame()
+    assert not gui.resyncing and gui.state["queue"] == []
+
+def test_missed_delta_asks_for_a_snapshot():
+    gui = Mirror()
+    gui.inbox.extend([{"type": "snapshot", "seq": 1}, {"type": "delta", "seq": 3, "enabled": False}])
+    gui.frame()
+    assert gui.requested == 1 and gui.state["enabled"] is True
+
+class Widget:
+    def __init__(self):
+        self.options = {}
+
+    def configure(self, **options):
+        self.options.update(options)
+
+    config = configure
+
+def test_current_going_away_clears_the_display():
+    gui = Mirror()
+    gui.inbox.extend([{"type": "snapshot", "seq": 1, "current": song(1)},
+                      {"type": "delta", "seq": 2, "current": None}])
+    gui.frame()
+    assert gui.state["current"] is None and "current" in gui.rendered[-1]
+    gui.current_meta, gui.current_cover = Widget(), Widget()
+    gui.current_cover_url, gui.current_cover.image = "/img/128/old", "old cover"
+    HostGUI.render_current(gui, None)
+    assert gui.current_meta.options == {"text": "—"} and gui.current_cover.options == {"image": ""}
+    assert gui.current_cover.image is None and gui.current_cover_url is None
@@ -0,0 +1,92 @@
+# test_httpclient.py
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import httpclient
+
+def serve(statuses, headers=None):
+    """Run `main(base_url, hits)` against a server answering with `statuses` in turn."""
+    hits = []
+    async def handler(request):
+        hits.append(request.method)
+        status = statuses[min(len(hits), len(statuses)) - 1]
+        return web.Response(status=status, text="body", headers=headers if status != 200 else None)
+    def run(main):
+        async def wrapper():
+            app = web.Application()
+            app.router.add_route("*", "/", handler)
+            server = TestServer(app)
+            await server.start_server()
+            try:
+                return await main(str(server.make_url("/")), hits)
+            finally:
+                await httpclient.close()
+                await server.close()
+        return asyncio.run(wrapper())
+    return run
+
+@pytest.fixture
+def delays(monkeypatch):
+    """Seconds httpclient chose to wait between attempts (the waits themselves are skipped)."""
+    waited = []
+    class Clock:
+        # httpclient's view of asyncio; aiohttp keeps the real sleep
+        def __getattr__(self, name):
+            return getattr(asyncio, name)
+
+        def sleep(self, delay):
+            waited.append(delay)
+            return asyncio.sleep(0)
+    monkeypatch.setattr(httpclient, "asyncio", Clock())
+    return waited
+
+def test_retry_after_is_honoured(delays):
+    async def main(url, hits):
+        resp = await httpclient.request("GET", url)
+        assert resp.ok and resp.body == b"body"
+        assert hits == ["GET"] * 3
+    serve([503, 503, 200], {"Retry-After": "2"})(main)
+    assert delays == [2.0, 2.0]
+
+def test_retry_after_is_capped(delays):
+    async def main(url, hits):
+        assert (await httpclient.request("GET", url)).ok
+    serve([429, 200], {"Retry-After": "3600"})(main)
+    assert delays == [httpclient.MAX_RETRY_AFTER]
+
+def test_backoff_doubles_without_retry_after(delays, monkeypatch):
+    monkeypatch.setattr(httpclient, "HTTP_BACKOFF", 1.0)
+    async def main(url, hits):
+        resp = await httpclient.request("GET", url, retries=3)
+        assert resp.status == 502 and len(hits) == 4  # gives up with the last answer
+    serve([502])(main)
+    assert len(delays) == 3
+    for attempt, delay in enumerate(delays):
+        assert 0.5 * 2 ** attempt <= delay < 1.5 * 2 ** attempt  # jitter
+
+def test_post_is_only_retried_when_it_was_not_processed(delays):
+    async def main(url, hits):
+        assert (await httpclient.request("POST", url, json={})).status == 500
+        assert len(hits) == 1
+    serve([500, 200])(main)
+    async def main(url, hits):
+        assert (await httpclient.request("POST", url, json={})).ok
+        assert len(hits) == 2
+    serve([503, 200], {"Retry-After": "1"})(main)
+    assert delays == [1.0]
+
+def test_connection_errors_are_retried_for_idempotent_methods_only(delays):
+    async def main():
+        try:
+            with pytest.raises(Exception):
+                await httpclient.request("POST", "http://127.0.0.1:9/", retries=2)
+            assert delays == []
+            with pytest.raises(Exception):
+                await httpclient.request("GET", "http://127.0.0.1:9/", retries=2)
+            assert len(delays) == 2
+        finally:
+            await httpclient.close()
+    asyncio.run(main())
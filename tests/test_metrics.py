@@ -0,0 +1,54 @@
+# test_metrics.py
+import time
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import metrics
+
+def test_metric_base_is_abstract():
+    with pytest.raises(TypeError):
+        metrics._Metric("m", "help")
+    counter = metrics.Counter("c", "help", ["kind"])
+    counter.labels("a").inc(2)
+    assert 'c{kind="a"} 2' in "\n".join(counter.render())
+
+def test_profiler_restarts_at_a_new_rate():
+    profiler = metrics.SamplingProfiler(threading.get_ident(), hz=50)
+    profiler.start()
+    first = profiler._thread
+    profiler.start(hz=50)
+    assert profiler._thread is first   # same rate: left alone
+    profiler.start(hz=500)
+    try:
+        assert profiler.running and profiler._thread is not first and profiler.hz == 500
+        first.join(1)
+        assert not first.is_alive()    # one sampler at a time
+        time.sleep(0.05)
+        assert profiler.taken > 0
+    finally:
+        profiler.stop()
+
+def test_profile_routes_need_the_host_token(server, monkeypatch):
+    client = TestClient(server.app)
+    assert client.get("/api/profile").status_code == 403
+    assert client.post("/api/profile", json={"enabled": True}).status_code == 403
+    monkeypatch.setattr(server, "HOST_TOKEN", "secret")
+    assert client.post("/api/profile", json={"enabled": True}, headers={"X-Host-Token": "guess"}).status_code == 403
+    host = {"X-Host-Token": "secret"}
+    try:
+        resp = client.post("/api/profile", json={"enabled": True, "hz": 200}, headers=host)
+        assert resp.status_code == 200 and resp.json()["enabled"] and resp.json()["hz"] == 200
+        assert client.get("/api/profile", headers=host).status_code == 200
+    finally:
+        assert not client.post("/api/profile", json={"enabled": False}, headers=host).json()["enabled"]
+
+def test_queue_controls_need_the_host_token_once_set(server, monkeypatch):
+    monkeypatch.setattr(server.cluster, "is_leader", True)
+    client = TestClient(server.app)
+    assert client.post("/api/toggle", json={"enabled": False}).json() == {"enabled": False}
+    monkeypatch.setattr(server, "HOST_TOKEN", "secret")
+    assert client.post("/api/toggle", json={"enabled": True}).status_code == 403
+    assert client.post("/api/remove", json={"uri": "spotify:track:1"}).status_code == 403
+    assert client.post("/api/toggle", json={"enabled": True}, headers={"X-Host-Token": "secret"}).json() == {"enabled": True}
@@ -0,0 +1,109 @@
+# test_scheduler.py
+import asyncio
+
+from scheduler import PlaybackScheduler
+
+class Player:
+    """Scripted player: state() returns `st` (or raises it when it is an exception)."""
+    def __init__(self, st=None, queue=0, votes=False):
+        self.st = st
+        self.queue = queue
+        self.votes = votes
+        self.on = True
+        self.played = 0
+        self.closed = 0
+
+    async def state(self):
+        if isinstance(self.st, Exception):
+            raise self.st
+        return self.st
+
+    async def play_next(self):
+        self.queue -= 1
+        self.played += 1
+        return True
+
+    async def close_round(self):
+        self.closed += 1
+        self.votes = False
+        self.queue += 1
+
+    def enabled(self): return self.on
+    def has_queue(self): return self.queue > 0
+    def has_votes(self): return self.votes
+
+def playing(progress_s, duration_s=200, uri="spotify:track:a", is_playing=True):
+    return {"uri": uri, "progress_ms": int(progress_s * 1000), "duration_ms": duration_s * 1000, "is_playing": is_playing}
+
+def step(sched):
+    return asyncio.run(sched.step())
+
+def test_nothing_playing_starts_the_queue():
+    player = Player(None, queue=1)
+    sched = PlaybackScheduler(player)
+    assert step(sched) == sched.fast_poll
+    assert player.played == 1 and sched.plays == 1 and not sched.idle
+
+def test_track_end_detected_from_a_stopped_player_at_the_end():
+    player = Player(playing(199.5, is_playing=False), queue=1)
+    sched = PlaybackScheduler(player)
+    step(sched)
+    assert player.played == 1
+
+def test_idle_with_votes_closes_the_round_then_plays():
+    player = Player(None, votes=True)
+    sched = PlaybackScheduler(player)
+    step(sched)
+    assert (player.closed, player.played, sched.rounds) == (1, 1, 1)
+
+def test_idle_without_anything_backs_off():
+    sched = PlaybackScheduler(Player(None), idle_poll=10.0)
+    assert step(sched) == 10.0 and sched.idle
+
+def test_sleeps_until_the_round_closes():
+    player = Player(playing(100), votes=True)
+    sched = PlaybackScheduler(player, round_close_before=15.0, lead=3.0, max_sleep=120.0)
+    assert step(sched) == 85.0  # 100 s left, round closes 15 s before the end
+    assert player.closed == 0 and player.played == 0
+
+def test_round_closes_once_per_track_then_polls_near_the_end():
+    player = Player(playing(190), votes=True)
+    sched = PlaybackScheduler(player, round_close_before=15.0, lead=3.0)
+    assert step(sched) == 7.0   # closed now; wake `lead` before the end
+    player.votes = True
+    player.st = playing(198)
+    assert step(sched) == sched.fast_poll
+    assert player.closed == 1 and sched.rounds == 1
+
+def test_paused_mid_track_backs_off():
+    sched = PlaybackScheduler(Player(playing(50, is_playing=False)), fast_poll=1.0, paused_max=4.0)
+    assert [step(sched) for _ in range(4)] == [1.0, 2.0, 4.0, 4.0]
+
+def test_disabled_skips_the_player():
+    player = Player(None, queue=1)
+    player.on = False
+    sched = PlaybackScheduler(player, disabled_poll=30.0)
+    assert step(sched) == 30.0 and sched.polls == 0 and player.played == 0
+
+def test_player_errors_back_off_and_never_skip():
+    async def main():
+        player = Player(RuntimeError("player state: HTTP 429"), queue=3)
+        delays = []
+        async def sleep(delay):
+            delays.append(delay)
+            await asyncio.sleep(0)
+        sched = PlaybackScheduler(player, sleep=sleep, fast_poll=1.0, max_sleep=8.0)
+        task = asyncio.ensure_future(sched.run())
+        while len(delays) < 5:
+            await asyncio.sleep(0)
+        assert delays == [1.0, 2.0, 4.0, 8.0, 8.0]
+        assert sched.errors == 5 and player.played == 0 and player.queue == 3
+        player.st = playing(100)
+        while len(delays) < 6:
+            await asyncio.sleep(0)
+        player.st = RuntimeError("player state: HTTP 503")
+        while len(delays) < 7:
+            await asyncio.sleep(0)
+        task.cancel()
+        assert delays[5:] == [8.0, 1.0]  # one good poll resets the backoff
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+# test_searchcache.py
+import asyncio
+
+def fetcher(value):
+    calls = []
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return value
+    return fetch, calls
+
+def test_hit_after_first_lookup(server):
+    async def main():
+        cache = server.SearchCache()
+        fetch, calls = fetcher({"uri": "spotify:track:1"})
+        assert await cache.get("song", fetch) == {"uri": "spotify:track:1"}
+        assert await cache.get("song", fetch) == {"uri": "spotify:track:1"}
+        assert len(calls) == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+    asyncio.run(main())
+
+def test_concurrent_lookups_share_one_fetch(server):
+    async def main():
+        cache = server.SearchCache()
+        fetch, calls = fetcher("entry")
+        assert await asyncio.gather(*(cache.get("song", fetch) for _ in range(5))) == ["entry"] * 5
+        assert len(calls) == 1
+        stats = cache.stats()
+        assert (stats["misses"], stats["coalesced"], stats["hit_ratio"]) == (1, 4, 0.8)
+    asyncio.run(main())
+
+def test_expired_entries_are_fetched_again(server):
+    async def main():
+        cache = server.SearchCache(ttl=-1)
+        fetch, calls = fetcher("entry")
+        await cache.get("song", fetch)
+        await cache.get("song", fetch)
+        assert len(calls) == 2 and cache.expirations == 1
+    asyncio.run(main())
+
+def test_misses_expire_sooner_than_hits(server):
+    cache = server.SearchCache(ttl=60, miss_ttl=-1)
+    cache.put("found", "entry")
+    cache.put("unknown", None)
+    assert cache.peek("found") == (True, "entry")
+    assert cache.peek("unknown") == (False, None)
+    cache = server.SearchCache(ttl=60, miss_ttl=60)
+    cache.put("unknown", None)
+    assert cache.peek("unknown") == (True, None)  # a remembered "no such song"
+
+def test_least_recently_used_is_evicted(server):
+    cache = server.SearchCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.peek("a")     # "b" is now the oldest
+    cache.put("c", 3)
+    assert cache.peek("b") == (False, None)
+    assert cache.peek("a") == (True, 1) and cache.peek("c") == (True, 3)
+    assert cache.evictions == 1
+
+def test_spellings_of_one_request_share_a_key(server):
+    async def main():
+        searches = []
+        async def search(query, access):
+            searches.append(query)
+            return {"tracks": {"items": [{"uri": "spotify:track:1", "name": "Bohemian Rhapsody",
+                                          "artists": [{"name": "Queen"}]}]}}
+        async def token():
+            return "token"
+        server.spotify_search, server.get_access_token, server.CATALOG = search, token, False
+        first = await server.resolve_query("Bohemian Rhapsody, by Queen")
+        again = await server.resolve_query("  bohemian RHAPSODY queen!")
+        assert first == again and len(searches) == 1
+    asyncio.run(main())
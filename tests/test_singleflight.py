@@ -0,0 +1,37 @@
+# test_singleflight.py
+import asyncio
+
+from singleflight import SingleFlight
+
+def test_concurrent_calls_share_one_run():
+    async def main():
+        flights, runs = SingleFlight(), []
+        async def make():
+            runs.append(1)
+            await asyncio.sleep(0.01)
+            return len(runs)
+        values = await asyncio.gather(*(flights.run("k", make) for _ in range(5)))
+        assert values == [1] * 5 and len(runs) == 1 and flights.shared == 4
+        assert "k" not in flights
+        assert await flights.run("k", make) == 2  # nothing is cached once it is done
+    asyncio.run(main())
+
+def test_waiters_see_the_exception():
+    async def main():
+        flights = SingleFlight()
+        async def make():
+            await asyncio.sleep(0.01)
+            raise OSError("upstream down")
+        results = await asyncio.gather(*(flights.run("k", make) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, OSError) for r in results)
+    asyncio.run(main())
+
+def test_different_keys_run_separately():
+    async def main():
+        flights = SingleFlight()
+        async def make(v):
+            await asyncio.sleep(0)
+            return v
+        assert await asyncio.gather(flights.run("a", lambda: make(1)), flights.run("b", lambda: make(2))) == [1, 2]
+        assert flights.shared == 0
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+# test_spotifyauth.py
+import base64
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import httpclient
+from spotifyauth import TokenManager
+
+class StubSpotify:
+    """Token endpoint plus one API route that only accepts the newest token."""
+    def __init__(self, delay: float = 0.0, expires_in: int = 3600):
+        self.delay = delay
+        self.expires_in = expires_in
+        self.issued = 0
+        self.auth = []
+        self.fail = False
+
+    async def token(self, request):
+        self.auth.append((request.headers.get("Authorization"), dict(await request.post())))
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            return web.json_response({"error": "invalid_grant"}, status=400)
+        self.issued += 1
+        return web.json_response({"access_token": f"t{self.issued}", "expires_in": self.expires_in})
+
+    async def me(self, request):
+        if request.headers.get("Authorization") != f"Bearer t{self.issued}":
+            return web.json_response({"error": {"status": 401}}, status=401)
+        return web.json_response({"id": "me"})
+
+def run(stub: StubSpotify, test, **options):
+    async def main():
+        app = web.Application()
+        app.router.add_post("/api/token", stub.token)
+        app.router.add_get("/v1/me", stub.me)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            tokens = TokenManager(str(server.make_url("/api/token")), "id", "secret", "refresh", **options)
+            return await test(tokens, str(server.make_url("/v1/me")))
+        finally:
+            await httpclient.close()
+            await server.close()
+    return asyncio.run(main())
+
+def test_refresh_then_cached():
+    stub = StubSpotify()
+    async def test(tokens, _):
+        assert await tokens.get() == "t1"
+        assert await tokens.get() == "t1"
+        return tokens.stats()
+    stats = run(stub, test)
+    assert stub.issued == 1 and stats["refreshes"] == 1 and stats["hits"] == 1
+    auth, form = stub.auth[0]
+    assert auth == "Basic " + base64.b64encode(b"id:secret").decode()
+    assert form == {"grant_type": "refresh_token", "refresh_token": "refresh"}
+
+def test_concurrent_callers_share_one_refresh():
+    stub = StubSpotify(delay=0.05)
+    async def test(tokens, _):
+        return await asyncio.gather(*(tokens.get() for _ in range(50)))
+    assert run(stub, test) == ["t1"] * 50
+    assert stub.issued == 1
+
+def test_refresh_ahead_keeps_serving_old_token():
+    stub = StubSpotify(delay=0.05, expires_in=200)  # inside the 300 s refresh window at once
+    async def test(tokens, _):
+        first = await tokens.get()
+        second = await tokens.get()  # starts a background refresh, answers straight away
+        await asyncio.sleep(0.1)
+        return first, second, tokens.access
+    assert run(stub, test) == ("t1", "t1", "t2")
+
+def test_401_refreshes_and_retries_once():
+    stub = StubSpotify()
+    async def test(tokens, url):
+        access = await tokens.get()
+        stub.issued += 1  # token rotated on Spotify's side: t1 is now rejected
+        resp = await tokens.send(httpclient.request, "GET", url, headers={"Authorization": f"Bearer {access}"})
+        return resp.status, tokens.access
+    assert run(stub, test) == (200, "t3")
+    assert len(stub.auth) == 2
+
+def test_burst_of_401s_refreshes_once():
+    stub = StubSpotify(delay=0.05)
+    async def test(tokens, url):
+        access = await tokens.get()
+        stub.issued += 1
+        calls = [tokens.send(httpclient.request, "GET", url, headers={"Authorization": f"Bearer {access}"})
+                 for _ in range(20)]
+        return [r.status for r in await asyncio.gather(*calls)]
+    assert run(stub, test) == [200] * 20
+    assert len(stub.auth) == 2  # the first token, then one refresh for all twenty calls
+
+def test_failed_refresh_falls_back_to_valid_token():
+    stub = StubSpotify(expires_in=100)  # valid, but past the 60 s skew
+    async def test(tokens, _):
+        tokens.skew = 0
+        first = await tokens.get()
+        tokens.skew = 200
+        stub.fail = True
+        return first, await tokens.get(), tokens.stats()["failures"]
+    assert run(stub, test, refresh_ahead=0) == ("t1", "t1", 1)
@@ -0,0 +1,53 @@
+# test_statefeed.py
+import json
+
+from fastapi.testclient import TestClient
+
+def track(n):
+    return {"uri": f"spotify:track:{n}", "title": f"Song {n}"}
+
+def test_nothing_changed_means_no_delta(server):
+    assert server.feed.collect() is None
+    assert server.feed.seq == 0
+
+def test_changes_become_one_numbered_delta(server):
+    feed = server.feed
+    server.set_enabled(False)
+    server.add_request("song 1", track(1))
+    server.add_request("Song 1!", track(1))
+    server.add_request("song 2", track(2))
+    assert feed.changed.is_set()
+    delta = feed.collect()
+    assert (delta["type"], delta["seq"], delta["enabled"]) == ("delta", 1, False)
+    # One item per touched entry, carrying its latest count
+    items = {e["uri"]: e["votes"] for e in delta["results"]["items"]}
+    assert items == {"spotify:track:1": 2, "spotify:track:2": 1}
+    assert not delta["results"]["reset"] and "queue" not in delta and "current" not in delta
+    assert not feed.changed.is_set() and feed.collect() is None
+    server.add_request("song 3", track(3))
+    assert feed.collect()["seq"] == 2
+
+def test_new_round_resets_results(server):
+    server.add_request("song 1", track(1))
+    assert server.resolve_winner()["uri"] == "spotify:track:1"
+    delta = server.feed.collect()
+    assert delta["results"] == {"reset": True, "items": []}
+
+def test_snapshot_carries_the_seq_of_the_last_delta(server):
+    server.add_request("song 1", track(1))
+    server.feed.collect()
+    snap = server.feed.snapshot()
+    assert (snap["type"], snap["seq"]) == ("snapshot", 1)
+    assert [e["uri"] for e in snap["results"]] == ["spotify:track:1"]
+
+def test_client_that_missed_a_delta_gets_a_snapshot(server):
+    client = TestClient(server.app)
+    with client.websocket_connect(server.APP_NAMESPACE) as ws:
+        assert json.loads(ws.receive_text())["seq"] == 0
+        server.add_request("song 1", track(1))
+        server.feed.collect()  # seq 1, never delivered to this client
+        # A viewer holding seq 0 that sees seq 2 next asks for the whole state
+        ws.send_text("snapshot")
+        snap = json.loads(ws.receive_text())
+        assert (snap["type"], snap["seq"]) == ("snapshot", 1)
+        assert snap["results"][0]["votes"] == 1
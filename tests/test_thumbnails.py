@@ -0,0 +1,26 @@
+# test_thumbnails.py
+from fastapi.testclient import TestClient
+
+from thumbnails import Thumbnails
+
+IMAGE_ID = "ab67616d0000b273aaaaaaaaaaaaaaaaaaaaaaaa"
+
+def test_nearest_allowed_size():
+    thumbs = Thumbnails("", "https://i.scdn.co/image/", [48, 96, 128])
+    assert [thumbs.nearest(s) for s in (48, 1, 60, 72, 100, 112, 4000)] == [48, 48, 48, 96, 96, 128, 128]
+
+def test_unknown_size_is_served_as_the_nearest(server, tmp_path, monkeypatch):
+    thumbs = Thumbnails(str(tmp_path / "img"), server.IMG_UPSTREAM, [64, 256])
+    asked = []
+    async def get(size, image_id, fmt):
+        asked.append(size)
+        return b"image", f'"{size}"'
+    monkeypatch.setattr(thumbs, "get", get)
+    monkeypatch.setattr(server, "thumbs", thumbs)
+    client = TestClient(server.app)
+    resp = client.get(f"/img/96/{IMAGE_ID}")
+    assert resp.status_code == 200 and asked == [64]
+    assert "immutable" not in resp.headers["cache-control"]
+    resp = client.get(f"/img/256/{IMAGE_ID}")
+    assert asked[-1] == 256 and "immutable" in resp.headers["cache-control"]
+    assert client.get("/img/96/not-an-id").status_code == 404
@@ -0,0 +1,23 @@
+# test_vote_trust.py
+from fastapi.testclient import TestClient
+
+def test_bot_token_vouches_for_voter_ids(server, monkeypatch):
+    monkeypatch.setattr(server, "VOTE_BOT_TOKEN", "secret")
+    monkeypatch.setattr(server.cluster, "is_leader", True)
+    monkeypatch.setattr(server, "submit_vote", lambda query, voter, ip="": seen.append((voter, ip)) or ("queued", 1))
+    seen = []
+    client = TestClient(server.app)
+    vote = {"query": "song", "voter": "twitch:alice"}
+    assert client.post("/api/vote", json=vote, headers={"X-Vote-Token": "secret"}).status_code == 202
+    assert client.post("/api/vote", json=vote, headers={"X-Vote-Token": "guess"}).status_code == 202
+    assert client.post("/api/vote/bulk", json={"votes": [vote]}).status_code == 202
+    ip = seen[1][1]
+    assert ip
+    # Only the bot may name the viewer and skip the IP limit; everyone else is "web:" and limited
+    assert seen == [("twitch:alice", ""), ("web:twitch:alice", ip), ("web:twitch:alice", ip)]
+
+def test_no_token_trusts_nobody(server):
+    assert server.VOTE_TRUSTED_IPS == frozenset()
+    assert server.VOTE_BOT_TOKEN == ""
+    request = type("R", (), {"headers": {"x-vote-token": ""}})()
+    assert not server.trusted_caller(request, "127.0.0.1")
@@ -0,0 +1,107 @@
+# test_voteingest.py
+import asyncio
+
+from dmcapolicy import Policy
+
+def fake_search(server, monkeypatch):
+    """Resolve every query to a track named after it; returns (lookups, tallied)."""
+    lookups, tallied = [], []
+    async def resolve(query):
+        lookups.append(query)
+        return {"uri": "spotify:track:" + server.normalize_query(query).replace(" ", "-"), "title": query}
+    monkeypatch.setattr(server, "resolve_query", resolve)
+    monkeypatch.setattr(server, "add_request", lambda query, resolved, count=1: tallied.append((resolved["uri"], count)))
+    return lookups, tallied
+
+def test_batch_resolves_each_distinct_query_once(server, monkeypatch):
+    lookups, tallied = fake_search(server, monkeypatch)
+    async def main():
+        ingest = server.VoteIngest(100, workers=1, batch=50)
+        for query in ["Song A", "song a!", "SONG A", "Song B"]:
+            assert ingest.submit(query) is not None
+        ingest.start()
+        await ingest.queue.join()
+        await ingest.stop()
+        return ingest
+    ingest = asyncio.run(main())
+    assert lookups == ["Song A", "Song B"]
+    assert tallied == [("spotify:track:song-a", 3), ("spotify:track:song-b", 1)]
+    assert (ingest.processed, ingest.batches) == (4, 1)
+
+def test_batches_are_capped(server, monkeypatch):
+    fake_search(server, monkeypatch)
+    async def main():
+        ingest = server.VoteIngest(100, workers=1, batch=3)
+        for i in range(7):
+            ingest.submit(f"song {i}")
+        ingest.start()
+        await ingest.queue.join()
+        await ingest.stop()
+        return ingest
+    ingest = asyncio.run(main())
+    assert (ingest.processed, ingest.batches) == (7, 3)
+
+def test_full_queue_sheds_new_votes(server):
+    async def main():
+        ingest = server.VoteIngest(2, workers=1, batch=10)
+        ids = [ingest.submit("song") for _ in range(3)]
+        assert ids[:2] == [1, 2] and ids[2] is None
+        assert ingest.stats()["depth"] == 2
+        return ingest
+    ingest = asyncio.run(main())
+    assert (ingest.accepted, ingest.shed) == (2, 1)
+
+def test_failed_batch_is_counted_and_the_worker_carries_on(server, monkeypatch):
+    lookups, tallied = fake_search(server, monkeypatch)
+    def add_request(query, resolved, count=1):
+        if query == "bad":
+            raise RuntimeError("tally broke")
+        tallied.append((resolved["uri"], count))
+    monkeypatch.setattr(server, "add_request", add_request)
+    async def main():
+        ingest = server.VoteIngest(100, workers=1, batch=1)
+        ingest.submit("bad")
+        ingest.submit("good")
+        ingest.start()
+        await ingest.queue.join()
+        await ingest.stop()
+        return ingest
+    ingest = asyncio.run(main())
+    assert ingest.failures == 1 and tallied == [("spotify:track:good", 1)]
+
+def test_shed_vote_gives_the_round_slot_back(server, monkeypatch):
+    monkeypatch.setattr(server, "ingest", server.VoteIngest(1, workers=1, batch=10))
+    monkeypatch.setattr(server, "round_voters", server.RoundVoters(1))
+    async def main():
+        assert server.submit_vote("song", "twitch:a") == ("queued", 1)
+        assert server.submit_vote("other", "twitch:b") == ("busy", None)
+        server.ingest.queue.get_nowait()
+        # b was turned away by a full queue, not by the round limit: they may vote again
+        assert server.submit_vote("other", "twitch:b")[0] == "queued"
+        assert server.submit_vote("third", "twitch:b") == ("voted", None)
+    asyncio.run(main())
+
+def test_denied_vote_gives_the_round_slot_back(server, monkeypatch):
+    fake_search(server, monkeypatch)
+    monkeypatch.setattr(server, "round_voters", server.RoundVoters(1))
+    server.dmca.policy, _ = Policy.parse("deny keyword banned\n")
+    async def main():
+        ingest = server.VoteIngest(100, workers=1, batch=10)
+        monkeypatch.setattr(server, "ingest", ingest)
+        ingest.start()
+        assert server.submit_vote("banned song", "twitch:a")[0] == "queued"
+        assert server.submit_vote("fine song", "twitch:b")[0] == "queued"
+        await ingest.queue.join()
+        # a's vote never counted, so they may pick another song; b's did
+        assert server.submit_vote("other song", "twitch:a")[0] == "queued"
+        assert server.submit_vote("other song", "twitch:b") == ("voted", None)
+        await ingest.queue.join()
+        # A vote from a round that has since closed gives nothing back in the new one
+        assert server.submit_vote("banned song", "twitch:c")[0] == "queued"
+        server.round_voters.new_round()
+        assert server.submit_vote("fine song", "twitch:c")[0] == "queued"
+        await ingest.queue.join()
+        await ingest.stop()
+        assert ingest.denied == 2
+        assert server.submit_vote("other song", "twitch:c") == ("voted", None)
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+# test_voterlimits.py
+from voterlimits import RateLimiter, RoundVoters
+
+def test_one_vote_per_round():
+    voters = RoundVoters(limit=1)
+    assert voters.take("twitch:alice")
+    assert not voters.take("twitch:alice")
+    assert voters.take("twitch:bob")
+    assert voters.stats()["voters"] == 2 and voters.rejected == 1
+
+def test_limit_above_one_and_unlimited():
+    voters = RoundVoters(limit=3)
+    assert [voters.take("a") for _ in range(4)] == [True, True, True, False]
+    unlimited = RoundVoters(limit=0)
+    assert all(unlimited.take("a") for _ in range(1000))
+
+def test_give_back_returns_the_vote():
+    voters = RoundVoters(limit=1)
+    assert voters.take("a")
+    voters.give_back("a")
+    assert voters.take("a")
+    assert not voters.take("a")
+
+def test_new_round_lets_everyone_vote_again():
+    voters = RoundVoters(limit=1)
+    for i in range(50):
+        voters.take(f"v{i}")
+    voters.new_round()
+    assert voters.count == 0
+    assert all(voters.take(f"v{i}") for i in range(50))
+
+def test_table_grows_without_losing_counts():
+    voters = RoundVoters(limit=2, capacity=16)
+    for i in range(5000):
+        assert voters.take(f"v{i}")
+    assert voters.count == 5000 and voters.stats()["bytes"] >= 5000 * 12
+    assert all(voters.take(f"v{i}") for i in range(5000))
+    assert not any(voters.take(f"v{i}") for i in range(5000))
+
+def test_dump_and_restore_carry_the_round_over():
+    voters = RoundVoters(limit=2)
+    voters.take("a")
+    voters.take("a")
+    voters.take("b")
+    other = RoundVoters(limit=2)
+    other.restore(voters.dump())
+    assert other.count == 2
+    assert not other.take("a")
+    assert other.take("b") and not other.take("b")
+    assert other.take("c")
+    other.restore({})
+    assert other.count == 0 and other.take("a")
+
+def test_rate_limiter_bucket():
+    now = [0.0]
+    limiter = RateLimiter(rate=1.0, burst=3, clock=lambda: now[0])
+    assert [limiter.check("ip") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert abs(limiter.check("ip") - 1.0) < 1e-6
+    assert limiter.check("other") == 0.0
+    now[0] += 1.0
+    assert limiter.check("ip") == 0.0
+    assert limiter.check("ip") > 0 and limiter.rejected == 2
+
+def test_rate_limiter_forgets_full_buckets():
+    now = [0.0]
+    limiter = RateLimiter(rate=1.0, burst=1, maxkeys=10, clock=lambda: now[0])
+    for i in range(10):
+        limiter.check(f"k{i}")
+    now[0] += 5.0
+    limiter.check("k10")
+    assert limiter.stats()["keys"] == 1
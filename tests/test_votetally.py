@@ -0,0 +1,49 @@
+# test_votetally.py
+from votetally import VoteTally, normalize_query
+
+def track(n):
+    return {"uri": f"spotify:track:{n}", "title": f"Song {n}"}
+
+def test_normalize_query():
+    assert normalize_query("Bohemian Rhapsody, by QUEEN!") == "bohemian rhapsody queen"
+    assert normalize_query("Hurt - by Johnny Cash") == "hurt johnny cash"
+    # Only a "by" set off from the title is dropped
+    assert normalize_query("Stand By Me") == "stand by me"
+    assert normalize_query("Stand By Me, by Ben E. King") == "stand by me ben e king"
+    assert normalize_query("  Baby   Shark ") == "baby shark"
+
+def test_same_song_by_uri_or_query_is_one_entry():
+    tally = VoteTally()
+    tally.add("song one", track(1))
+    tally.add("Song One!", None)          # same normalized query
+    entry = tally.add("first song", track(1))  # different words, same URI
+    assert len(tally) == 1
+    assert entry["votes"] == 3 and entry["key"] == "uri:spotify:track:1"
+
+def test_unresolved_query_catches_up_with_its_uri():
+    tally = VoteTally()
+    entry = tally.add("song two")
+    assert entry["key"] == "q:song two" and "uri" not in entry
+    tally.add("song two", track(2))
+    assert entry["uri"] == "spotify:track:2" and entry["votes"] == 2
+    assert tally.find("anything", track(2)) is entry
+
+def test_buckets_rank_by_votes_then_who_got_there_first():
+    tally = VoteTally()
+    for n in (1, 2, 3):
+        tally.add(f"s{n}", track(n))
+    tally.add("s3", track(3))   # 3 reaches 2 votes first
+    tally.add("s2", track(2))
+    assert [e["uri"][-1] for e in tally.top(10)] == ["3", "2", "1"]
+    assert tally.winner()["uri"] == "spotify:track:3"
+    tally.add("s1", track(1), count=5)
+    assert [e["votes"] for e in tally.top(2)] == [6, 2]
+    assert tally.winner()["uri"] == "spotify:track:1"
+
+def test_pop_winner_starts_a_new_round():
+    tally = VoteTally()
+    tally.add("s1", track(1), count=2)
+    tally.add("s2", track(2))
+    assert tally.pop_winner()["uri"] == "spotify:track:1"
+    assert len(tally) == 0 and tally.winner() is None and tally.top(5) == []
+    assert tally.add("s2", track(2))["votes"] == 1
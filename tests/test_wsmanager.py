@@ -0,0 +1,81 @@
+# test_wsmanager.py
+import asyncio
+
+class FakeSocket:
+    """Stands in for a WebSocket; send_text blocks until `open` is set."""
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+        self.open = asyncio.Event()
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text):
+        await self.open.wait()
+        self.sent.append(text)
+
+    async def close(self, code=1000):
+        self.closed = code
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_broadcast_reaches_every_client_in_order(server):
+    async def main():
+        manager = server.WSManager(8, "resync", lambda: "snapshot")
+        sockets = [FakeSocket() for _ in range(3)]
+        for ws in sockets:
+            ws.open.set()
+            await manager.connect(ws)
+        for text in ("a", "b", "c"):
+            manager.broadcast_text(text)
+        await settle()
+        assert all(ws.sent == ["a", "b", "c"] for ws in sockets)
+        assert manager.stats() == {"clients": 3, "messages": 3, "bytes": 9, "resyncs": 0, "dropped": 0}
+    asyncio.run(main())
+
+def test_slow_client_is_resynced(server):
+    async def main():
+        manager = server.WSManager(4, "resync", lambda: "snapshot")
+        slow, fast = FakeSocket(), FakeSocket()
+        fast.open.set()
+        await manager.connect(slow)
+        await manager.connect(fast)
+        for i in range(11):
+            manager.broadcast_text(f"delta {i}")
+            await settle()
+        assert fast.sent == [f"delta {i}" for i in range(11)]
+        # "delta 0" was being written when the socket stalled; 1-4 filled the outbox, 5 and
+        # 9 overflowed it, and each time the backlog was replaced by one snapshot
+        slow.open.set()
+        await settle()
+        assert slow.sent == ["delta 0", "snapshot", "delta 10"]
+        assert manager.resyncs == 2 and slow in manager.active and slow.closed is None
+    asyncio.run(main())
+
+def test_slow_client_is_dropped(server):
+    async def main():
+        manager = server.WSManager(4, "drop", lambda: "snapshot")
+        slow = FakeSocket()
+        await manager.connect(slow)
+        for i in range(6):
+            manager.broadcast_text(f"delta {i}")
+            await settle()
+        assert slow.closed == 1008 and slow not in manager.active
+        assert manager.dropped == 1 and manager.resyncs == 0
+    asyncio.run(main())
+
+def test_resync_request_sends_a_fresh_snapshot(server):
+    async def main():
+        state = {"seq": 1}
+        manager = server.WSManager(4, "resync", lambda: f"snapshot {state['seq']}")
+        ws = FakeSocket()
+        await manager.connect(ws)
+        manager.send(ws, server.RESYNC)
+        state["seq"] = 2  # the snapshot is taken when it is sent, not when it is queued
+        ws.open.set()
+        await settle()
+        assert ws.sent == ["snapshot 2"]
+    asyncio.run(main())
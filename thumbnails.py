@@ -0,0 +1,193 @@
+# thumbnails.py
+import os
+import re
+import asyncio
+import hashlib
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+import httpclient
+from singleflight import SingleFlight
+
+try:
+    from PIL import Image
+except ImportError:  # without Pillow, covers keep pointing at the CDN
+    Image = None
+
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+_ID = re.compile(r"^[0-9A-Za-z]{8,64}$")
+
+class Thumbnails:
+    """Resized cover art served from our own origin (/img/<size>/<id>).
+
+    Covers come from one CDN prefix and are addressed by the image id, which
+    the CDN derives from the content, so a variant never changes once made:
+    responses can carry a strong ETag and be cached as immutable.
+
+    Each source image is fetched once (concurrent misses share the fetch) and
+    kept on disk; WebP/JPEG variants are made on first request on a thread
+    pool. Variants sit in a byte-bounded memory LRU in front of a
+    byte-bounded disk directory (least recently used files go first).
+    """
+    def __init__(self, directory: str, upstream: str, sizes: Iterable[int],
+                 memory_bytes: int = 32 << 20, disk_bytes: int = 512 << 20, quality: int = 80):
+        self.directory = directory
+        self.upstream = upstream
+        self.sizes = frozenset(sizes)
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.quality = quality
+        self.enabled = Image is not None and bool(directory)
+        self._memory: "OrderedDict[Tuple[int, str, str], Tuple[bytes, str]]" = OrderedDict()
+        self._memory_used = 0
+        self._disk: Optional["OrderedDict[str, int]"] = None  # file name -> size, LRU order
+        self._disk_used = 0
+        self._disk_lock = threading.Lock()
+        self._flights = SingleFlight()
+        self.pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="img")
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.fetches = 0
+        self.resizes = 0
+        self.evictions = 0
+
+    def stats(self) -> Dict:
+        return {"enabled": self.enabled, "memory_hits": self.memory_hits, "disk_hits": self.disk_hits,
+                "fetches": self.fetches, "resizes": self.resizes, "evictions": self.evictions,
+                "memory_bytes": self._memory_used, "disk_bytes": self._disk_used}
+
+    def rewrite(self, url: str, size: int) -> str:
+        """Our /img URL for a CDN cover URL; anything else passes through."""
+        if not self.enabled or not url or not url.startswith(self.upstream):
+            return url
+        image_id = url[len(self.upstream):]
+        return f"/img/{size}/{image_id}" if _ID.match(image_id) else url
+
+    def valid(self, image_id: str) -> bool:
+        return self.enabled and bool(self.sizes) and bool(_ID.match(image_id))
+
+    def nearest(self, size: int) -> int:
+        """The allowed size closest to `size`; on a tie the larger, since sharp beats blurry.
+
+        Clients pick sizes for their own layout and can't know IMG_SIZES, so
+        an unknown size is served as the nearest one instead of a 404.
+        """
+        if size in self.sizes:
+            return size
+        return min(self.sizes, key=lambda s: (abs(s - size), -s))
+
+    async def get(self, size: int, image_id: str, fmt: str) -> Tuple[bytes, str]:
+        """(image bytes, strong ETag) of one variant."""
+        key = (size, image_id, fmt)
+        item = self._memory.get(key)
+        if item is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return item
+        return await self._flights.run(key, lambda: self._variant(key))
+
+    async def _variant(self, key) -> Tuple[bytes, str]:
+        size, image_id, fmt = key
+        loop = asyncio.get_running_loop()
+        name = f"{image_id}_{size}.{fmt}"
+        data = await loop.run_in_executor(self.pool, self._read, name)
+        if data is not None:
+            self.disk_hits += 1
+        else:
+            source = await self._flights.run(image_id, lambda: self._source(image_id))
+            data = await loop.run_in_executor(self.pool, self._resize, source, size, fmt)
+            self.resizes += 1
+            await loop.run_in_executor(self.pool, self._write, name, data)
+        item = (data, '"' + hashlib.blake2b(data, digest_size=12).hexdigest() + '"')
+        self._remember(key, item)
+        return item
+
+    async def _source(self, image_id: str) -> bytes:
+        loop = asyncio.get_running_loop()
+        name = image_id + ".src"
+        data = await loop.run_in_executor(self.pool, self._read, name)
+        if data is None:
+            resp = await httpclient.request("GET", self.upstream + image_id)
+            if not resp.ok:
+                raise OSError(f"cover fetch failed: HTTP {resp.status}")
+            self.fetches += 1
+            data = resp.body
+            await loop.run_in_executor(self.pool, self._write, name, data)
+        return data
+
+    def _resize(self, source: bytes, size: int, fmt: str) -> bytes:
+        with Image.open(BytesIO(source)) as im:
+            im = im.convert("RGB")
+            im.thumbnail((size, size), Image.LANCZOS)
+            out = BytesIO()
+            if fmt == "webp":
+                im.save(out, "WEBP", quality=self.quality, method=4)
+            else:
+                im.save(out, "JPEG", quality=self.quality, optimize=True, progressive=True)
+        return out.getvalue()
+
+    def _remember(self, key, item):
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_used -= len(old[0])
+        self._memory[key] = item
+        self._memory_used += len(item[0])
+        while self._memory_used > self.memory_bytes and len(self._memory) > 1:
+            _, (data, _) = self._memory.popitem(last=False)
+            self._memory_used -= len(data)
+            self.evictions += 1
+
+    # -- disk tier (thread pool only) --
+    def _index(self) -> "OrderedDict[str, int]":
+        if self._disk is None:
+            os.makedirs(self.directory, exist_ok=True)
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    st = entry.stat()
+                    files.append((st.st_mtime, entry.name, st.st_size))
+            self._disk = OrderedDict((name, size) for _, name, size in sorted(files))
+            self._disk_used = sum(self._disk.values())
+        return self._disk
+
+    def _read(self, name: str) -> Optional[bytes]:
+        with self._disk_lock:
+            index = self._index()
+            if name not in index:
+                return None
+            index.move_to_end(name)
+        try:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                return f.read()
+        except OSError:
+            with self._disk_lock:
+                self._disk_used -= index.pop(name, 0)
+            return None
+
+    def _write(self, name: str, data: bytes):
+        path = os.path.join(self.directory, name)
+        with self._disk_lock:
+            index = self._index()
+        try:
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        with self._disk_lock:
+            self._disk_used += len(data) - index.pop(name, 0)
+            index[name] = len(data)
+            evict = []
+            while self._disk_used > self.disk_bytes and len(index) > 1:
+                old, size = index.popitem(last=False)
+                self._disk_used -= size
+                evict.append(old)
+        for old in evict:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except OSError:
+                pass
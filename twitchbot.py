@@ -1,43 +1,60 @@
 # bot.py
 import os
-import aiohttp
+import asyncio
 from twitchio.ext import commands
 
+import httpclient
+from chatvotes import ChatOutbox, VoteBatcher
+
 API_BASE = os.getenv("API_BASE", "http://localhost:3000")
+VOTE_BOT_TOKEN = os.getenv("VOTE_BOT_TOKEN", "")  # lets the server take our "twitch:" voter ids
+CHANNEL = os.getenv("TWITCH_CHANNEL")
+VOTE_WINDOW = float(os.getenv("BOT_VOTE_WINDOW", "0.25"))    # seconds to gather chat votes into one request
+CHAT_RATE = float(os.getenv("BOT_CHAT_RATE", str(20 / 30)))  # messages per second (Twitch: 20 per 30s)
+CHAT_BURST = float(os.getenv("BOT_CHAT_BURST", "5"))
+
+async def post_votes(votes):
+    # A 503 means none of the batch was taken, so retrying it is safe
+    return await httpclient.request("POST", f"{API_BASE}/api/vote/bulk", json={"votes": votes},
+                                    headers={"X-Vote-Token": VOTE_BOT_TOKEN} if VOTE_BOT_TOKEN else None)
 
 class Bot(commands.Bot):
     def __init__(self):
         super().__init__(token=os.getenv("TWITCH_OAUTH_TOKEN"),
                          prefix="!",
-                         initial_channels=[os.getenv("TWITCH_CHANNEL")])
+                         initial_channels=[CHANNEL])
+        self.outbox = ChatOutbox(self.say, CHAT_RATE, CHAT_BURST)
+        self.votes = VoteBatcher(post_votes, self.outbox, VOTE_WINDOW)
+        self._tasks = []
 
     async def event_ready(self):
         print(f"Logged in as {self.nick}")
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self.outbox.run()), asyncio.create_task(self.votes.run())]
+
+    async def say(self, text):
+        channel = self.get_channel(CHANNEL)
+        if channel is not None:
+            await channel.send(text)
 
     @commands.command(name="interactive")
     async def interactive(self, ctx):
-        await ctx.send(f"Vote next track here: {API_BASE}/static/index.html")
+        self.outbox.say(f"Vote next track here: {API_BASE}/static/index.html")
 
     @commands.command(name="vote")
     async def vote(self, ctx):
         query = ctx.message.content[len("!vote "):].strip()
         if not query:
-            await ctx.send("Usage: !vote <song/artist/album/playlist>")
+            self.outbox.say(f"@{ctx.author.name} usage: !vote <song/artist/album/playlist>")
             return
-        async with aiohttp.ClientSession() as session:
-            async with session.post(f"{API_BASE}/api/vote", json={"query": query}) as resp:
-                if resp.status == 200:
-                    await ctx.send(f"@{ctx.author.name} your vote was recorded.")
-                else:
-                    await ctx.send(f"@{ctx.author.name} vote failed.")
+        # Batched into /api/vote/bulk; the ack arrives as part of a chat summary
+        self.votes.add(ctx.author.name, query)
 
     @commands.command(name="queue")
     async def queue(self, ctx):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{API_BASE}/api/state") as resp:
-                s = await resp.json()
-                upcoming = ", ".join(q.get("title","") for q in s.get("queue", [])[:5])
-                await ctx.send(upcoming if upcoming else "Queue is empty.")
+        s = (await httpclient.request("GET", f"{API_BASE}/api/state")).json()
+        upcoming = ", ".join(q.get("title","") for q in s.get("queue", [])[:5])
+        self.outbox.say(upcoming if upcoming else "Queue is empty.")
 
 if __name__ == "__main__":
     Bot().run()
\ No newline at end of file
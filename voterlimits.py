@@ -0,0 +1,155 @@
+# voterlimits.py
+import time
+import base64
+import hashlib
+from array import array
+from typing import Callable, Dict
+
+def fingerprint(voter: str) -> int:
+    # Stable across processes (unlike hash()), so the table can move to another worker
+    return int.from_bytes(hashlib.blake2b(voter.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "little")
+
+class RoundVoters:
+    """How many votes each voter has cast in the current round.
+
+    Voters are kept as 64-bit fingerprints in a flat open-addressing table
+    (12 bytes a slot) rather than a dict of strings. Each slot is stamped
+    with the round it was written in; new_round() only bumps the round
+    number, so older slots read as empty and are reused, and closing a round
+    is O(1) however many people voted in it.
+    """
+    def __init__(self, limit: int = 1, capacity: int = 1024):
+        self.limit = min(limit, 255)  # per-slot vote count is 8 bits; <= 0 means unlimited
+        self.round = 1
+        self.count = 0                # voters seen this round
+        self.rejected = 0
+        self._alloc(capacity)
+
+    def _alloc(self, capacity: int):
+        self._mask = capacity - 1
+        self._keys = array("Q", bytes(8 * capacity))
+        self._marks = array("I", bytes(4 * capacity))  # round << 8 | votes
+
+    def stats(self) -> Dict:
+        return {"round": self.round, "voters": self.count, "limit": self.limit, "rejected": self.rejected,
+                "bytes": len(self._keys) * 12}
+
+    def _find(self, fp: int) -> int:
+        # Linear probing; a slot from an older round counts as free
+        keys, marks, mask, rnd = self._keys, self._marks, self._mask, self.round
+        i = fp & mask
+        while marks[i] >> 8 == rnd and keys[i] != fp:
+            i = (i + 1) & mask
+        return i
+
+    def take(self, voter: str) -> bool:
+        """Count a vote for `voter`; False if they used up this round's votes."""
+        if self.limit <= 0:
+            return True
+        fp = fingerprint(voter)
+        i = self._find(fp)
+        mark = self._marks[i]
+        if mark >> 8 == self.round:
+            if mark & 0xFF >= self.limit:
+                self.rejected += 1
+                return False
+            self._marks[i] = mark + 1
+            return True
+        self._keys[i] = fp
+        self._marks[i] = self.round << 8 | 1
+        self.count += 1
+        if self.count * 4 > len(self._keys) * 3:
+            self._grow()
+        return True
+
+    def give_back(self, voter: str):
+        """Undo take() for a vote that was not accepted after all."""
+        if self.limit <= 0:
+            return
+        i = self._find(fingerprint(voter))
+        mark = self._marks[i]
+        if mark >> 8 == self.round and mark & 0xFF:
+            self._marks[i] = mark - 1
+
+    def new_round(self):
+        self.round += 1
+        self.count = 0
+        if self.round >= 1 << 24:  # stamp would overflow: start from a clean table
+            self.round = 1
+            self._alloc(len(self._keys))
+
+    def dump(self) -> Dict:
+        """This round's voters and vote counts, for a worker taking over."""
+        rnd = self.round
+        live = [(fp, mark & 0xFF) for fp, mark in zip(self._keys, self._marks) if mark >> 8 == rnd]
+        return {"keys": base64.b64encode(array("Q", [fp for fp, _ in live]).tobytes()).decode("ascii"),
+                "votes": base64.b64encode(bytes(v for _, v in live)).decode("ascii")}
+
+    def restore(self, data: Dict):
+        """Start a round holding the voters of dump() (an empty dict: nobody)."""
+        keys = array("Q")
+        keys.frombytes(base64.b64decode(data.get("keys", "")))
+        votes = base64.b64decode(data.get("votes", ""))
+        capacity = 1024
+        while len(keys) * 4 > capacity * 3:
+            capacity *= 2
+        self.round = 1
+        self.count = len(keys)
+        self._alloc(capacity)
+        for fp, v in zip(keys, votes):
+            i = self._find(fp)
+            self._keys[i] = fp
+            self._marks[i] = 1 << 8 | v
+
+    def _grow(self):
+        keys, marks, rnd = self._keys, self._marks, self.round
+        self._alloc(len(keys) * 2)
+        for fp, mark in zip(keys, marks):
+            if mark >> 8 == rnd:
+                i = self._find(fp)
+                self._keys[i] = fp
+                self._marks[i] = mark
+
+class RateLimiter:
+    """Token bucket per key (voter, IP address).
+
+    Stored in the equivalent one-number form (GCRA): for each key, the time
+    at which its bucket will be full again. A key whose time has passed has a
+    full bucket, which is the same as not being stored at all, so those are
+    swept out when the map grows past `maxkeys`.
+    """
+    def __init__(self, rate: float, burst: float, maxkeys: int = 100_000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate    # <= 0 disables the limit
+        self.burst = burst
+        self.maxkeys = maxkeys
+        self.clock = clock
+        self._full_at: Dict[str, float] = {}
+        self.rejected = 0
+
+    def stats(self) -> Dict:
+        return {"keys": len(self._full_at), "rejected": self.rejected}
+
+    def check(self, key: str) -> float:
+        """Take a token for `key`; returns 0, or seconds until one is available."""
+        if self.rate <= 0:
+            return 0.0
+        now = self.clock()
+        interval = 1.0 / self.rate
+        full_at = max(self._full_at.get(key, now), now) + interval
+        over = full_at - now - self.burst * interval
+        if over > 1e-9:
+            self.rejected += 1
+            return over
+        self._full_at[key] = full_at
+        if len(self._full_at) > self.maxkeys:
+            self._sweep(now)
+        return 0.0
+
+    def _sweep(self, now: float):
+        live = {k: t for k, t in self._full_at.items() if t > now}
+        if len(live) > self.maxkeys // 2:
+            # Still crowded: forget the keys that will refill soonest
+            keep = sorted(live.items(), key=lambda kv: kv[1])[len(live) - self.maxkeys // 2:]
+            live = dict(keep)
+        self._full_at = live
@@ -0,0 +1,103 @@
+# votetally.py
+import re
+from typing import Dict, List, Optional, Iterator
+
+_PUNCT = re.compile(r"[^\w\s]+")
+_SPACE = re.compile(r"\s+")
+_BY = re.compile(r"[^\w\s]+\s*by\b")  # ", by" / "- by": the word splits title from artist
+
+def normalize_query(q: str) -> str:
+    # "Bohemian Rhapsody, by QUEEN!" -> "bohemian rhapsody queen", but "Stand By Me" keeps its "by"
+    q = _PUNCT.sub(" ", _BY.sub(" ", q.casefold()))
+    return " ".join(w for w in _SPACE.split(q) if w)
+
+class VoteTally:
+    """Vote counts for the current round with O(1) increments.
+
+    Entries are indexed by URI and by normalized query, so a vote finds its
+    entry with a dict lookup. Keys are also kept in buckets by vote count;
+    the highest bucket is tracked, so the winner is O(1) and the top N only
+    walks the distinct vote counts. Within a bucket, the entry that reached
+    that count first ranks first.
+
+    Each entry carries a stable "key" ("uri:..." or "q:<normalized query>")
+    that clients use to address it in deltas.
+    """
+    def __init__(self):
+        self._entries: Dict[int, Dict] = {}          # entry id -> entry, insertion ordered
+        self._index: Dict[str, int] = {}             # "uri:..." / "q:..." -> entry id
+        self._buckets: Dict[int, Dict[int, None]] = {}  # votes -> ordered set of entry ids
+        self._max = 0
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self._entries.values())
+
+    def _lookup(self, query: str, resolved: Optional[Dict]) -> Optional[int]:
+        if resolved and resolved.get("uri"):
+            eid = self._index.get("uri:" + resolved["uri"])
+            if eid is not None:
+                return eid  # common case: no need to normalize the query
+        return self._index.get("q:" + normalize_query(query))
+
+    def find(self, query: str, resolved: Optional[Dict] = None) -> Optional[Dict]:
+        eid = self._lookup(query, resolved)
+        return None if eid is None else self._entries[eid]
+
+    def add(self, query: str, resolved: Optional[Dict] = None, count: int = 1) -> Dict:
+        eid = self._lookup(query, resolved)
+        if eid is None:
+            qkey = "q:" + normalize_query(query)
+            eid = self._next_id
+            self._next_id += 1
+            key = "uri:" + resolved["uri"] if resolved and resolved.get("uri") else qkey
+            entry = {"key": key, "query": query, "votes": 0}
+            self._entries[eid] = entry
+            self._index.setdefault(qkey, eid)
+        else:
+            entry = self._entries[eid]
+        if resolved and resolved.get("uri") and not entry.get("uri"):
+            # First resolution for this entry (or an unresolved query catching up)
+            entry.update(resolved)
+            self._index.setdefault("uri:" + resolved["uri"], eid)
+        old = entry["votes"]
+        new = old + count
+        entry["votes"] = new
+        if old:
+            bucket = self._buckets[old]
+            del bucket[eid]
+            if not bucket:
+                del self._buckets[old]
+        self._buckets.setdefault(new, {})[eid] = None
+        if new > self._max:
+            self._max = new
+        return entry
+
+    def winner(self) -> Optional[Dict]:
+        if not self._entries:
+            return None
+        return self._entries[next(iter(self._buckets[self._max]))]
+
+    def top(self, n: int) -> List[Dict]:
+        out: List[Dict] = []
+        for votes in sorted(self._buckets, reverse=True):
+            for eid in self._buckets[votes]:
+                out.append(self._entries[eid])
+                if len(out) >= n:
+                    return out
+        return out
+
+    def pop_winner(self) -> Optional[Dict]:
+        """Return the winner and start a new round."""
+        win = self.winner()
+        self.clear()
+        return win
+
+    def clear(self):
+        self._entries = {}
+        self._index = {}
+        self._buckets = {}
+        self._max = 0
@@ -2,19 +2,39 @@
 import os
 import sys
 import json
+import hmac
+import math
+import functools
 import asyncio
 import socket
 import time
-from typing import List, Dict, Optional
+import itertools
+import heapq
+from typing import List, Dict, Optional, Tuple, Callable, Awaitable, Any
+from collections import OrderedDict
 from dataclasses import dataclass, asdict
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Body
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Body, Request
+from fastapi.responses import JSONResponse, HTMLResponse, Response, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 import aiohttp
 
+import httpclient
+import backplane
+import metrics
+from votetally import VoteTally, normalize_query
+from scheduler import PlaybackScheduler
+from spotifyauth import TokenManager
+from eventlog import EventLog
+from catalog import Catalog
+from dmcapolicy import PolicyEngine
+from contexts import ContextTracks, context_kind
+from thumbnails import Thumbnails, FORMATS
+from singleflight import SingleFlight
+from voterlimits import RoundVoters, RateLimiter
+
 APP_NAMESPACE = "/ws/v1"  # Namespaced WS path to avoid collisions
 LOCKFILE = "interactive_music_server.lock"
 
@@ -31,16 +51,53 @@ def find_free_port(preferred=3000, max_tries=20):
                 continue
     raise RuntimeError("No free port found in range")
 
-def create_singleton_lock():
-    if os.path.exists(LOCKFILE):
-        # If lock exists, verify process is alive; otherwise, remove.
+def pid_alive(pid: int) -> bool:
+    if pid <= 0:
         return False
+    if os.name == "nt":
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        ok = kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        return bool(ok) and code.value == 259  # STILL_ACTIVE
     try:
-        with open(LOCKFILE, "w") as f:
-            f.write(str(os.getpid()))
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
         return True
-    except Exception:
+    except OSError:
         return False
+    return True
+
+def create_singleton_lock():
+    for _ in range(2):
+        try:
+            fd = os.open(LOCKFILE, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # If lock exists, verify process is alive; otherwise, remove.
+            try:
+                with open(LOCKFILE) as f:
+                    pid = int(f.read().strip() or 0)
+            except (OSError, ValueError):
+                pid = 0
+            if pid != os.getpid() and pid_alive(pid):
+                return False
+            try:
+                os.remove(LOCKFILE)
+            except OSError:
+                return False
+            continue
+        except OSError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            f.write(str(os.getpid()))
+        return True
+    return False
 
 def remove_singleton_lock():
     try:
@@ -58,11 +115,219 @@ class Track:
     cover: str = ""
     duration_ms: Optional[int] = None
     dmca: str = "approved"  # 'approved' | 'warn' | 'denied'
+    album: str = ""  # album name and label, for the DMCA rules
+    label: str = ""
 
 enabled = True
 current: Optional[Track] = None
 queue: List[Track] = []
-requests: List[Dict] = []  # [{query, title?, artist?, uri?, cover?, votes}]
+requests = VoteTally()  # entries: {query, title?, artist?, uri?, cover?, votes}
+RESULTS_LIMIT = int(os.getenv("RESULTS_LIMIT", "50"))  # live requests shown to clients
+
+# ---- Versioned state: mutations mark what changed, broadcaster ships deltas ----
+class StateFeed:
+    """Dirty tracking for the broadcast state.
+
+    Every mutation of enabled/current/queue/requests goes through the helpers
+    below, which record what changed. collect() turns the pending changes into
+    one numbered delta (or None when nothing changed); clients that miss a
+    sequence number ask for a snapshot.
+    """
+    def __init__(self):
+        self.seq = 0
+        self.changed = asyncio.Event()
+        self._enabled = False
+        self._current = False
+        self._queue_ops: List[Dict] = []
+        self._votes: Dict[str, Dict] = {}   # key -> entry touched since last delta
+        self._reset = False
+
+    def _mark(self):
+        self.changed.set()
+
+    def enabled_changed(self):
+        self._enabled = True
+        self._mark()
+
+    def current_changed(self):
+        self._current = True
+        self._mark()
+
+    def queue_op(self, op: Dict):
+        self._queue_ops.append(op)
+        self._mark()
+
+    def entry_changed(self, entry: Dict):
+        self._votes[entry["key"]] = entry
+        self._mark()
+
+    def results_reset(self):
+        self._reset = True
+        self._votes.clear()
+        self._mark()
+
+    def collect(self) -> Optional[Dict]:
+        self.changed.clear()
+        if not (self._enabled or self._current or self._queue_ops or self._votes or self._reset):
+            return None
+        self.seq += 1
+        delta: Dict = {"type": "delta", "seq": self.seq}
+        if self._enabled:
+            delta["enabled"] = enabled
+        if self._current:
+            delta["current"] = asdict(current) if current else None
+        if self._queue_ops:
+            delta["queue"] = self._queue_ops
+        if self._votes or self._reset:
+            # Always the whole entry: a viewer's snapshot only held the top
+            # RESULTS_LIMIT, so it may never have seen this one (entries are small)
+            delta["results"] = {"reset": self._reset, "items": [dict(e) for e in self._votes.values()]}
+        self._enabled = self._current = self._reset = False
+        self._queue_ops = []
+        self._votes = {}
+        return delta
+
+    def snapshot(self) -> Dict:
+        return {
+            "type": "snapshot",
+            "seq": self.seq,
+            "enabled": enabled,
+            "current": asdict(current) if current else None,
+            "queue": [asdict(t) for t in queue],
+            "results": top_requests(),
+        }
+
+feed = StateFeed()
+
+# ---- Durable state: every mutation is journaled; restart replays snapshot + log ----
+STATE_DIR = os.getenv("STATE_DIR", "state")  # '' disables persistence
+JOURNAL_FSYNC = os.getenv("JOURNAL_FSYNC", "0") == "1"
+SNAPSHOT_EVERY = int(os.getenv("SNAPSHOT_EVERY", "50000"))
+
+def view_state() -> Dict:
+    """What viewers see, every vote of the round included."""
+    return {
+        "seq": feed.seq,
+        "enabled": enabled,
+        "current": asdict(current) if current else None,
+        "queue": [asdict(t) for t in queue],
+        "requests": list(requests),
+    }
+
+def dump_state() -> Dict:
+    state = view_state()
+    state["voters"] = round_voters.dump()
+    state["contexts"] = contexts.dump()
+    return state
+
+journal = EventLog(STATE_DIR, snapshot_every=SNAPSHOT_EVERY, fsync=JOURNAL_FSYNC, snapshot_fn=dump_state)
+
+def load_requests(items: List[Dict]):
+    requests.clear()
+    for it in items:
+        resolved = {k: v for k, v in it.items() if k not in ("key", "query", "votes")}
+        requests.add(it.get("query", ""), resolved if it.get("uri") else None, it.get("votes", 1))
+
+def apply_event(ev: Dict):
+    # Replay only: mutate state without journaling or broadcasting
+    t = ev.get("t")
+    if t == "vote":
+        resolved = ev.get("r") or ({"uri": ev["u"]} if "u" in ev else None)
+        requests.add(ev.get("q", ""), resolved, ev.get("c", 1))
+    elif t == "round":
+        requests.clear()
+        round_voters.new_round()
+    elif t == "push":
+        queue.append(Track(**ev["item"]))
+    elif t == "pop":
+        if 0 <= ev["i"] < len(queue):
+            drop_context(queue.pop(ev["i"]).uri)
+    elif t == "played":
+        contexts.mark(ev["u"], ev["i"])
+    elif t == "current":
+        globals()["current"] = Track(**ev["item"]) if ev.get("item") else None
+    elif t == "enabled":
+        globals()["enabled"] = ev["v"]
+
+def load_state(state: Dict):
+    """Replace the whole state with a dump_state() (a disk snapshot or a cluster save)."""
+    globals()["enabled"] = state.get("enabled", True)
+    globals()["current"] = Track(**state["current"]) if state.get("current") else None
+    queue[:] = [Track(**t) for t in state.get("queue", [])]
+    load_requests(state.get("requests", []))
+    round_voters.restore(state.get("voters") or {})
+    contexts.restore(state.get("contexts") or {})
+
+def restore_state() -> int:
+    """Replay the snapshot and journal from STATE_DIR; returns events replayed."""
+    if not STATE_DIR:
+        return 0
+    snap, events = journal.recover()
+    if snap:
+        load_state(snap)
+    count = 0
+    for ev in events:
+        apply_event(ev)
+        count += 1
+    return count
+
+def set_enabled(value: bool):
+    if value != enabled:
+        globals()["enabled"] = value
+        journal.append({"t": "enabled", "v": value})
+        feed.enabled_changed()
+        scheduler.nudge()
+
+def set_current(track: Optional[Track]):
+    if track != current:
+        globals()["current"] = track
+        journal.append({"t": "current", "item": asdict(track) if track else None})
+        feed.current_changed()
+
+def queue_push(track: Track):
+    queue.append(track)
+    item = asdict(track)
+    journal.append({"t": "push", "item": item})
+    feed.queue_op({"op": "insert", "index": len(queue) - 1, "item": item})
+
+def queue_pop(index: int = 0) -> Track:
+    track = queue.pop(index)
+    journal.append({"t": "pop", "i": index})
+    feed.queue_op({"op": "remove", "index": index})
+    drop_context(track.uri)
+    return track
+
+def remove_from_queue(uri: str) -> bool:
+    for i, t in enumerate(queue):
+        if t.uri == uri:
+            queue_pop(i)
+            scheduler.nudge()
+            return True
+    return False
+
+# ---- Metrics: served at /metrics in Prometheus text format ----
+METRICS = os.getenv("METRICS", "1") != "0"           # route timing and loop lag (counters are always kept)
+PROFILE_HZ_RANGE = (1.0, 1000.0)  # a sampler thread much faster than this starves the event loop
+PROFILE_HZ = min(max(float(os.getenv("PROFILE_HZ", "100")), PROFILE_HZ_RANGE[0]), PROFILE_HZ_RANGE[1])  # sampling rate while /api/profile is on
+
+registry = metrics.Registry()
+upstream_seconds = registry.histogram("interactive_upstream_seconds", "Latency of Spotify calls", ("call",))
+upstream_errors = registry.counter("interactive_upstream_errors_total", "Spotify calls that failed or returned an error status", ("call",))
+http_seconds = registry.histogram("interactive_http_request_seconds", "API latency by route", ("method", "route"))
+http_responses = registry.counter("interactive_http_responses_total", "API responses by route and status class", ("route", "status"))
+votes_total = registry.counter("interactive_votes_total", "Votes received, by outcome", ("outcome",))
+broadcast_seconds = registry.histogram("interactive_broadcast_seconds", "Time to hand one update to every local viewer",
+                                       buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+broadcast_bytes = registry.counter("interactive_broadcast_bytes_total", "Bytes queued to local WebSocket viewers")
+loop_lag = registry.histogram("interactive_event_loop_lag_seconds", "How late the event loop runs a callback that is due")
+loop_lag_last = registry.gauge("interactive_event_loop_lag_last_seconds", "Latest event loop lag sample")
+registry.gauge("interactive_ws_clients", "Connected WebSocket viewers on this worker", fn=lambda: len(manager.active))
+registry.gauge("interactive_vote_queue_depth", "Votes waiting to be resolved", fn=lambda: ingest.queue.qsize())
+registry.gauge("interactive_queue_length", "Songs in the playback queue", fn=lambda: len(queue))
+registry.gauge("interactive_requests", "Distinct songs voted for this round", fn=lambda: len(requests))
+registry.gauge("interactive_leader", "1 if this worker owns the state", fn=lambda: cluster.is_leader)
+lag_monitor = metrics.LoopLagMonitor(loop_lag, loop_lag_last)
+profiler = metrics.SamplingProfiler(hz=PROFILE_HZ)
 
 # ---- Spotify OAuth/config (fill env vars) ----
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID", "")
@@ -70,139 +335,934 @@ SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET", "")
 SPOTIFY_REFRESH_TOKEN = os.getenv("SPOTIFY_REFRESH_TOKEN", "")
 SPOTIFY_DEVICE_ID = os.getenv("SPOTIFY_DEVICE_ID", "")
 
+# Base URLs are overridable so the server can run against fakespotify.py (tests, load runs)
+SPOTIFY_ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com").rstrip("/")
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1").rstrip("/")
+SPOTIFY_TOKEN_URL = os.getenv("SPOTIFY_TOKEN_URL", SPOTIFY_ACCOUNTS_URL + "/api/token")
+
+async def _timed_request(call: str, method: str, url: str, **kwargs) -> httpclient.Response:
+    """httpclient.request, timed and error-counted under `call` in /metrics."""
+    timer = upstream_seconds.labels(call).time()
+    with timer:
+        try:
+            resp = await httpclient.request(method, url, **kwargs)
+        except Exception:
+            upstream_errors.labels(call).inc()
+            raise
+    if resp.status >= 400:
+        upstream_errors.labels(call).inc()
+    return resp
+
+async def spotify_request(call: str, method: str, url: str, **kwargs) -> httpclient.Response:
+    """A timed Spotify call; a 401 refreshes the access token and retries once."""
+    return await tokens.send(functools.partial(_timed_request, call), method, url, **kwargs)
+
+tokens = TokenManager(SPOTIFY_TOKEN_URL, SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_REFRESH_TOKEN,
+                      request=functools.partial(_timed_request, "token"))
+
 async def get_access_token():
-    async with aiohttp.ClientSession() as session:
-        auth = f"{SPOTIFY_CLIENT_ID}:{SPOTIFY_CLIENT_SECRET}"
-        headers = {
-            "Authorization": "Basic " + auth.encode("ascii").hex(),  # simple obfuscation
-            "Content-Type": "application/x-www-form-urlencoded",
-        }
-        data = {
-            "grant_type": "refresh_token",
-            "refresh_token": SPOTIFY_REFRESH_TOKEN,
-        }
-        async with session.post("https://accounts.spotify.com/api/token", headers=headers, data=data) as resp:
-            obj = await resp.json()
-            return obj.get("access_token")
+    with upstream_seconds.labels("access_token").time():
+        return await tokens.get()
 
 async def spotify_search(q: str, access: str):
-    url = f"https://api.spotify.com/v1/search?q={aiohttp.helpers.quote(q)}&type=track,album,playlist&limit=5"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers={"Authorization": f"Bearer {access}"}) as resp:
-            return await resp.json()
+    url = f"{SPOTIFY_API_URL}/search?q={aiohttp.helpers.quote(q)}&type=track,album,playlist&limit=5"
+    resp = await spotify_request("search", "GET", url, headers={"Authorization": f"Bearer {access}"})
+    if not resp.ok:
+        raise RuntimeError(f"search: HTTP {resp.status}")  # never cached: the next vote asks again
+    return resp.json()
 
 def pick_best_image(images: List[Dict]) -> str:
     if not images: return ""
     sorted_imgs = sorted(images, key=lambda x: x.get("width", 0), reverse=True)
     return (sorted_imgs[1] if len(sorted_imgs) > 1 else sorted_imgs[0]).get("url", "")
 
-def minimal_dmca(_item) -> str:
-    # Hook in your whitelist/blacklist logic
-    return "approved"
+# ---- Cover thumbnails (served from /img/<size>/<id>) ----
+IMG_CACHE_DIR = os.getenv("IMG_CACHE_DIR", "img_cache")  # empty = link covers straight to the CDN
+IMG_UPSTREAM = os.getenv("IMG_UPSTREAM", "https://i.scdn.co/image/")
+IMG_SIZES = [int(x) for x in os.getenv("IMG_SIZES", "48,96,128,176").split(",") if x.strip()]
+IMG_COVER_SIZE = int(os.getenv("IMG_COVER_SIZE", "128"))
+IMG_MEMORY_MB = float(os.getenv("IMG_MEMORY_MB", "32"))
+IMG_DISK_MB = float(os.getenv("IMG_DISK_MB", "512"))
+
+thumbs = Thumbnails(IMG_CACHE_DIR, IMG_UPSTREAM, IMG_SIZES,
+                    memory_bytes=int(IMG_MEMORY_MB * 2**20), disk_bytes=int(IMG_DISK_MB * 2**20))
+
+def cover_url(images: List[Dict]) -> str:
+    return thumbs.rewrite(pick_best_image(images), IMG_COVER_SIZE)
+
+# ---- DMCA policy: allow/warn/deny rules, decided once per URI ----
+DMCA_RULES = os.getenv("DMCA_RULES", "dmca_rules.txt")  # no file = everything approved
+DMCA_RELOAD = float(os.getenv("DMCA_RELOAD", "2"))      # seconds between checks for an edited rules file
+
+dmca = PolicyEngine(DMCA_RULES, check_interval=DMCA_RELOAD)
+dmca.load()
+
+def purge_denied():
+    # Rules changed: queued songs that are now denied come out of the queue
+    if cluster.is_leader:
+        for track in [t for t in queue if dmca.decide(asdict(t)) == "denied"]:
+            remove_from_queue(track.uri)
+
+dmca.on_reload = purge_denied
+
+def pick_result(data: Dict) -> Optional[Dict]:
+    track = (data.get("tracks", {}) or {}).get("items", [])[:1]
+    album = (data.get("albums", {}) or {}).get("items", [])[:1]
+    playlist = (data.get("playlists", {}) or {}).get("items", [])[:1]
+    return (track or album or playlist or [None])[0]
+
+def to_entry(chosen: Dict) -> Dict:
+    return {
+        "title": chosen.get("name", ""),
+        "artist": ", ".join(a.get("name") for a in chosen.get("artists", []) or []) or (chosen.get("owner") or {}).get("display_name", ""),
+        "uri": chosen.get("uri", ""),
+        "cover": cover_url((chosen.get("album") or {}).get("images", []) or chosen.get("images", [])),
+        "duration_ms": chosen.get("duration_ms"),
+        "album": (chosen.get("album") or {}).get("name", ""),
+        "label": chosen.get("label") or (chosen.get("album") or {}).get("label", ""),
+    }
+
+# ---- Search cache (normalized query -> resolved entry) ----
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "900"))
+SEARCH_CACHE_MISS_TTL = float(os.getenv("SEARCH_CACHE_MISS_TTL", "60"))  # searches that found nothing
+
+class SearchCache:
+    """LRU + TTL cache that coalesces concurrent lookups of the same key.
+
+    Only lookups that succeed are stored; an empty answer (None) is kept
+    for the shorter `miss_ttl`, so a song Spotify adds later shows up soon.
+    """
+    def __init__(self, maxsize: int = 2048, ttl: float = 900.0, miss_ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._flights = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def stats(self) -> Dict:
+        coalesced = self._flights.shared
+        lookups = self.hits + self.misses + coalesced
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses,
+                "coalesced": coalesced, "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": (self.hits + coalesced) / lookups if lookups else 0.0}
+
+    def peek(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return False, None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def put(self, key: str, value):
+        self._data[key] = (time.monotonic() + (self.ttl if value is not None else self.miss_ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key: str, fetch: Callable[[], Awaitable]):
+        found, value = self.peek(key)
+        if found:
+            self.hits += 1
+            return value
+        if key not in self._flights:
+            self.misses += 1
+        return await self._flights.run(key, lambda: self._fetch(key, fetch))
+
+    async def _fetch(self, key: str, fetch: Callable[[], Awaitable]):
+        value = await fetch()
+        self.put(key, value)
+        return value
+
+search_cache = SearchCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, SEARCH_CACHE_MISS_TTL)
+
+# ---- Local catalog: everything resolved before, fuzzy-matched before asking Spotify ----
+CATALOG = os.getenv("CATALOG", "1") != "0"
+CATALOG_MIN_SCORE = float(os.getenv("CATALOG_MIN_SCORE", "0.75"))  # share of the query's words that must match
+CATALOG_MARGIN = float(os.getenv("CATALOG_MARGIN", "0.15"))        # lead the best match needs over the next one
+
+catalog = Catalog(os.path.join(STATE_DIR, "catalog.log") if STATE_DIR else "", CATALOG_MIN_SCORE, CATALOG_MARGIN)
+
+async def resolve_query(query: str) -> Optional[Dict]:
+    """Resolve a free-text request to an entry dict, via the search cache,
+    then the local catalog, then Spotify search."""
+    async def fetch():
+        if CATALOG:
+            found = catalog.lookup(key)
+            if found:
+                return found
+        access = await get_access_token()
+        chosen = pick_result(await spotify_search(query, access))
+        entry = to_entry(chosen) if chosen else None
+        if entry:
+            catalog.add(key, entry)
+        return entry
+    key = normalize_query(query)
+    if not key:
+        return None
+    resolved = await search_cache.get(key, fetch)
+    return dict(resolved) if resolved else None
 
 async def play_uri(uri: str, access: str) -> bool:
-    url = f"https://api.spotify.com/v1/me/player/play?device_id={SPOTIFY_DEVICE_ID}"
-    payload = {"uris": [uri]}
-    async with aiohttp.ClientSession() as session:
-        async with session.put(url, headers={"Authorization": f"Bearer {access}", "Content-Type": "application/json"}, data=json.dumps(payload)) as resp:
-            return resp.status in (200, 204)
+    url = f"{SPOTIFY_API_URL}/me/player/play?device_id={SPOTIFY_DEVICE_ID}"
+    # Albums and playlists are contexts: Spotify only accepts tracks in "uris"
+    payload = {"context_uri": uri} if context_kind(uri) else {"uris": [uri]}
+    resp = await spotify_request("play", "PUT", url, headers={"Authorization": f"Bearer {access}", "Content-Type": "application/json"}, data=json.dumps(payload))
+    return resp.status in (200, 204)
+
+# ---- Albums and playlists: queued as one item, played track by track ----
+CONTEXT_PAGE_CACHE = int(os.getenv("CONTEXT_PAGE_CACHE", "64"))  # album/playlist pages kept in memory
+CONTEXT_PREFETCH = int(os.getenv("CONTEXT_PREFETCH", "2"))       # fetch the next page this many tracks early
+
+async def fetch_context_page(uri: str, offset: int, limit: int) -> Tuple[int, List[Optional[Dict]]]:
+    kind, cid = uri.split(":")[1:]
+    access = await get_access_token()
+    url = f"{SPOTIFY_API_URL}/{kind}s/{cid}/tracks?offset={offset}&limit={limit}"
+    resp = await spotify_request(kind + "_tracks", "GET", url, headers={"Authorization": f"Bearer {access}"})
+    if not resp.ok:
+        raise RuntimeError(f"{kind} tracks: HTTP {resp.status}")
+    page = resp.json()
+    entries: List[Optional[Dict]] = []
+    for item in page.get("items") or []:
+        track = item.get("track") if kind == "playlist" else item
+        # Local files, removed tracks and episodes can't be queued by URI
+        playable = track and (track.get("uri") or "").startswith("spotify:track:") and not track.get("is_local")
+        entries.append(to_entry(track) if playable else None)
+    return page.get("total", offset + len(entries)), entries
+
+contexts = ContextTracks(fetch_context_page, CONTEXT_PAGE_CACHE, CONTEXT_PREFETCH,
+                         in_queue=lambda uri: any(t.uri == uri for t in queue))
+
+def drop_context(uri: str):
+    # Last copy of an album/playlist left the queue: forget how far it got
+    if context_kind(uri) and all(t.uri != uri for t in queue):
+        contexts.forget(uri)
+
+def mark_played(uri: str, pos: int):
+    contexts.mark(uri, pos)
+    journal.append({"t": "played", "u": uri, "i": pos})
+    cluster.save_soon()  # a worker taking over must not play it again
 
 # ---- Voting helpers ----
-def add_request(query: str, resolved: Optional[Dict]):
-    # Match on URI when available; else group by query
-    for r in requests:
-        if resolved and r.get("uri") == resolved.get("uri"):
-            r["votes"] = r.get("votes", 1) + 1
-            return r
-        if not resolved and r.get("query") == query:
-            r["votes"] = r.get("votes", 1) + 1
-            return r
-    entry = {"query": query, "votes": 1}
-    if resolved:
-        entry.update(resolved)
-    requests.append(entry)
+def add_request(query: str, resolved: Optional[Dict], count: int = 1):
+    # Match on URI when available; else group by normalized query
+    if resolved and resolved.get("uri"):
+        known = requests.find(query, resolved)
+        if known and known.get("uri") == resolved["uri"]:
+            # Entry already carries the metadata: journal just the reference
+            journal.append({"t": "vote", "u": resolved["uri"], "c": count})
+        else:
+            journal.append({"t": "vote", "q": query, "r": resolved, "c": count})
+    else:
+        journal.append({"t": "vote", "q": query, "c": count})
+    entry = requests.add(query, resolved, count)
+    feed.entry_changed(entry)
+    if scheduler.idle:
+        scheduler.nudge()  # nothing playing: settle this round now rather than at the next idle poll
     return entry
 
 def resolve_winner() -> Optional[Dict]:
-    if not requests: return None
-    win = sorted(requests, key=lambda x: x.get("votes", 1), reverse=True)[0]
-    requests.clear()
+    win = requests.pop_winner()
+    if win:
+        round_voters.new_round()
+        journal.append({"t": "round"})
+        feed.results_reset()
+        cluster.save_soon()
     return win
 
+def top_requests() -> List[Dict]:
+    return requests.top(RESULTS_LIMIT)
+
 async def enqueue_winner():
-    winner = resolve_winner()
+    winner = requests.winner()
     if not winner: return
-    access = await get_access_token()
-    if not winner.get("uri"):
-        data = await spotify_search(winner["query"], access)
-        cand_track = (data.get("tracks", {}) or {}).get("items", [])[:1]
-        cand_album = (data.get("albums", {}) or {}).get("items", [])[:1]
-        cand_pl = (data.get("playlists", {}) or {}).get("items", [])[:1]
-        chosen = (cand_track or cand_album or cand_pl or [None])[0]
-        if chosen:
-            cover = pick_best_image(chosen.get("album", {}).get("images", []) or chosen.get("images", []))
-            uri = chosen.get("uri", "")
-            title = chosen.get("name", "")
-            artist = ", ".join(a.get("name") for a in chosen.get("artists", []) or []) or chosen.get("owner", {}).get("display_name", "")
-            queue.append(Track(title=title, artist=artist, uri=uri, cover=cover, duration_ms=chosen.get("duration_ms"), dmca=minimal_dmca(chosen)))
-    else:
-        queue.append(Track(title=winner.get("title",""), artist=winner.get("artist",""), uri=winner.get("uri",""), cover=winner.get("cover",""), dmca=minimal_dmca(winner)))
+    # Resolve before closing the round: if Spotify fails, the votes stay and the next poll retries
+    entry = winner if winner.get("uri") else await resolve_query(winner["query"])
+    resolve_winner()
+    if entry and dmca.allowed(entry):
+        queue_push(Track(title=entry.get("title",""), artist=entry.get("artist",""), uri=entry["uri"], cover=entry.get("cover",""), duration_ms=entry.get("duration_ms"), dmca=dmca.decide(entry),
+                         album=entry.get("album",""), label=entry.get("label","")))
+        if context_kind(entry["uri"]):
+            contexts.warm(entry["uri"])  # first page ready by the time it comes up
 
-async def tick_playback():
-    access = await get_access_token()
-    # If nothing is playing and queue exists, start next
-    if current is None and queue:
-        nxt = queue.pop(0)
-        if await play_uri(nxt.uri, access):
-            globals()["current"] = nxt
-            return
-    # Refresh player state
-    async with aiohttp.ClientSession() as session:
-        async with session.get("https://api.spotify.com/v1/me/player", headers={"Authorization": f"Bearer {access}"}) as resp:
-            s = await resp.json()
-            if s.get("item"):
-                itm = s["item"]
-                globals()["current"] = Track(
-                    title=itm["name"],
-                    artist=", ".join(a["name"] for a in itm.get("artists", [])),
-                    uri=itm.get("uri",""),
-                    cover=pick_best_image(itm.get("album", {}).get("images", [])),
-                    duration_ms=itm.get("duration_ms"),
-                    dmca=minimal_dmca(itm),
-                )
-            if not s.get("is_playing", True) and queue:
-                nxt = queue.pop(0)
-                await play_uri(nxt.uri, access)
-                globals()["current"] = nxt
+class SpotifyPlayback:
+    """Player adapter for PlaybackScheduler on top of the Spotify Web API."""
+    async def state(self) -> Optional[Dict]:
+        access = await get_access_token()
+        resp = await spotify_request("player", "GET", SPOTIFY_API_URL + "/me/player", headers={"Authorization": f"Bearer {access}"})
+        if resp.status == 204:
+            return None  # no active device
+        if not resp.ok:
+            # A 429/5xx is not "nothing playing": let the scheduler back off instead of skipping
+            raise RuntimeError(f"player state: HTTP {resp.status}")
+        s = resp.json()
+        if not s:
+            return None
+        itm = s.get("item")
+        if itm:
+            track = Track(
+                title=itm["name"],
+                artist=", ".join(a["name"] for a in itm.get("artists", [])),
+                uri=itm.get("uri",""),
+                cover=cover_url(itm.get("album", {}).get("images", [])),
+                duration_ms=itm.get("duration_ms"),
+                dmca=dmca.decide(itm),
+                album=itm.get("album", {}).get("name", ""),
+                label=itm.get("album", {}).get("label", ""),
+            )
+            catalog.add("", asdict(track))  # played from the Spotify app too: remember it
+            set_current(track)
+        return {
+            "uri": (itm or {}).get("uri"),
+            "progress_ms": s.get("progress_ms"),
+            "duration_ms": (itm or {}).get("duration_ms"),
+            "is_playing": s.get("is_playing", False),
+        }
+
+    async def play_next(self) -> bool:
+        while queue:
+            nxt = queue[0]
+            if not context_kind(nxt.uri):
+                return await self._play_head(nxt)
+            # An album/playlist stays at the head and plays one track per call
+            try:
+                found = await contexts.next(nxt.uri)
+            except Exception:
+                return await self._play_head(nxt)  # track list unavailable: let Spotify play the whole thing
+            if found is None:
+                if queue and queue[0] is nxt:
+                    queue_pop(0)  # finished
+                continue
+            pos, entry = found
+            if context_kind(nxt.uri) == "album":
+                # Album track listings leave out the album itself
+                entry["album"] = entry.get("album") or nxt.title
+                entry["label"] = entry.get("label") or nxt.label
+            if not dmca.allowed(entry):
+                mark_played(nxt.uri, pos)
+                continue
+            access = await get_access_token()
+            if not await play_uri(entry["uri"], access):
+                return False
+            mark_played(nxt.uri, pos)
+            set_current(Track(title=entry["title"], artist=entry["artist"], uri=entry["uri"],
+                              cover=entry.get("cover") or nxt.cover, duration_ms=entry.get("duration_ms"),
+                              dmca=dmca.decide(entry), album=entry.get("album", ""), label=entry.get("label", "")))
+            return True
+        return False
+
+    async def _play_head(self, nxt: Track) -> bool:
+        access = await get_access_token()
+        if not await play_uri(nxt.uri, access):
+            return False
+        if queue and queue[0] is nxt:
+            queue_pop(0)
+        set_current(nxt)
+        return True
+
+    async def close_round(self):
+        await enqueue_winner()
+
+    def enabled(self) -> bool:
+        return enabled
+
+    def has_queue(self) -> bool:
+        return bool(queue)
+
+    def has_votes(self) -> bool:
+        return len(requests) > 0
+
+ROUND_CLOSE_BEFORE = float(os.getenv("ROUND_CLOSE_BEFORE", "15"))  # seconds before track end
+IDLE_POLL = float(os.getenv("IDLE_POLL", "10"))
+
+scheduler = PlaybackScheduler(SpotifyPlayback(), round_close_before=ROUND_CLOSE_BEFORE, idle_poll=IDLE_POLL)
+
+# ---- Vote ingestion: accept immediately, resolve and tally in batches ----
+VOTE_QUEUE_SIZE = int(os.getenv("VOTE_QUEUE_SIZE", "10000"))
+VOTE_WORKERS = int(os.getenv("VOTE_WORKERS", "4"))
+VOTE_BATCH = int(os.getenv("VOTE_BATCH", "500"))
+VOTE_BULK_MAX = int(os.getenv("VOTE_BULK_MAX", "1000"))  # votes per /api/vote/bulk request
+
+class VoteIngest:
+    """Bounded vote queue drained by a small worker pool.
+
+    api_vote only enqueues; workers pull whatever is waiting (up to a batch),
+    collapse identical normalized queries, resolve each distinct query once
+    and tally the batch. When the queue is full new votes are shed.
+    """
+    def __init__(self, maxsize: int, workers: int, batch: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.workers = workers
+        self.batch = batch
+        self._ids = itertools.count(1)
+        self._tasks: List[asyncio.Task] = []
+        self.accepted = 0
+        self.shed = 0
+        self.processed = 0
+        self.batches = 0
+        self.failures = 0
+        self.denied = 0
+
+    def stats(self) -> Dict:
+        return {"depth": self.queue.qsize(), "capacity": self.queue.maxsize,
+                "accepted": self.accepted, "shed": self.shed, "processed": self.processed,
+                "batches": self.batches, "failures": self.failures, "denied": self.denied}
+
+    def submit(self, query: str, voter: str = "") -> Optional[int]:
+        vote_id = next(self._ids)
+        try:
+            self.queue.put_nowait((vote_id, query, voter, round_voters.round))
+        except asyncio.QueueFull:
+            self.shed += 1
+            return None
+        self.accepted += 1
+        return vote_id
+
+    def start(self):
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def _drain(self, first) -> List[Tuple[int, str, str, int]]:
+        batch = [first]
+        while len(batch) < self.batch:
+            try:
+                batch.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _worker(self):
+        while True:
+            batch = self._drain(await self.queue.get())
+            try:
+                await self._process(batch)
+            except Exception:
+                self.failures += 1
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _process(self, batch: List[Tuple[int, str, str, int]]):
+        groups: Dict[str, Tuple[str, List]] = {}  # normalized query -> (first raw query, [(voter, round)])
+        for _, query, voter, rnd in batch:
+            groups.setdefault(normalize_query(query), (query, []))[1].append((voter, rnd))
+        results = await asyncio.gather(*(resolve_query(q) for q, _ in groups.values()), return_exceptions=True)
+        for (query, voters), resolved in zip(groups.values(), results):
+            count = len(voters)
+            if isinstance(resolved, BaseException):
+                resolved = None
+            elif resolved and not dmca.allowed(resolved):
+                self.denied += count  # never shown or tallied
+                votes_total.labels("denied").inc(count)
+                for voter, rnd in voters:
+                    if voter and rnd == round_voters.round:
+                        round_voters.give_back(voter)  # the vote didn't count: they may pick another song
+                continue
+            add_request(query, resolved, count)
+        self.processed += len(batch)
+        self.batches += 1
+
+ingest = VoteIngest(VOTE_QUEUE_SIZE, VOTE_WORKERS, VOTE_BATCH)
+
+# ---- Voter limits: checked before a vote costs a search or a broadcast ----
+VOTES_PER_ROUND = int(os.getenv("VOTES_PER_ROUND", "1"))  # 0 = unlimited
+VOTER_RATE = float(os.getenv("VOTER_RATE", "1"))           # votes per second per voter (0 = off)
+VOTER_BURST = float(os.getenv("VOTER_BURST", "5"))
+IP_RATE = float(os.getenv("IP_RATE", "5"))                 # votes per second per IP address (0 = off)
+IP_BURST = float(os.getenv("IP_BURST", "20"))
+# Trusted callers (the Twitch bot) are not IP-limited and vouch for their voter ids. The bot proves
+# it with VOTE_BOT_TOKEN in an X-Vote-Token header; behind a tunnel or reverse proxy every viewer
+# arrives from the proxy's address, so trusting an address is opt-in
+VOTE_BOT_TOKEN = os.getenv("VOTE_BOT_TOKEN", "")
+VOTE_TRUSTED_IPS = frozenset(x.strip() for x in os.getenv("VOTE_TRUSTED_IPS", "").split(",") if x.strip())
+
+round_voters = RoundVoters(VOTES_PER_ROUND)
+voter_limit = RateLimiter(VOTER_RATE, VOTER_BURST)
+ip_limit = RateLimiter(IP_RATE, IP_BURST)
+
+def trusted_caller(request: Request, ip: str) -> bool:
+    if ip in VOTE_TRUSTED_IPS:
+        return True
+    token = request.headers.get("x-vote-token", "")
+    return bool(VOTE_BOT_TOKEN and token) and hmac.compare_digest(token.encode(), VOTE_BOT_TOKEN.encode())
+
+# Host-only routes (toggle, remove, the profiler) check this X-Host-Token. Without one the
+# queue controls stay open and the profiler can only be started with PROFILE=1
+HOST_TOKEN = os.getenv("HOST_TOKEN", "")
+
+def host_caller(request: Request) -> bool:
+    token = request.headers.get("x-host-token", "")
+    return bool(HOST_TOKEN and token) and hmac.compare_digest(token.encode(), HOST_TOKEN.encode())
+
+def voter_id(raw, ip: str, trusted: bool) -> str:
+    # Ids from the web page are self-chosen, so they get their own namespace
+    raw = str(raw or "")[:64]
+    if not raw:
+        return "ip:" + ip
+    return raw if trusted else "web:" + raw
+
+def submit_vote(query: str, voter: str, ip: str = "") -> Tuple[str, Optional[int]]:
+    """Leader only: ("queued", id) or a rejection ("limited", "voted", "busy").
+
+    `ip` is the caller's address for the per-IP limit ('' for trusted callers);
+    it is checked here rather than by the worker that took the request, so
+    the limit holds across all workers.
+    """
+    outcome, vote_id = _admit(query, voter, ip)
+    votes_total.labels(outcome).inc()
+    return outcome, vote_id
+
+def _admit(query: str, voter: str, ip: str) -> Tuple[str, Optional[int]]:
+    if ip and ip_limit.check(ip):
+        return "limited", None
+    if voter_limit.check(voter):
+        return "limited", None
+    if not round_voters.take(voter):
+        return "voted", None
+    vote_id = ingest.submit(query, voter)
+    if vote_id is None:
+        round_voters.give_back(voter)
+        return "busy", None
+    return "queued", vote_id
 
 # ---- WebSocket manager (namespaced, heartbeat, backpressure) ----
+WS_SEND_QUEUE = int(os.getenv("WS_SEND_QUEUE", "32"))
+WS_SLOW_POLICY = os.getenv("WS_SLOW_POLICY", "resync")  # 'resync' | 'drop'
+
+RESYNC = object()  # outbox marker: replace everything pending with a fresh snapshot
+
+def encode(payload: Dict) -> str:
+    return json.dumps(payload, separators=(",", ":"))
+
+class WSClient:
+    def __init__(self, ws: WebSocket, maxsize: int):
+        self.ws = ws
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize)
+        self.writer: Optional[asyncio.Task] = None
+
 class WSManager:
-    def __init__(self):
-        self.active: List[WebSocket] = []
-        self._lock = asyncio.Lock()
+    """Fan-out with one bounded outbox and writer task per connection.
+
+    broadcast_text() takes a message encoded once by the caller and only
+    enqueues it, so callers never wait on a socket. A client whose outbox is full is either dropped
+    ('drop') or has its backlog discarded and replaced by a single snapshot
+    ('resync'), since deltas cannot be skipped.
+    """
+    def __init__(self, maxsize: int = 32, policy: str = "resync", snapshot: Optional[Callable[[], str]] = None):
+        self.active: Dict[WebSocket, WSClient] = {}
+        self.maxsize = maxsize
+        self.policy = policy
+        self.snapshot = snapshot
+        self.messages = 0
+        self.bytes = 0
+        self.resyncs = 0
+        self.dropped = 0
+
+    def stats(self) -> Dict:
+        return {"clients": len(self.active), "messages": self.messages, "bytes": self.bytes,
+                "resyncs": self.resyncs, "dropped": self.dropped}
 
     async def connect(self, ws: WebSocket):
         await ws.accept(subprotocol="interactive-v1")
-        async with self._lock:
-            self.active.append(ws)
+        client = WSClient(ws, self.maxsize)
+        self.active[ws] = client
+        client.writer = asyncio.create_task(self._writer(client))
 
     async def disconnect(self, ws: WebSocket):
-        async with self._lock:
-            if ws in self.active:
-                self.active.remove(ws)
-
-    async def broadcast(self, payload: Dict):
-        # Defensive send with cleanup
-        dead = []
-        for ws in list(self.active):
-            try:
-                await ws.send_json(payload)
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
-            await self.disconnect(ws)
+        client = self.active.pop(ws, None)
+        if client and client.writer and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+
+    def broadcast_text(self, text: str):
+        start = time.perf_counter()
+        self.messages += 1
+        sent = len(text) * len(self.active)
+        self.bytes += sent
+        for client in list(self.active.values()):
+            self._offer(client, text)
+        broadcast_bytes.inc(sent)
+        broadcast_seconds.observe(time.perf_counter() - start)
+
+    def send(self, ws: WebSocket, payload):
+        # Per-client message (raw text, dict or RESYNC), ordered after queued broadcasts
+        client = self.active.get(ws)
+        if client:
+            self._offer(client, encode(payload) if isinstance(payload, dict) else payload)
+
+    def _offer(self, client: WSClient, item):
+        try:
+            client.outbox.put_nowait(item)
+            return
+        except asyncio.QueueFull:
+            pass
+        if self.policy == "drop":
+            self.dropped += 1
+            asyncio.create_task(self._close(client))
+            return
+        # Coalesce: nothing queued is worth sending once a snapshot follows
+        self.resyncs += 1
+        while not client.outbox.empty():
+            client.outbox.get_nowait()
+        client.outbox.put_nowait(RESYNC)
+
+    async def _close(self, client: WSClient):
+        await self.disconnect(client.ws)
+        try:
+            await client.ws.close(code=1008)
+        except Exception:
+            pass
+
+    async def _writer(self, client: WSClient):
+        try:
+            while True:
+                item = await client.outbox.get()
+                if item is RESYNC:
+                    item = self.snapshot()
+                await client.ws.send_text(item)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await self.disconnect(client.ws)
+
+def snapshot_text() -> str:
+    # The published state; pending changes follow as the next delta
+    return cluster.view_text() or encode(feed.snapshot())
+
+manager = WSManager(WS_SEND_QUEUE, WS_SLOW_POLICY, snapshot_text)
+
+# ---- Cluster: workers share state over a backplane, one leader owns it ----
+BACKPLANE_URL = os.getenv("BACKPLANE_URL", "")  # '' = in-process; redis://host:6379/0 for several workers
+WORKERS = int(os.getenv("WORKERS", "1"))
+LEADER_TTL = float(os.getenv("LEADER_TTL", "5"))
+CLUSTER_SAVE_EVERY = float(os.getenv("CLUSTER_SAVE_EVERY", "1"))  # seconds between saves of the whole state for a takeover
+VOTE_FORWARD_TIMEOUT = float(os.getenv("VOTE_FORWARD_TIMEOUT", "2"))  # how long a follower waits for the leader's verdict
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+class Cluster:
+    """Leader election and state replication between server workers.
+
+    The leader is the only writer: it runs vote ingestion, the tally/playback
+    lifecycle and the broadcaster, and publishes every delta on the 'state'
+    channel. Every worker (the leader included) applies those deltas to its
+    view of the published state, which is what its own WebSocket clients get
+    as a snapshot, and fans them out to those clients; followers also mirror
+    enabled/current/queue into their globals so reads stay local. Votes and
+    host commands received by a follower are forwarded to the leader; for
+    votes the leader answers on 'vote_results' with what it did with each
+    (queued, limited, voted, busy), so the follower can tell its caller.
+
+    The leader's whole state (every vote of the round, this round's voters,
+    album/playlist progress) is saved under the 'state' key at most every
+    CLUSTER_SAVE_EVERY seconds, right after a round closes or an album/
+    playlist track starts, and when it steps down. A worker taking over loads it; a
+    follower that missed a delta reloads its view from it.
+    """
+    def __init__(self, bp: backplane.Backplane, worker: str = WORKER_ID):
+        self.bp = bp
+        self.worker = worker
+        self.is_leader = False
+        self.view: Optional[Dict] = None   # published state: seq, enabled, current, queue, results by key
+        self._view_text: Optional[str] = None
+        self._pending: List[Dict] = []     # deltas received while the view is being reloaded
+        self._reload: Optional[asyncio.Task] = None
+        self._dirty = False
+        self._urgent = False
+        self._saved_at = 0.0
+        self.promotions = 0
+        self.forwarded = 0
+        self.unanswered = 0
+        self.saves = 0
+        self.reloads = 0
+        self._ids = itertools.count(1)
+        self._waiting: Dict[int, asyncio.Future] = {}  # forwarded vote batch -> leader's results
+        self._tasks: List[asyncio.Task] = []
+        self._elector: Optional[asyncio.Task] = None
+
+    def stats(self) -> Dict:
+        return {"worker": self.worker, "leader": self.is_leader, "promotions": self.promotions,
+                "forwarded": self.forwarded, "unanswered": self.unanswered, "saves": self.saves, "reloads": self.reloads,
+                "seq": self.view["seq"] if self.view else None}
+
+    async def start(self):
+        self.bp.subscribe("state", self._on_state)
+        self.bp.subscribe("votes", self._on_votes)
+        self.bp.subscribe("vote_results", self._on_vote_results)
+        self.bp.subscribe("commands", self._on_command)
+        await self.bp.start()
+        saved = await self.bp.get("state")
+        if saved:
+            self._set_view(json.loads(saved))
+        await self._elect_once()
+        self._elector = asyncio.create_task(self._elect())
+
+    async def stop(self):
+        if self._elector:
+            self._elector.cancel()
+        if self.is_leader:
+            delta = feed.collect()
+            if delta:
+                await self.publish(delta)
+            state = dump_state()
+            journal.close(state)
+            await self.save(encode(state))
+            await self._demote()
+            await self.bp.release_leader("leader", self.worker)
+        await self.bp.close()
+
+    async def _elect_once(self):
+        try:
+            held = await self.bp.acquire_leader("leader", self.worker, LEADER_TTL)
+        except Exception:
+            held = False
+        if held and not self.is_leader:
+            await self._promote()
+        elif not held and self.is_leader:
+            await self._demote()
+
+    async def _elect(self):
+        while True:
+            await asyncio.sleep(LEADER_TTL / 3)
+            await self._elect_once()
+
+    async def _promote(self):
+        self.is_leader = True
+        self.promotions += 1
+        saved = await self.bp.get("state")
+        if saved is None:
+            # Cold start: nobody has saved state yet, recover it from disk
+            restore_state()
+        else:
+            # Take over: carry on from the last save of the previous leader
+            load_state(json.loads(saved))
+        # Followers may have seen deltas past the save: number on from the newest
+        feed.seq = max(feed.seq, self.view["seq"] if self.view else 0) + 1
+        if STATE_DIR:
+            journal.open()
+            journal.snapshot(dump_state())
+        catalog.load()
+        purge_denied()  # rules may have changed while we were down
+        ingest.start()
+        feed.collect()  # everything so far goes out in the full state below
+        await self.bp.publish("state", encode(dict(view_state(), type="state")))
+        await self.save(encode(dump_state()))
+        self._tasks = [asyncio.create_task(broadcaster()), asyncio.create_task(lifecycles()),
+                       asyncio.create_task(journal.run())]
+
+    async def _demote(self):
+        self.is_leader = False
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await ingest.stop()
+        journal.close()
+        catalog.close()
+
+    async def publish(self, delta: Dict):
+        self._dirty = True
+        await self.bp.publish("state", encode(delta))
+
+    def save_soon(self):
+        """Save with the next delta rather than on the timer (round closed, album track started)."""
+        self._urgent = True
+
+    def save_wait(self) -> Optional[float]:
+        """Seconds until a save is due, None while there is nothing to save."""
+        if not self._dirty:
+            return None
+        return 0.0 if self._urgent else max(0.0, self._saved_at + CLUSTER_SAVE_EVERY - time.monotonic())
 
-manager = WSManager()
+    def take_save(self) -> Optional[str]:
+        """The state to save if one is due. Called right after feed.collect(),
+        with no await in between, so it matches the seq just published."""
+        wait = self.save_wait()
+        if wait is None or wait > 0:
+            return None
+        self._dirty = self._urgent = False
+        self._saved_at = time.monotonic()
+        return encode(dump_state())
+
+    async def save(self, state: str):
+        await self.bp.set("state", state)
+        self.saves += 1
+
+    # ---- the view of published state, kept on every worker ----
+    def _set_view(self, state: Dict):
+        self.view = {"seq": state.get("seq", 0), "enabled": state.get("enabled", True),
+                     "current": state.get("current"), "queue": list(state.get("queue", [])),
+                     "results": {e["key"]: e for e in state.get("requests", [])}}
+        self._view_changed()
+
+    def _apply(self, delta: Dict):
+        view = self.view
+        view["seq"] = delta["seq"]
+        if "enabled" in delta:
+            view["enabled"] = delta["enabled"]
+        if "current" in delta:
+            view["current"] = delta["current"]
+        for op in delta.get("queue", ()):
+            if op["op"] == "insert":
+                view["queue"].insert(op["index"], op["item"])
+            elif op["op"] == "remove" and 0 <= op["index"] < len(view["queue"]):
+                view["queue"].pop(op["index"])
+        results = delta.get("results")
+        if results:
+            if results["reset"]:
+                view["results"] = {}
+            for entry in results["items"]:
+                view["results"][entry["key"]] = entry
+        self._view_changed()
+
+    def _view_changed(self):
+        self._view_text = None
+        if not self.is_leader:
+            view = self.view
+            feed.seq = view["seq"]
+            globals()["enabled"] = view["enabled"]
+            globals()["current"] = Track(**view["current"]) if view["current"] else None
+            queue[:] = [Track(**t) for t in view["queue"]]
+
+    def top_results(self, n: int) -> List[Dict]:
+        if not self.view:
+            return []
+        return heapq.nlargest(n, self.view["results"].values(), key=lambda e: e.get("votes", 1))
+
+    def view_text(self) -> Optional[str]:
+        """The view as a client snapshot (top RESULTS_LIMIT results), encoded once per seq."""
+        if self.view is None:
+            return None
+        if self._view_text is None:
+            view = self.view
+            self._view_text = encode({"type": "snapshot", "seq": view["seq"], "enabled": view["enabled"],
+                                      "current": view["current"], "queue": view["queue"],
+                                      "results": self.top_results(RESULTS_LIMIT)})
+        return self._view_text
+
+    def _on_state(self, message: str):
+        msg = json.loads(message)
+        if msg.get("type") == "state":
+            # A new leader: everything carries on from its state
+            self._pending = []
+            self._set_view(msg)
+            manager.broadcast_text(self.view_text())
+            return
+        if self.view is not None and not self._pending and msg["seq"] == self.view["seq"] + 1:
+            self._apply(msg)
+        elif self.view is None or msg["seq"] > self.view["seq"]:
+            # Missed a delta: reload the view from the saved state, then carry on from here
+            self._pending.append(msg)
+            if self._reload is None:
+                self._reload = asyncio.ensure_future(self._reload_view())
+        manager.broadcast_text(message)
+
+    async def _reload_view(self):
+        self.reloads += 1
+        try:
+            while self._pending:
+                saved = await self.bp.get("state")
+                state = json.loads(saved) if saved else None
+                # Usable once it is no older than the delta before the first one held back
+                if state and state.get("seq", 0) >= self._pending[0]["seq"] - 1:
+                    pending, self._pending = self._pending, []
+                    self._set_view(state)
+                    for delta in pending:
+                        if delta["seq"] == self.view["seq"] + 1:
+                            self._apply(delta)
+                    break
+                await asyncio.sleep(CLUSTER_SAVE_EVERY)
+        finally:
+            self._reload = None
+
+    def _on_votes(self, message: str):
+        if not self.is_leader:
+            return
+        msg = json.loads(message)
+        results = [submit_vote(query, voter, ip) for query, voter, ip in msg["votes"]]
+        reply = json.dumps({"to": msg["from"], "id": msg["id"], "results": results})
+        asyncio.ensure_future(self.bp.publish("vote_results", reply)).add_done_callback(
+            lambda t: t.cancelled() or t.exception())
+
+    def _on_vote_results(self, message: str):
+        msg = json.loads(message)
+        fut = self._waiting.get(msg["id"]) if msg.get("to") == self.worker else None
+        if fut is not None and not fut.done():
+            fut.set_result([(outcome, vote_id) for outcome, vote_id in msg["results"]])
+
+    def _on_command(self, message: str):
+        if not self.is_leader:
+            return
+        cmd = json.loads(message)
+        if cmd.get("cmd") == "toggle":
+            set_enabled(bool(cmd.get("enabled", True)))
+        elif cmd.get("cmd") == "remove":
+            remove_from_queue(cmd.get("uri", ""))
+
+    async def forward_votes(self, votes: List[Tuple[str, str, str]]) -> List[Tuple[str, Optional[int]]]:
+        """Hand [(query, voter, ip)...] to the leader, which applies the voter
+        and IP limits; its (outcome, id) for each, or ("forwarded", None) for
+        all of them when it does not answer within VOTE_FORWARD_TIMEOUT."""
+        self.forwarded += 1
+        batch = next(self._ids)
+        fut = self._waiting[batch] = asyncio.get_running_loop().create_future()
+        try:
+            await self.bp.publish("votes", json.dumps({"from": self.worker, "id": batch, "votes": votes}))
+            return await asyncio.wait_for(fut, VOTE_FORWARD_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.unanswered += 1
+            return [("forwarded", None)] * len(votes)
+        finally:
+            self._waiting.pop(batch, None)
+
+    async def forward_command(self, cmd: Dict):
+        self.forwarded += 1
+        await self.bp.publish("commands", json.dumps(cmd))
+
+cluster = Cluster(backplane.from_url(BACKPLANE_URL))
+
+class RouteMetrics:
+    """ASGI middleware timing every HTTP request by route template.
+
+    Plain ASGI rather than @app.middleware("http"), which wraps each request
+    in extra tasks and streams and costs more than the measurement itself.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_seconds.labels(scope["method"], path).observe(time.perf_counter() - start)
+            http_responses.labels(path, f"{status // 100}xx").inc()
 
 app = FastAPI()
 app.add_middleware(
@@ -210,7 +1270,28 @@ app.add_middleware(
     allow_origins=["*"], allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"],
 )
+if METRICS:
+    app.add_middleware(RouteMetrics)
 app.mount("/static", StaticFiles(directory="static"), name="static")
+monitors: List[asyncio.Task] = []
+
+@app.on_event("startup")
+async def on_startup():
+    await cluster.start()
+    if METRICS:
+        monitors.append(asyncio.create_task(lag_monitor.run()))
+    if DMCA_RULES:
+        monitors.append(asyncio.create_task(dmca.run()))
+    if os.getenv("PROFILE", "0") == "1":
+        profiler.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    for t in monitors:
+        t.cancel()
+    profiler.stop()
+    await cluster.stop()
+    await httpclient.close()
 
 @app.get("/api/state")
 async def api_state():
@@ -221,91 +1302,218 @@ async def api_state():
     }
 
 @app.post("/api/toggle")
-async def api_toggle(payload: Dict = Body(...)):
-    globals()["enabled"] = bool(payload.get("enabled", True))
+async def api_toggle(request: Request, payload: Dict = Body(...)):
+    if HOST_TOKEN and not host_caller(request):
+        return JSONResponse({"error": "forbidden"}, status_code=403)
+    value = bool(payload.get("enabled", True))
+    if not cluster.is_leader:
+        await cluster.forward_command({"cmd": "toggle", "enabled": value})
+        return {"enabled": value}
+    set_enabled(value)
     return {"enabled": enabled}
 
+VOTE_REJECTED = {
+    "limited": (429, "rate_limited"),
+    "voted": (409, "already_voted"),
+    "busy": (503, "busy"),
+}
+
 @app.post("/api/vote")
-async def api_vote(payload: Dict = Body(...)):
+async def api_vote(request: Request, payload: Dict = Body(...)):
     if not enabled:
         return JSONResponse({"error": "disabled"}, status_code=403)
     query = (payload.get("query") or "").strip()
     if not query:
         return JSONResponse({"error": "empty"}, status_code=400)
-    access = await get_access_token()
-    data = await spotify_search(query, access)
-    track = (data.get("tracks", {}) or {}).get("items", [])[:1]
-    album = (data.get("albums", {}) or {}).get("items", [])[:1]
-    playlist = (data.get("playlists", {}) or {}).get("items", [])[:1]
-    chosen = (track or album or playlist or [None])[0]
-    resolved = None
-    if chosen:
-        resolved = {
-            "title": chosen.get("name", ""),
-            "artist": ", ".join(a.get("name") for a in chosen.get("artists", []) or []) or chosen.get("owner", {}).get("display_name", ""),
-            "uri": chosen.get("uri", ""),
-            "cover": pick_best_image(chosen.get("album", {}).get("images", []) or chosen.get("images", [])),
-        }
-    entry = add_request(query, resolved)
-    await manager.broadcast({"type": "results", "items": requests})
-    return {"ok": True, "entry": entry}
+    ip = request.client.host if request.client else ""
+    trusted = trusted_caller(request, ip)
+    vote = (query, voter_id(payload.get("voter"), ip, trusted), "" if trusted else ip)
+    if cluster.is_leader:
+        outcome, vote_id = submit_vote(*vote)
+    else:
+        votes_total.labels("forwarded").inc()
+        [(outcome, vote_id)] = await cluster.forward_votes([vote])
+    if outcome == "forwarded":
+        # The leader did not answer in time: passed on, but not confirmed
+        return JSONResponse({"ok": True, "forwarded": True}, status_code=202)
+    if vote_id is None:
+        status, error = VOTE_REJECTED[outcome]
+        return JSONResponse({"error": error}, status_code=status, headers={"Retry-After": "1"} if status != 409 else None)
+    return JSONResponse({"ok": True, "id": vote_id, "queued": True}, status_code=202)
+
+@app.post("/api/vote/bulk")
+async def api_vote_bulk(request: Request, payload: Dict = Body(...)):
+    """Many votes in one request (the Twitch bot batches chat this way).
+
+    Answers with one outcome per vote, in order: "queued", "busy", "empty",
+    "limited" (too fast), "voted" (no votes left this round) or, on a
+    follower whose leader did not answer in time, "forwarded".
+    """
+    if not enabled:
+        return JSONResponse({"error": "disabled"}, status_code=403)
+    votes = payload.get("votes")
+    if not isinstance(votes, list):
+        return JSONResponse({"error": "bad_request"}, status_code=400)
+    if len(votes) > VOTE_BULK_MAX:
+        return JSONResponse({"error": "too_many", "max": VOTE_BULK_MAX}, status_code=413)
+    ip = request.client.host if request.client else ""
+    trusted = trusted_caller(request, ip)
+    results: List[Optional[str]] = []
+    admit: List[Tuple[str, str, str]] = []
+    for v in votes:
+        query = (v.get("query") or "").strip() if isinstance(v, dict) else ""
+        results.append(None if query else "empty")
+        if query:
+            admit.append((query, voter_id(v.get("voter"), ip, trusted), "" if trusted else ip))
+    if admit:
+        if cluster.is_leader:
+            outcomes = [submit_vote(*vote)[0] for vote in admit]
+        else:
+            votes_total.labels("forwarded").inc(len(admit))
+            outcomes = [outcome for outcome, _ in await cluster.forward_votes(admit)]
+        it = iter(outcomes)
+        results = [r or next(it) for r in results]
+    if "busy" in results and all(r in ("busy", "empty") for r in results):
+        return JSONResponse({"results": results}, status_code=503, headers={"Retry-After": "1"})
+    return JSONResponse({"results": results}, status_code=202)
+
+def all_stats() -> Dict:
+    return {"token": tokens.stats(), "search_cache": search_cache.stats(), "ingest": ingest.stats(), "ws": manager.stats(), "cluster": cluster.stats(), "scheduler": scheduler.stats(), "journal": journal.stats(), "catalog": catalog.stats(), "dmca": dmca.stats(), "contexts": contexts.stats(), "thumbs": thumbs.stats(),
+            "voters": round_voters.stats(), "voter_limit": voter_limit.stats(), "ip_limit": ip_limit.stats()}
+
+def stats_lines():
+    # Every number from /api/stats, for dashboards that want more than the metrics above
+    yield "# HELP interactive_stat Component counters, as in /api/stats"
+    yield "# TYPE interactive_stat untyped"
+    for group, values in all_stats().items():
+        for name, value in values.items():
+            if isinstance(value, (int, float)):
+                yield f'interactive_stat{{group="{group}",name="{name}"}} {float(value)!r}'
+
+registry.collector(stats_lines)
+
+@app.get("/api/stats")
+async def api_stats():
+    return all_stats()
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/profile")
+async def api_profile(request: Request, top: int = 200):
+    """Folded stacks from the sampling profiler (flamegraph.pl / speedscope input)."""
+    if not host_caller(request):
+        return JSONResponse({"error": "forbidden"}, status_code=403)
+    return Response(profiler.folded(top), media_type="text/plain; charset=utf-8")
+
+@app.post("/api/profile")
+async def api_profile_toggle(request: Request, payload: Dict = Body(...)):
+    """{"enabled": true|false, "reset": bool, "hz": 1-1000}: profile this worker's event loop.
+
+    Only with HOST_TOKEN: anyone else could load every worker with a
+    sampler thread. A new hz restarts a running sampler at that rate.
+    """
+    if not host_caller(request):
+        return JSONResponse({"error": "forbidden"}, status_code=403)
+    hz = payload.get("hz")
+    if hz is not None:
+        try:
+            hz = float(hz)
+        except (TypeError, ValueError):
+            hz = math.nan
+        if not PROFILE_HZ_RANGE[0] <= hz <= PROFILE_HZ_RANGE[1]:
+            return JSONResponse({"error": "bad_hz", "min": PROFILE_HZ_RANGE[0], "max": PROFILE_HZ_RANGE[1]}, status_code=400)
+    if payload.get("reset"):
+        profiler.reset()
+    if payload.get("enabled"):
+        profiler.start(hz=hz)
+    elif "enabled" in payload:
+        profiler.stop()
+    return {"enabled": profiler.running, "samples": profiler.taken, "hz": profiler.hz}
 
 @app.get("/api/results")
 async def api_results():
-    return {"items": requests}
+    return {"items": top_requests() if cluster.is_leader else cluster.top_results(RESULTS_LIMIT)}
 
 @app.post("/api/remove")
-async def api_remove(payload: Dict = Body(...)):
+async def api_remove(request: Request, payload: Dict = Body(...)):
     """Host-only removal by URI."""
+    if HOST_TOKEN and not host_caller(request):
+        return JSONResponse({"error": "forbidden"}, status_code=403)
     uri = payload.get("uri")
     if not uri:
         return JSONResponse({"error": "missing_uri"}, status_code=400)
-    # remove matching item
-    for i, t in enumerate(queue):
-        if t.uri == uri:
-            queue.pop(i)
-            await manager.broadcast({"type": "queue", "queue": [asdict(q) for q in queue]})
-            return {"ok": True}
+    if not cluster.is_leader:
+        await cluster.forward_command({"cmd": "remove", "uri": uri})
+        return {"ok": True}
+    if remove_from_queue(uri):
+        return {"ok": True}
     return JSONResponse({"error": "not_found"}, status_code=404)
 
+@app.get("/img/{size}/{image_id}")
+async def img(size: int, image_id: str, request: Request):
+    """Resized cover; the URL names immutable content, so caches may keep it forever."""
+    if not thumbs.valid(image_id):
+        return JSONResponse({"error": "not_found"}, status_code=404)
+    served = thumbs.nearest(size)
+    fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+    try:
+        data, etag = await thumbs.get(served, image_id, fmt)
+    except Exception:
+        # Upstream trouble: let the browser load the original this once
+        return RedirectResponse(IMG_UPSTREAM + image_id, status_code=307, headers={"Cache-Control": "no-store"})
+    # A snapped size is only as lasting as IMG_SIZES: cache it for a day, not forever
+    cache = "public, max-age=31536000, immutable" if served == size else "public, max-age=86400"
+    headers = {"ETag": etag, "Cache-Control": cache, "Vary": "Accept"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(data, media_type=FORMATS[fmt], headers=headers)
+
 @app.websocket(APP_NAMESPACE)
 async def ws_endpoint(ws: WebSocket):
     await manager.connect(ws)
     try:
+        manager.send(ws, RESYNC)
         while True:
-            # Passive receive to support pings or small client messages
+            # Passive receive to support pings, snapshot requests or small client messages
             try:
                 msg = await ws.receive_text()
-                if msg == "ping":
-                    await ws.send_text("pong")
+            except WebSocketDisconnect:
+                raise
             except Exception:
                 await asyncio.sleep(0.01)
+                continue
+            if msg == "ping":
+                manager.send(ws, "pong")
+            elif msg == "snapshot":
+                manager.send(ws, RESYNC)
     except WebSocketDisconnect:
+        pass
+    finally:
         await manager.disconnect(ws)
 
-# ---- broadcaster loop: push sub-second updates ----
+# ---- broadcaster loop: push sub-second deltas, only when something changed ----
+BROADCAST_INTERVAL = float(os.getenv("BROADCAST_INTERVAL", "0.25"))
+
 async def broadcaster():
-    last = 0
     while True:
-        await asyncio.sleep(0.25)  # sub-second updates without thrashing
-        now = time.time()
-        # Push current state & results (rate-limit to avoid flood)
-        payload = {
-            "type": "state",
-            "enabled": enabled,
-            "current": asdict(current) if current else None,
-            "queue": [asdict(t) for t in queue],
-        }
-        await manager.broadcast(payload)
-        if now - last > 1.0:
-            await manager.broadcast({"type": "results", "items": requests})
-            last = now
+        try:
+            await asyncio.wait_for(feed.changed.wait(), cluster.save_wait())
+        except asyncio.TimeoutError:
+            pass  # quiet since the last delta, but a save is due
+        else:
+            await asyncio.sleep(BROADCAST_INTERVAL)  # coalesce a burst of changes into one delta
+        delta = feed.collect()
+        state = cluster.take_save()
+        if delta:
+            await cluster.publish(delta)
+        if state:
+            await cluster.save(state)
 
 async def lifecycles():
-    while True:
-        await enqueue_winner()    # tally and enqueue every cycle if needed
-        await tick_playback()     # keep playback aligned
-        await asyncio.sleep(1.0)  # 1s resolution
+    # Round close and playback are driven by the track clock, not a fixed tick
+    await scheduler.run()
 
 def run():
     # Detect free port and hold lock
@@ -315,10 +1523,17 @@ def run():
         sys.exit(1)
     port = int(os.getenv("INTERACTIVE_PORT", find_free_port(3000)))
     import uvicorn
-    loop = asyncio.get_event_loop()
-    loop.create_task(broadcaster())
-    loop.create_task(lifecycles())
-    uvicorn.run(app, host="0.0.0.0", port=port, ws="auto")
+    if WORKERS > 1:
+        if not BACKPLANE_URL or BACKPLANE_URL.startswith("memory:"):
+            print("WORKERS > 1 needs a shared BACKPLANE_URL (e.g. redis://localhost:6379/0). Exiting.")
+            remove_singleton_lock()
+            sys.exit(1)
+        # Workers import the module by name, so hand uvicorn an import string
+        module = os.path.splitext(os.path.basename(__file__))[0]
+        uvicorn.run(f"{module}:app", app_dir=os.path.dirname(os.path.abspath(__file__)),
+                    host="0.0.0.0", port=port, ws="auto", workers=WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port, ws="auto")
     remove_singleton_lock()
 
 if __name__ == "__main__":